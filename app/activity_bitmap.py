@@ -0,0 +1,207 @@
+from datetime import datetime, date
+from sqlalchemy import case, func
+from models import db, Task, UserActivityBitmap
+from task_series import virtual_occurrences
+
+# 用户打卡位图
+# 每个用户一行，三组位图分别记录"当天有任务"、"当天有已完成任务"、"当天任务全部完成"，
+# 第i位对应天序号 base_day + i（date.toordinal()）。位图以小端字节串持久化，内存中按Python整数做位运算，
+# 连续天数、最长连续天数都变成位运算，不再按天查询任务表。
+
+COMPLETED = '已完成'
+BIT_KINDS = ('any', 'completed', 'perfect')
+
+
+def day_number(value):
+    """日期（date或'YYYY-MM-DD'字符串）转换为天序号，格式错误返回None"""
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date().toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(blob):
+    return int.from_bytes(blob or b'', 'little')
+
+
+def _to_bytes(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+class ActivityBits:
+    """内存中的位图，base_day 为第0位对应的天序号"""
+
+    def __init__(self, base_day, any_bits=0, completed_bits=0, perfect_bits=0):
+        self.base_day = base_day
+        self.bits = {'any': any_bits, 'completed': completed_bits, 'perfect': perfect_bits}
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.base_day, _to_int(row.any_bits), _to_int(row.completed_bits), _to_int(row.perfect_bits))
+
+    def save_to(self, row):
+        row.base_day = self.base_day
+        row.any_bits = _to_bytes(self.bits['any'])
+        row.completed_bits = _to_bytes(self.bits['completed'])
+        row.perfect_bits = _to_bytes(self.bits['perfect'])
+        row.updated_at = datetime.now()
+
+    def rebase(self, first_day):
+        """保证 first_day 不早于 base_day，必要时整体左移"""
+        if first_day < self.base_day:
+            shift = self.base_day - first_day
+            for kind in BIT_KINDS:
+                self.bits[kind] <<= shift
+            self.base_day = first_day
+
+    def set_range(self, first_day, last_day, day_counts):
+        """用 {天序号: (总数, 完成数)} 覆盖 [first_day, last_day] 区间内的位"""
+        self.rebase(first_day)
+        offset = first_day - self.base_day
+        clear_mask = ~(((1 << (last_day - first_day + 1)) - 1) << offset)
+        for kind in BIT_KINDS:
+            self.bits[kind] &= clear_mask
+        for day, (total, completed) in day_counts.items():
+            bit = 1 << (day - self.base_day)
+            if total > 0:
+                self.bits['any'] |= bit
+            if completed > 0:
+                self.bits['completed'] |= bit
+            if total > 0 and completed == total:
+                self.bits['perfect'] |= bit
+
+    def mark_unfinished(self, days):
+        """叠加有未完成任务的天（按需展开的重复任务）：这些天有任务，但不是全部完成"""
+        if not days:
+            return
+        self.rebase(min(days))
+        for day in days:
+            bit = 1 << (day - self.base_day)
+            self.bits['any'] |= bit
+            self.bits['perfect'] &= ~bit
+
+    def clip(self, last_day):
+        """清除 last_day 之后的位（例如已经安排的未来任务），统计连续天数时只看截止到 last_day 的记录"""
+        position = last_day - self.base_day
+        mask = (1 << (position + 1)) - 1 if position >= 0 else 0
+        for kind in BIT_KINDS:
+            self.bits[kind] &= mask
+
+    def streak_ending(self, kind, day):
+        """截止到day（含）的连续置位天数"""
+        position = day - self.base_day
+        if position < 0:
+            return 0
+        mask = (1 << (position + 1)) - 1
+        gaps = ~self.bits[kind] & mask
+        if not gaps:
+            return position + 1
+        return position - (gaps.bit_length() - 1)
+
+    def longest_streak(self, kind):
+        bits = self.bits[kind]
+        length = 0
+        while bits:
+            bits &= bits << 1
+            length += 1
+        return length
+
+    def count(self, kind):
+        return bin(self.bits[kind]).count('1')
+
+
+def _day_counts(user_id, start_date=None, end_date=None):
+    """按天分组统计任务总数和完成数，返回 {天序号: (总数, 完成数)}"""
+    query = db.session.query(
+        Task.start_date,
+        func.count(Task.id),
+        func.sum(case((Task.status == COMPLETED, 1), else_=0))
+    ).filter(Task.user_id == user_id)
+    if start_date:
+        query = query.filter(Task.start_date >= start_date)
+    if end_date:
+        query = query.filter(Task.start_date <= end_date)
+    counts = {}
+    for day, total, completed in query.group_by(Task.start_date).all():
+        number = day_number(day)
+        if number is not None:
+            counts[number] = (total or 0, completed or 0)
+    return counts
+
+
+def rebuild_activity_bitmap(user_id):
+    """根据任务表重建用户的整张位图（首次访问或修复时使用），不提交事务"""
+    counts = _day_counts(user_id)
+    row = UserActivityBitmap.query.get(user_id)
+    if row is None:
+        row = UserActivityBitmap(user_id=user_id)
+        db.session.add(row)
+    if counts:
+        bits = ActivityBits(min(counts))
+        bits.set_range(min(counts), max(counts), counts)
+    else:
+        bits = ActivityBits(date.today().toordinal())
+    bits.save_to(row)
+    return bits
+
+
+def refresh_activity_days(user_id, start_date, end_date=None, day_counts=None):
+    """
+    任务新增、删除或状态/日期变更后调用，重新计算 [start_date, end_date] 内每天的位，
+    与任务变更在同一事务中写入，由调用方提交。
+    day_counts 为调用方已算好的 {天序号: (总数, 完成数)}（见 daily_stats.py），为空时查询任务表。
+    """
+    if not user_id:
+        return None
+    first_day = day_number(start_date)
+    last_day = day_number(end_date) if end_date else first_day
+    if first_day is None:
+        return None
+    if last_day is None or last_day < first_day:
+        last_day = first_day
+
+    row = UserActivityBitmap.query.get(user_id)
+    if row is None:
+        return rebuild_activity_bitmap(user_id)
+
+    counts = day_counts
+    if counts is None:
+        counts = _day_counts(
+            user_id,
+            date.fromordinal(first_day).strftime('%Y-%m-%d'),
+            date.fromordinal(last_day).strftime('%Y-%m-%d')
+        )
+    bits = ActivityBits.from_row(row)
+    bits.set_range(first_day, last_day, counts)
+    bits.save_to(row)
+    return bits
+
+
+def load_activity_bits(user_id):
+    row = UserActivityBitmap.query.get(user_id)
+    if row is None:
+        return rebuild_activity_bitmap(user_id)
+    return ActivityBits.from_row(row)
+
+
+def streak_summary(user_id, today=None):
+    """返回用户的连续打卡统计，均以天为单位"""
+    today = today or date.today()
+    bits = load_activity_bits(user_id)
+    day = today.toordinal()
+    # 按规则展开、尚未写入的重复任务只在读取时叠加，不写回位图；只展开到今天，未来的任务不影响连续天数
+    bits.mark_unfinished({occurrence.toordinal() for _, occurrence in virtual_occurrences(user_id, end=today)})
+    bits.clip(day)
+    return {
+        'current_streak': bits.streak_ending('completed', day),          # 截止今天连续有完成任务
+        'longest_streak': bits.longest_streak('completed'),
+        'current_active_streak': bits.streak_ending('any', day),         # 截止今天连续有任务
+        'longest_active_streak': bits.longest_streak('any'),
+        'current_perfect_streak': bits.streak_ending('perfect', day),    # 截止今天连续全部完成
+        'longest_perfect_streak': bits.longest_streak('perfect'),
+        'completed_days': bits.count('completed'),
+        'as_of': today.strftime('%Y-%m-%d'),
+    }
+
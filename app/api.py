@@ -1,5 +1,23 @@
 from flask import request, jsonify, send_from_directory
-from models import db, User, Task, TaskCategory, Wish, OperationLog, Honor, UserHonor, UserSettings, TaskRemark
+from models import db, User, Task, TaskSeries, TaskCategory, Wish, OperationLog, Honor, UserHonor, UserSettings, TaskRemark, GoldLedger, WishExchange
+from honor_rules import evaluate_honors
+from activity_bitmap import streak_summary
+from gold_service import (
+    change_gold, set_gold, balance_at, REASON_LABELS, REASON_TASK_COMPLETE, REASON_TASK_UNCOMPLETE,
+    REASON_TASK_DELETE, REASON_SERIES_DELETE, REASON_SERIES_EDIT, REASON_WISH_EXCHANGE, REASON_MANUAL_ADJUST
+)
+from pagination import parse_cursor, parse_limit, keyset_page, count_cache
+from daily_stats import refresh_daily_stats, period_range, summarize_daily_stats, parse_stat_date, STAT_PERIODS
+from task_series import (
+    lazy_series_enabled, create_series, is_virtual_task_id, virtual_task_id, virtual_occurrences, virtual_task_dict,
+    materialized_task, materialize_occurrence, skip_occurrence, update_series_rules, delete_series_rules,
+    SERIES_EDITABLE_FIELDS
+)
+from recurrence import parse_day, series_task_rows, bulk_insert_tasks
+from attachment_cleanup import task_attachment_dir, remove_dirs_later
+from carry_over import carry_over_tasks
+from task_clone import clone_day_tasks, expand_target_days, CLONE_MAX_TARGETS
+from task_categories import category_id_for, category_filter
 from datetime import datetime, timedelta
 import json
 import random
@@ -7,15 +25,38 @@ import os
 import uuid
 import re
 import time
+import logging
 from werkzeug.utils import secure_filename
 
+logger = logging.getLogger(__name__)
+
 def register_routes(app):
+    def load_task(task_id, materialize=True):
+        """
+        按ID获取任务。负数ID是按重复规则展开的虚拟任务：materialize=True 时写入一条 Task 记录并更新日统计
+        （由调用方提交），否则只返回已写入的记录。任务不存在时返回 None。
+        """
+        if not is_virtual_task_id(task_id):
+            return Task.query.get(task_id)
+        if not materialize:
+            return materialized_task(task_id)
+        task = materialize_occurrence(task_id)
+        if task is not None:
+            refresh_daily_stats(task.user_id, task.start_date)
+        return task
+
     # =====================
     # 任务备注相关路由
     # =====================
-    @app.route('/api/tasks/<int:task_id>/remarks', methods=['GET'])
+    @app.route('/api/tasks/<int(signed=True):task_id>/remarks', methods=['GET'])
     def list_task_remarks(task_id):
         try:
+            if is_virtual_task_id(task_id):
+                # 尚未写入的虚拟任务没有备注
+                task = load_task(task_id, materialize=False)
+                if task is None:
+                    return jsonify({'success': True, 'remarks': []})
+                task_id = task.id
             remarks = TaskRemark.query.filter_by(task_id=task_id, is_deleted=False).order_by(TaskRemark.created_at.asc()).all()
             result = []
             for r in remarks:
@@ -41,7 +82,7 @@ def register_routes(app):
             app.logger.error(f"获取任务备注失败: {str(e)}")
             return jsonify({'success': False, 'message': '获取备注失败'}), 500
 
-    @app.route('/api/tasks/<int:task_id>/remarks', methods=['POST'])
+    @app.route('/api/tasks/<int(signed=True):task_id>/remarks', methods=['POST'])
     def create_task_remark(task_id):
         try:
             data = request.json or {}
@@ -54,9 +95,10 @@ def register_routes(app):
             if not user_id:
                 return jsonify({'success': False, 'message': '缺少用户ID'}), 400
 
-            task = Task.query.get(task_id)
+            task = load_task(task_id)
             if not task:
                 return jsonify({'success': False, 'message': '任务不存在'}), 404
+            task_id = task.id
 
             images_json = json.dumps(images) if images else None
 
@@ -102,12 +144,14 @@ def register_routes(app):
             app.logger.error(f"删除任务备注失败: {str(e)}")
             return jsonify({'success': False, 'message': '删除备注失败'}), 500
 
-    @app.route('/api/tasks/<int:task_id>/remarks/upload', methods=['POST'])
+    @app.route('/api/tasks/<int(signed=True):task_id>/remarks/upload', methods=['POST'])
     def upload_task_remark_file(task_id):
         try:
-            task = Task.query.get(task_id)
+            task = load_task(task_id)
             if not task:
                 return jsonify({'success': False, 'message': '任务不存在'}), 404
+            # 虚拟任务已写入，附件目录使用真实任务ID
+            task_id = task.id
             if 'file' not in request.files:
                 return jsonify({'success': False, 'message': '没有文件上传'})
             file = request.files['file']
@@ -135,6 +179,8 @@ def register_routes(app):
             filename = secure_filename(f'{file_type}_{timestamp}_{uuid.uuid4().hex[:8]}.{ext}')
             filepath = os.path.join(base_dir, filename)
             file.save(filepath)
+            # 提交虚拟任务的写入（普通任务没有待提交的修改）
+            db.session.commit()
 
             # 前端访问URL（与任务图片一致的前缀）
             file_url = f'/static/uploads/task_images/{task.user_id}/{task_id}/{filename}'
@@ -146,31 +192,18 @@ def register_routes(app):
     # 批量添加任务API
     @app.route('/api/tasks/batch', methods=['POST'])
     def add_tasks_batch():
-        print('=' * 50)
-        print('收到批量添加任务请求')
-        # 打印所有请求头
-        print('请求头信息:')
-        for key, value in request.headers:
-            print(f'  {key}: {value}')
-        
         # 尝试获取JSON数据
         try:
             data = request.json
-            print('请求数据:', data)
-            
             tasks_data = data.get('tasks', []) if data else []
             user_id = data.get('user_id') if data else None
-            
-            print('任务数据数量:', len(tasks_data))
-            print('用户ID:', user_id)
+            logger.debug('收到批量添加任务请求', extra={'user_id': user_id, 'task_count': len(tasks_data)})
         except Exception as e:
-            print('解析请求数据失败:', str(e))
-            print('请求内容类型:', request.content_type)
-            print('请求原始数据:', request.get_data())
+            logger.warning('解析批量添加任务请求失败: %s', e, extra={'content_type': request.content_type})
             return jsonify({'error': '请求数据格式错误'}), 400
         
         if not tasks_data:
-            print('错误: 没有提供任务数据')
+            logger.debug('批量添加任务请求没有任务数据', extra={'user_id': user_id})
             return jsonify({'error': '没有提供任务数据'}), 400
         
         try:
@@ -178,11 +211,13 @@ def register_routes(app):
             user = User.query.get(user_id)
             user_nickname = user.nickname or user.username if user else '未知用户'
             
-            # 批量创建任务
+            # 批量创建任务：顶层任务一次flush取得ID，逐日写入的重复任务汇总后分批批量插入
             created_tasks = []
+            occurrence_rows = []
+            # 记录本次涉及的日期范围，用于更新日统计和打卡位图
+            touched_dates = []
             for task_data in tasks_data:
                 try:
-                    print(f'处理任务: {task_data.get("name")}')
                     # 处理images字段，确保它是JSON字符串格式
                     images = task_data.get('images', [])
                     images_json = json.dumps(images) if images else None
@@ -205,143 +240,35 @@ def register_routes(app):
                         images=images_json
                     )
                     
+                    # 按需展开模式下重复任务只保存一条规则，读取时再展开每天的任务
+                    series = None
+                    if task.end_date and task.start_date and task.repeat_setting != '无' and lazy_series_enabled():
+                        series = create_series(task)
+                    if series is not None:
+                        created_tasks.append(virtual_task_id(series, parse_day(series.start_date)))
+                        continue
+                    
                     # 添加任务到会话
                     db.session.add(task)
+                    created_tasks.append(task)
                     
-                    # 立即提交以获取任务ID
-                    db.session.flush()
-                    
-                    print(f'任务添加到会话，ID: {task.id}')
-                    
-                    # 处理重复任务创建
-                    repeat_setting = task_data.get('repeat_setting', '无')
-                    start_date = task_data.get('start_date')
-                    end_date = task_data.get('end_date')
+                    # 逐日写入模式：开始日期当天即本任务，其余执行日期汇总后批量插入
+                    if task.end_date and task.start_date and task.repeat_setting != '无':
+                        occurrence_rows.extend(series_task_rows(task))
                     
-                    # 只有在设置了结束日期的情况下才创建重复任务
-                    if end_date and start_date and repeat_setting != '无':
-                        try:
-                            # 转换字符串日期为datetime对象
-                            start = datetime.strptime(start_date, '%Y-%m-%d')
-                            end = datetime.strptime(end_date, '%Y-%m-%d')
-                            
-                            # 分割多选的重复设置
-                            repeat_settings = repeat_setting.split(',')
-                            
-                            # 星期映射表
-                            weekday_map = {
-                                '每周一': 0,
-                                '每周二': 1,
-                                '每周三': 2,
-                                '每周四': 3,
-                                '每周五': 4,
-                                '每周六': 5,
-                                '每周日': 6
-                            }
-                            
-                            # 处理每个重复设置
-                            for setting in repeat_settings:
-                                setting = setting.strip()  # 去除空白字符
-                                
-                                # 根据不同的重复类型创建任务
-                                if setting == '每天':
-                                    # 为每一天创建任务
-                                    current_date = start
-                                    while current_date <= end:
-                                        # 跳过已经创建的第一个任务
-                                        if current_date.strftime('%Y-%m-%d') != start_date:
-                                            daily_task = Task(
-                                                user_id=user_id,
-                                                name=task_data.get('name', '未命名任务'),
-                                                description=task_data.get('description', ''),
-                                                icon=task_data.get('icon', 'default.png'),
-                                                category=task_data.get('category', '其他'),
-                                                planned_time=task_data.get('planned_time', 10),
-                                                actual_time=0,
-                                                points=task_data.get('points', 1),
-                                                repeat_setting=repeat_setting,  # 保存完整的重复设置
-                                                start_date=current_date.strftime('%Y-%m-%d'),
-                                                end_date=end_date,
-                                                status='未完成',
-                                                series_id=task.series_id,
-                                                images=images_json
-                                            )
-                                            db.session.add(daily_task)
-                                        # 前进到下一天
-                                        current_date += timedelta(days=1)
-                                elif setting == '每个工作日':
-                                    # 为每个工作日创建任务
-                                    current_date = start
-                                    while current_date <= end:
-                                        # 0-4代表周一至周五
-                                        if current_date.weekday() < 5:
-                                            # 跳过已经创建的第一个任务
-                                            if current_date.strftime('%Y-%m-%d') != start_date:
-                                                weekday_task = Task(
-                                                    user_id=user_id,
-                                                    name=task_data.get('name', '未命名任务'),
-                                                    description=task_data.get('description', ''),
-                                                    icon=task_data.get('icon', 'default.png'),
-                                                    category=task_data.get('category', '其他'),
-                                                    planned_time=task_data.get('planned_time', 10),
-                                                    actual_time=0,
-                                                    points=task_data.get('points', 1),
-                                                    repeat_setting=repeat_setting,  # 保存完整的重复设置
-                                                    start_date=current_date.strftime('%Y-%m-%d'),
-                                                    end_date=end_date,
-                                                    status='未完成',
-                                                    series_id=task.series_id,
-                                                    images=images_json
-                                                )
-                                                db.session.add(weekday_task)
-                                        # 前进到下一天
-                                        current_date += timedelta(days=1)
-                                elif setting.startswith('每周'):
-                                    # 提取星期几
-                                    target_weekday = weekday_map.get(setting)
-                                    if target_weekday is not None:
-                                        # 为每个指定的星期几创建任务
-                                        current_date = start  # datetime对象是不可变的，直接赋值即可
-                                        
-                                        # 找到第一个目标星期几
-                                        days_ahead = target_weekday - current_date.weekday()
-                                        if days_ahead <= 0:  # 如果当天或已过去
-                                            days_ahead += 7
-                                        current_date += timedelta(days=days_ahead)
-                                        
-                                        # 创建所有符合条件的日期的任务
-                                        while current_date <= end:
-                                            weekly_task = Task(
-                                                user_id=user_id,
-                                                name=task_data.get('name', '未命名任务'),
-                                                description=task_data.get('description', ''),
-                                                icon=task_data.get('icon', 'default.png'),
-                                                category=task_data.get('category', '其他'),
-                                                planned_time=task_data.get('planned_time', 10),
-                                                actual_time=0,
-                                                points=task_data.get('points', 1),
-                                                repeat_setting=repeat_setting,  # 保存完整的重复设置
-                                                start_date=current_date.strftime('%Y-%m-%d'),
-                                                end_date=end_date,
-                                                status='未完成',
-                                                series_id=task.series_id,
-                                                images=images_json
-                                            )
-                                            db.session.add(weekly_task)
-                                            
-                                            # 前进到下一周的同一天
-                                            current_date += timedelta(days=7)
-                        except ValueError:
-                            # 日期格式不正确时忽略重复创建
-                            pass
-                    
-                    # 将任务ID添加到创建列表
-                    created_tasks.append(task.id)
+                    touched_dates.extend(d for d in (task.start_date, task.end_date) if d)
                 except Exception as e:
-                    print(f'处理任务时出错: {str(e)}')
+                    logger.warning('批量添加任务时跳过无效任务: %s', e, extra={'user_id': user_id})
                     # 继续处理下一个任务
                     continue
             
+            # 一次flush取得所有顶层任务的ID
+            db.session.flush()
+            created_tasks = [item if isinstance(item, int) else item.id for item in created_tasks]
+            
+            # 分批插入重复任务的其余执行日期
+            bulk_insert_tasks(occurrence_rows)
+            
             # 记录操作日志
             log = OperationLog(
                 user_id=user_id,
@@ -353,16 +280,19 @@ def register_routes(app):
             )
             db.session.add(log)
             
+            # 更新日统计和打卡位图
+            if touched_dates:
+                refresh_daily_stats(user_id, min(touched_dates), max(touched_dates))
+            
             # 合并为一次提交，确保所有任务和日志在同一个事务中完成
             db.session.commit()
             
-            print('任务创建成功，创建的任务ID列表:', created_tasks)
-            print('返回响应: 成功创建', len(created_tasks), '个任务')
+            logger.debug('批量添加任务完成', extra={'user_id': user_id, 'task_count': len(created_tasks)})
             return jsonify({'success': True, 'created_task_ids': created_tasks, 'count': len(created_tasks)})
             
         except Exception as e:
             db.session.rollback()
-            print('任务创建失败:', str(e))
+            logger.exception('批量添加任务失败', extra={'user_id': user_id})
             return jsonify({'error': '批量添加任务失败', 'details': str(e)}), 500
     
     # 确保头像上传根目录存在 - 修改为backend/static/uploads/avatars
@@ -491,6 +421,7 @@ def register_routes(app):
                     user_id=effective_user_id,
                     fixed_tomato_page=False,
                     task_auto_sort=False,
+                    task_auto_migrate=False,
                     tts_enabled=True
                 )
                 db.session.add(settings)
@@ -500,6 +431,7 @@ def register_routes(app):
                 'user_id': effective_user_id,
                 'fixed_tomato_page': bool(settings.fixed_tomato_page),
                 'task_auto_sort': bool(settings.task_auto_sort),
+                'task_auto_migrate': bool(settings.task_auto_migrate),
                 'tts_enabled': bool(settings.tts_enabled),
                 'created_at': settings.created_at.isoformat() if settings.created_at else None,
                 'updated_at': settings.updated_at.isoformat() if settings.updated_at else None
@@ -525,7 +457,7 @@ def register_routes(app):
                 db.session.add(settings)
 
             # 允许更新的字段
-            allowed_fields = ['fixed_tomato_page', 'task_auto_sort', 'tts_enabled']
+            allowed_fields = ['fixed_tomato_page', 'task_auto_sort', 'task_auto_migrate', 'tts_enabled']
             for key in allowed_fields:
                 if key in data:
                     setattr(settings, key, bool(data.get(key)))
@@ -550,6 +482,24 @@ def register_routes(app):
             db.session.rollback()
             return jsonify({'success': False, 'message': f'更新用户设置失败: {str(e)}'}), 500
     
+    # 获取用户连续打卡统计（基于打卡位图，荣誉检测也使用同一份数据）
+    @app.route('/api/users/<int:user_id>/streaks', methods=['GET'])
+    def get_user_streaks(user_id):
+        try:
+            user = User.query.get(user_id)
+            if not user:
+                return jsonify({'success': False, 'message': '用户不存在'}), 404
+
+            # 如果是子账号，使用父账号ID来查询数据
+            effective_user_id = user.parent_id if user.parent_id else user.id
+            streaks = streak_summary(effective_user_id)
+            # 首次访问时会根据任务表构建位图，需要提交
+            db.session.commit()
+            return jsonify({'success': True, 'user_id': effective_user_id, 'streaks': streaks})
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'获取连续打卡统计失败: {str(e)}'}), 500
+    
     # 更新用户金币数量路由
     @app.route('/api/users/<int:user_id>/gold', methods=['PUT'])
     def update_user_gold(user_id):
@@ -573,11 +523,16 @@ def register_routes(app):
         if len(reason) < 2:
             return jsonify({'success': False, 'message': '修改原因至少需要2个字符'})
         
-        # 保存旧的金币数量用于日志
-        old_gold = user.total_gold
-        
-        # 更新金币数量
-        user.total_gold = new_gold
+        # 更新金币数量：仅当余额在读取后未被其他请求修改时才写入，否则重新读取后重试
+        for _ in range(3):
+            # 保存旧的金币数量用于日志
+            old_gold = user.total_gold
+            if set_gold(user.id, new_gold, old_gold):
+                break
+            db.session.refresh(user)
+        else:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': '金币数量正在被其他操作修改，请稍后重试'})
         db.session.commit()
         
         # 记录操作日志
@@ -699,13 +654,11 @@ def register_routes(app):
                         images = json.loads(task.images)
                     except json.JSONDecodeError:
                         images = []
-                # 备注数量
-                remark_count = TaskRemark.query.filter_by(task_id=task.id, is_deleted=False).count()
-                
                 task_dict = {
                     'id': task.id,
                     'name': task.name,
-                    'category': task.category,
+                    'category': task.category_name,
+                    'category_color': task.category_color,
                     'points': task.points,
                     'status': task.status,
                     'start_date': task.start_date,
@@ -716,17 +669,45 @@ def register_routes(app):
                     'user_id': task.user_id,
                     'series_id': task.series_id,
                     'images': images,
-                    'remark_count': remark_count,
+                    'remark_count': task.remark_count or 0,  # 备注数量（由触发器维护）
                     'created_at': task.created_at.isoformat() if task.created_at else None
                 }
                 result.append(task_dict)
             
+            # 合并按规则展开的虚拟任务（都是未完成状态），保持按日期升序
+            occurrences = virtual_occurrences(effective_user_id)
+            if occurrences:
+                result.extend(virtual_task_dict(series, day) for series, day in occurrences)
+                result.sort(key=lambda item: item['start_date'] or '')
+            
             app.logger.info(f"找到 {len(result)} 个未完成任务")
             return jsonify(result)
         except Exception as e:
             app.logger.error(f"获取未完成任务失败: {e}")
             return jsonify({'error': str(e)}), 500
     
+    # 把过期的未完成任务迁移到今天（每个家庭每天执行一次，重复调用直接返回）
+    @app.route('/api/tasks/carry-over', methods=['POST'])
+    def carry_over_unfinished_tasks():
+        data = request.json or {}
+        user_id = data.get('user_id')
+        if not user_id:
+            return jsonify({'success': False, 'message': '缺少用户ID参数'}), 400
+        operator = User.query.get(user_id)
+        if not operator:
+            return jsonify({'success': False, 'message': '用户不存在'}), 404
+
+        # 以客户端的"今天"为准，未提供时使用服务器日期
+        today = parse_day(data.get('date')) if data.get('date') else None
+        if data.get('date') and today is None:
+            return jsonify({'success': False, 'message': '日期格式错误，应为YYYY-MM-DD'}), 400
+        try:
+            result = carry_over_tasks(operator.id, today, operator=operator, force=bool(data.get('force')))
+            return jsonify({'success': True, **result})
+        except Exception as e:
+            app.logger.error(f"迁移未完成任务失败，用户ID: {user_id}, 错误信息: {str(e)}")
+            return jsonify({'success': False, 'message': f'迁移未完成任务失败: {str(e)}'}), 500
+
     @app.route('/api/tasks', methods=['GET'])
     def get_tasks_list():
          try:
@@ -750,7 +731,7 @@ def register_routes(app):
              
              # 按分类筛选
              if category and category != '全部学科':
-                 query = query.filter_by(category=category)
+                 query = query.filter(category_filter(Task, category))
              
              # 执行查询
              tasks = query.all()
@@ -761,7 +742,8 @@ def register_routes(app):
                  task_dict = {
                      'id': task.id,
                      'name': task.name,
-                     'category': task.category,
+                     'category': task.category_name,
+                     'category_color': task.category_color,
                      'points': task.points,
                      'status': task.status,
                      'date': task.date,
@@ -784,19 +766,26 @@ def register_routes(app):
              # 确保错误响应也是有效的JSON
              return jsonify({'error': str(e)}), 500
     
-    @app.route('/api/tasks/<int:task_id>', methods=['PUT'])
+    # PUT /api/tasks/<id> 可以修改的列：remark_count 由触发器维护，category_id 由分类名称填写，时间由服务端记录
+    TASK_WRITABLE_FIELDS = frozenset(Task.__table__.columns.keys()) - {
+        'id', 'user_id', 'remark_count', 'category_id', 'created_at', 'updated_at'
+    }
+
+    @app.route('/api/tasks/<int(signed=True):task_id>', methods=['PUT'])
     def update_task(task_id):
         data = request.json
-        task = Task.query.get(task_id)
+        task = load_task(task_id)
         if not task:
             return jsonify({'success': False, 'message': '任务不存在'})
         
         # 检查任务状态是否从非已完成变为已完成或从未完成变为已完成
         was_completed = task.status == '已完成'
+        old_start_date = task.start_date
         
-        # 更新任务信息
+        # 更新任务信息：只写入可修改的列，客户端原样回传的任务数据中的只读字段
+        # （category_color 等属性、关联对象）直接忽略
         for key, value in data.items():
-            if hasattr(task, key) and key != 'id' and key != 'user_id':
+            if key in TASK_WRITABLE_FIELDS:
                 if key == 'images':
                     # 确保images是JSON字符串格式
                     setattr(task, key, json.dumps(value) if value else None)
@@ -822,8 +811,11 @@ def register_routes(app):
         if not was_completed and task.status == '已完成':
             # 任务从不完成变为已完成
             if user:
-                # 增加金币，任务积分即为金币数量
-                user.total_gold += task.points
+                # 增加金币，任务积分即为金币数量（惩罚任务积分为负，最多扣到0）
+                if change_gold(user.id, task.points, REASON_TASK_COMPLETE, task_id=task.id, clamp=True) is None:
+                    db.session.rollback()
+                    logger.error('完成任务时修改金币失败', extra={'task_id': task_id, 'user_id': user.id})
+                    return jsonify({'success': False, 'message': '修改金币失败'}), 500
                 
             # 如果有当前操作用户且与任务所属用户不同（子账号完成主账号任务）
             if current_user and current_user.id != task.user_id:
@@ -853,7 +845,10 @@ def register_routes(app):
             # 任务从已完成变为未完成，需要撤销金币
             if user:
                 # 扣除金币，不允许金币变为负数
-                user.total_gold = max(0, user.total_gold - task.points)
+                if change_gold(user.id, -task.points, REASON_TASK_UNCOMPLETE, task_id=task.id, clamp=True) is None:
+                    db.session.rollback()
+                    logger.error('撤销完成任务时修改金币失败', extra={'task_id': task_id, 'user_id': user.id})
+                    return jsonify({'success': False, 'message': '修改金币失败'}), 500
             
             # 如果有当前操作用户且与任务所属用户不同（子账号撤销主账号任务完成）
             if current_user and current_user.id != task.user_id:
@@ -905,46 +900,55 @@ def register_routes(app):
                 )
                 db.session.add(task_user_log)
         
+        # 影响统计的字段变化时刷新日统计和打卡位图（原日期和新日期）
+        if any(field in data for field in ('status', 'start_date', 'category', 'actual_time', 'points')):
+            for day in {old_start_date, task.start_date}:
+                refresh_daily_stats(task.user_id, day)
+        
         # 确保只提交一次，这样任务状态更新和金币变更会在同一个事务中完成
         db.session.commit()
         
         return jsonify({'success': True})
     
-    @app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
+    @app.route('/api/tasks/<int(signed=True):task_id>', methods=['DELETE'])
     def delete_task(task_id):
         try:
             app.logger.info(f"开始删除任务，task_id: {task_id}")
-            task = Task.query.get(task_id)
+            task = load_task(task_id, materialize=False)
+            if not task and is_virtual_task_id(task_id):
+                # 尚未写入的虚拟任务：记录该天已删除，不再展开
+                series, day = skip_occurrence(task_id)
+                if series is None:
+                    app.logger.warning(f"任务不存在，task_id: {task_id}")
+                    return jsonify({'success': False, 'message': '任务不存在'})
+                log = OperationLog(
+                    user_id=series.user_id,
+                    user_nickname='系统',
+                    operation_type='删除任务',
+                    operation_content=f'删除任务：{series.name}',
+                    operation_time=datetime.now(),
+                    operation_result='成功'
+                )
+                db.session.add(log)
+                db.session.commit()
+                app.logger.info(f"虚拟任务删除成功，task_id: {task_id}")
+                return jsonify({'success': True})
             if not task:
                 app.logger.warning(f"任务不存在，task_id: {task_id}")
                 return jsonify({'success': False, 'message': '任务不存在'})
+            task_id = task.id
             
             user_id = task.user_id
             task_name = task.name
             task_points = task.points
             task_status = task.status
+            task_start_date = task.start_date
             
             app.logger.info(f"获取任务信息成功，user_id: {user_id}, task_name: {task_name}, task_status: {task_status}")
             
             # 初始化操作者名称，避免未定义的情况
             operator_name = '系统'
             
-            # 删除任务相关的附件目录（图片、音频等），无论images字段是否为空
-            try:
-                upload_folder = app.config['UPLOAD_FOLDER']
-                task_dir = os.path.join(upload_folder, 'task_images', str(user_id), str(task_id))
-                import shutil
-                if os.path.exists(task_dir):
-                    try:
-                        shutil.rmtree(task_dir)
-                        app.logger.info(f"已删除任务附件目录及其内容: {task_dir}")
-                    except Exception as e:
-                        app.logger.error(f"删除任务附件目录失败 {task_dir}: {str(e)}")
-                else:
-                    app.logger.info(f"任务附件目录不存在: {task_dir}")
-            except Exception as e:
-                app.logger.error(f"清理任务附件目录时出错: {str(e)}")
-
             # 先删除该任务的所有备注，避免外键约束导致事务失败
             try:
                 remarks = TaskRemark.query.filter_by(task_id=task_id).all()
@@ -960,8 +964,8 @@ def register_routes(app):
                 # 获取用户
                 user = User.query.get(user_id)
                 if user:
-                    # 扣除金币
-                    user.total_gold = max(0, user.total_gold - task_points)
+                    # 扣除金币，不允许金币变为负数
+                    change_gold(user.id, -task_points, REASON_TASK_DELETE, task_id=task_id, clamp=True)
                     
                     # 获取操作用户信息
                     # 注意：这里使用任务所属用户作为操作者
@@ -995,9 +999,15 @@ def register_routes(app):
             )
             db.session.add(log)
             
+            # 更新日统计和打卡位图
+            refresh_daily_stats(user_id, task_start_date)
+            
             # 合并为一次提交，确保任务删除和日志记录在同一个事务中完成
             db.session.commit()
             
+            # 提交成功后再把任务附件目录（图片、音频等）交给后台线程删除，无论images字段是否为空
+            remove_dirs_later([task_attachment_dir(app.config['UPLOAD_FOLDER'], user_id, task_id)])
+            
             app.logger.info(f"任务删除成功，task_id: {task_id}")
             return jsonify({'success': True})
         except Exception as e:
@@ -1006,12 +1016,252 @@ def register_routes(app):
             app.logger.error(f"删除任务时发生异常，task_id: {task_id}, 错误信息: {str(e)}")
             return jsonify({'success': False, 'message': f'删除任务失败: {str(e)}'})
     
+    # 批量修改任务支持的操作：操作日志类型、日志中的动作描述
+    BULK_TASK_OPERATIONS = {
+        'complete': ('任务完成', '完成'),
+        'uncomplete': ('任务撤销', '撤销完成'),
+        'delete': ('删除任务', '删除'),
+        'move': ('更新任务', '调整日期'),
+        'recategorize': ('更新任务', '修改分类'),
+    }
+    # 单次批量修改的任务数上限
+    BULK_TASK_LIMIT = 500
+
+    @app.route('/api/tasks/bulk', methods=['POST'])
+    def bulk_update_tasks():
+        """
+        批量修改同一用户的多个任务：{task_ids: [...], operation, date(move), category(recategorize), current_user_id}。
+        状态变化规则与单个任务的更新、删除一致（完成加积分、撤销完成扣积分、删除已完成的正积分任务扣回积分），
+        每种操作只执行一条 UPDATE/DELETE，金币按净变化量修改一次，只写一条汇总日志，在一个事务中提交。
+        """
+        data = request.json or {}
+        operation = data.get('operation')
+        if operation not in BULK_TASK_OPERATIONS:
+            return jsonify({'success': False, 'message': f'不支持的操作，可选：{", ".join(BULK_TASK_OPERATIONS)}'}), 400
+        task_ids = data.get('task_ids')
+        if not isinstance(task_ids, list) or not task_ids \
+                or any(isinstance(task_id, bool) or not isinstance(task_id, int) for task_id in task_ids):
+            return jsonify({'success': False, 'message': 'task_ids 必须是非空的任务ID列表'}), 400
+        task_ids = list(dict.fromkeys(task_ids))
+        if len(task_ids) > BULK_TASK_LIMIT:
+            return jsonify({'success': False, 'message': f'一次最多修改{BULK_TASK_LIMIT}个任务'}), 400
+
+        target_date = None
+        category = None
+        if operation == 'move':
+            target_date = data.get('date')
+            if not parse_day(target_date):
+                return jsonify({'success': False, 'message': '日期格式错误，应为YYYY-MM-DD'}), 400
+        elif operation == 'recategorize':
+            category = (data.get('category') or '').strip()
+            if not category:
+                return jsonify({'success': False, 'message': '分类不能为空'}), 400
+
+        try:
+            # 虚拟任务：删除时写入例外记录，其他操作先写入 Task 记录再与普通任务一起修改
+            real_ids = [task_id for task_id in task_ids if not is_virtual_task_id(task_id)]
+            not_found = []
+            skipped = []
+            for task_id in task_ids:
+                if not is_virtual_task_id(task_id):
+                    continue
+                task = load_task(task_id, materialize=operation != 'delete')
+                if task is None and operation == 'delete':
+                    series, day = skip_occurrence(task_id)
+                    if series is not None:
+                        skipped.append((series.user_id, day.strftime('%Y-%m-%d'), series.name))
+                        continue
+                if task is None:
+                    not_found.append(task_id)
+                else:
+                    real_ids.append(task.id)
+
+            rows = db.session.query(Task.id, Task.user_id, Task.start_date).filter(Task.id.in_(real_ids)).all()
+            found_ids = {row.id for row in rows}
+            not_found.extend(task_id for task_id in task_ids if not is_virtual_task_id(task_id) and task_id not in found_ids)
+
+            owners = {row.user_id for row in rows} | {user_id for user_id, _, _ in skipped}
+            if not owners:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': '任务不存在', 'not_found': not_found}), 404
+            if len(owners) > 1:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': '只能批量修改同一用户的任务'}), 400
+            owner_id = owners.pop()
+            days = {row.start_date for row in rows} | {day for _, day, _ in skipped}
+
+            conditions = [Task.id.in_(found_ids)]
+            now = datetime.now()
+            changed = []
+            gold_delta = 0
+            deleted_ids = []
+            if found_ids and operation == 'complete':
+                changed = db.session.execute(
+                    db.update(Task).where(*conditions, Task.status != '已完成')
+                    .values(status='已完成', updated_at=now).returning(Task.id, Task.name, Task.points),
+                    execution_options={'synchronize_session': False}
+                ).all()
+                gold_delta = sum(row.points or 0 for row in changed)
+            elif found_ids and operation == 'uncomplete':
+                changed = db.session.execute(
+                    db.update(Task).where(*conditions, Task.status == '已完成')
+                    .values(status='未完成', updated_at=now).returning(Task.id, Task.name, Task.points),
+                    execution_options={'synchronize_session': False}
+                ).all()
+                gold_delta = -sum(row.points or 0 for row in changed)
+            elif found_ids and operation == 'delete':
+                # 先删除备注，避免外键约束导致删除失败
+                TaskRemark.query.filter(TaskRemark.task_id.in_(found_ids)).delete(synchronize_session=False)
+                changed = db.session.execute(
+                    db.delete(Task).where(*conditions).returning(Task.id, Task.name, Task.points, Task.status),
+                    execution_options={'synchronize_session': False}
+                ).all()
+                gold_delta = -sum(row.points for row in changed if row.status == '已完成' and (row.points or 0) > 0)
+                deleted_ids = [row.id for row in changed]
+            elif found_ids and operation == 'move':
+                # 单日任务（结束日期等于开始日期）或结束日期早于新日期时，结束日期随之调整
+                end_date = db.case(
+                    ((Task.end_date == Task.start_date) | (Task.end_date < target_date), target_date),
+                    else_=Task.end_date
+                )
+                changed = db.session.execute(
+                    db.update(Task).where(*conditions)
+                    .values(start_date=target_date, end_date=end_date, updated_at=now).returning(Task.id, Task.name),
+                    execution_options={'synchronize_session': False}
+                ).all()
+                days.add(target_date)
+            elif found_ids and operation == 'recategorize':
+                changed = db.session.execute(
+                    db.update(Task).where(*conditions)
+                    .values(category=category, category_id=category_id_for(category), updated_at=now)
+                    .returning(Task.id, Task.name),
+                    execution_options={'synchronize_session': False}
+                ).all()
+
+            # 金币按净变化量修改一次（不允许变为负数）
+            if gold_delta:
+                reason = {'complete': REASON_TASK_COMPLETE, 'uncomplete': REASON_TASK_UNCOMPLETE}.get(operation, REASON_TASK_DELETE)
+                change_gold(owner_id, gold_delta, reason, clamp=True)
+
+            updated = len(changed) + len(skipped)
+            if updated:
+                refresh_daily_stats(owner_id, min(days), max(days))
+
+                # 记录一条汇总日志：子账号操作主账号任务时记在操作用户名下
+                current_user_id = data.get('current_user_id') or request.args.get('current_user_id', type=int)
+                current_user = User.query.get(current_user_id) if current_user_id else None
+                owner = User.query.get(owner_id)
+                owner_nickname = owner.nickname or owner.username if owner else '未知用户'
+                operation_type, action = BULK_TASK_OPERATIONS[operation]
+                if operation == 'move':
+                    action = f'{action}到{target_date}'
+                elif operation == 'recategorize':
+                    action = f'{action}为{category}'
+                names = [row.name for row in changed] + [name for _, _, name in skipped]
+                names_text = '、'.join(names[:10]) + ('等' if len(names) > 10 else '')
+                gold_text = ''
+                if gold_delta > 0:
+                    gold_text = f'，获得{gold_delta}金币'
+                elif gold_delta < 0:
+                    gold_text = f'，扣除{-gold_delta}金币'
+                if current_user and current_user.id != owner_id:
+                    log_user_id = current_user.id
+                    log_nickname = current_user.nickname or current_user.username
+                    content = f'批量{action}了用户{owner_nickname}的{updated}个任务：{names_text}{gold_text}'
+                else:
+                    log_user_id = owner_id
+                    log_nickname = owner_nickname
+                    content = f'批量{action}{updated}个任务：{names_text}{gold_text}'
+                db.session.add(OperationLog(
+                    user_id=log_user_id,
+                    user_nickname=log_nickname,
+                    operation_type=operation_type,
+                    operation_content=content,
+                    operation_time=now,
+                    operation_result='成功'
+                ))
+
+            db.session.commit()
+
+            # 提交成功后再把删除任务的附件目录交给后台线程删除
+            if deleted_ids:
+                upload_folder = app.config['UPLOAD_FOLDER']
+                remove_dirs_later(task_attachment_dir(upload_folder, owner_id, task_id) for task_id in deleted_ids)
+
+            return jsonify({
+                'success': True,
+                'updated': updated,
+                'task_ids': [row.id for row in changed],
+                'not_found': not_found,
+                'gold_delta': gold_delta
+            })
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"批量修改任务失败，operation: {operation}, 错误信息: {str(e)}")
+            return jsonify({'success': False, 'message': f'批量修改任务失败: {str(e)}'}), 500
+
+    # 复制某一天的任务计划到其他日期（目标日期列表或日期范围）
+    @app.route('/api/tasks/clone-day', methods=['POST'])
+    def clone_day_plan():
+        data = request.json or {}
+        user_id = data.get('user_id')
+        user = User.query.get(user_id) if user_id else None
+        if not user:
+            return jsonify({'success': False, 'message': '用户不存在'}), 404
+        effective_user_id = user.parent_id or user.id
+
+        source_day = parse_day(data.get('source_date'))
+        if source_day is None:
+            return jsonify({'success': False, 'message': '源日期格式错误，应为YYYY-MM-DD'}), 400
+        if data.get('target_dates') is not None:
+            target_dates = data.get('target_dates')
+            if not isinstance(target_dates, list):
+                return jsonify({'success': False, 'message': 'target_dates 必须是日期列表'}), 400
+            target_days = [parse_day(value) for value in target_dates]
+        else:
+            range_start, range_end = parse_day(data.get('target_start')), parse_day(data.get('target_end'))
+            if range_start is None or range_end is None or range_end < range_start:
+                return jsonify({'success': False, 'message': '请提供目标日期列表或有效的日期范围'}), 400
+            if (range_end - range_start).days >= CLONE_MAX_TARGETS:
+                return jsonify({'success': False, 'message': f'一次最多复制到{CLONE_MAX_TARGETS}天'}), 400
+            target_days = expand_target_days(range_start, range_end)
+        if any(day is None for day in target_days):
+            return jsonify({'success': False, 'message': '目标日期格式错误，应为YYYY-MM-DD'}), 400
+        # 去重并排除源日期本身
+        target_days = sorted(set(target_days) - {source_day})
+        if not target_days:
+            return jsonify({'success': False, 'message': '没有需要复制的目标日期'}), 400
+        if len(target_days) > CLONE_MAX_TARGETS:
+            return jsonify({'success': False, 'message': f'一次最多复制到{CLONE_MAX_TARGETS}天'}), 400
+
+        try:
+            created = clone_day_tasks(effective_user_id, source_day, target_days, data.get('category'))
+            total = sum(created.values())
+            if total:
+                refresh_daily_stats(effective_user_id, target_days[0].isoformat(), target_days[-1].isoformat())
+                db.session.add(OperationLog(
+                    user_id=effective_user_id,
+                    user_nickname=user.nickname or user.username,
+                    operation_type='批量添加任务',
+                    operation_content=f'复制{source_day.isoformat()}的任务到{len(target_days)}天'
+                                      f'（{target_days[0].isoformat()}至{target_days[-1].isoformat()}），共{total}个任务',
+                    operation_time=datetime.now(),
+                    operation_result='成功'
+                ))
+            db.session.commit()
+            return jsonify({'success': True, 'created': total, 'per_date': created})
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"复制任务计划失败，用户ID: {user_id}, 错误信息: {str(e)}")
+            return jsonify({'success': False, 'message': f'复制任务计划失败: {str(e)}'}), 500
+
     # 上传任务图片
-    @app.route('/api/tasks/<int:task_id>/upload', methods=['POST'])
+    @app.route('/api/tasks/<int(signed=True):task_id>/upload', methods=['POST'])
     def upload_task_images(task_id):
-        task = Task.query.get(task_id)
+        task = load_task(task_id)
         if not task:
             return jsonify({'success': False, 'message': '任务不存在'})
+        task_id = task.id
         
         if 'file' not in request.files:
             return jsonify({'success': False, 'message': '没有文件上传'})
@@ -1078,10 +1328,94 @@ def register_routes(app):
             return send_from_directory(AVATAR_ROOT_FOLDER, safe_filename)
         except FileNotFoundError:
             return jsonify({'success': False, 'message': '文件不存在'}), 404
-        except Exception as e:
-            print(f"提供头像文件时出错: {str(e)}")
+        except Exception:
+            logger.exception('提供头像文件时出错', extra={'filename': safe_filename})
             return jsonify({'success': False, 'message': '服务器错误'}), 500
     
+    @app.route('/api/tasks/series/<series_id>', methods=['PATCH'])
+    def update_task_series(series_id):
+        """
+        批量编辑任务系列。
+        请求体为要修改的字段（name、description、icon、category、planned_time、points），
+        支持可选查询参数 from_date (YYYY-MM-DD)，提供时只修改该日期及之后的任务。
+        已写入的任务用一条UPDATE修改；已完成任务的积分变化合并为一次金币调整，只记录一条操作日志。
+        """
+        data = request.json or {}
+        from_date = request.args.get('from_date')
+        changes = {field: data[field] for field in SERIES_EDITABLE_FIELDS if field in data}
+        if not changes:
+            return jsonify({'success': False, 'message': '没有需要修改的字段'}), 400
+        for field in ('planned_time', 'points'):
+            if field in changes:
+                if isinstance(changes[field], bool) or not isinstance(changes[field], int):
+                    return jsonify({'success': False, 'message': f'{field} 必须为整数'}), 400
+        for field in ('name', 'category'):
+            if field in changes and not (changes[field] or '').strip():
+                return jsonify({'success': False, 'message': f'{field} 不能为空'}), 400
+        if from_date and not parse_day(from_date):
+            return jsonify({'success': False, 'message': 'from_date 格式应为 YYYY-MM-DD'}), 400
+
+        try:
+            conditions = [Task.series_id == series_id]
+            if from_date:
+                conditions.append(Task.start_date >= from_date)
+
+            # 修改前汇总：任务数、日期范围，以及已完成任务的数量和原积分之和
+            is_completed = Task.status == '已完成'
+            user_id, task_count, first_date, last_date, completed_count, completed_points = db.session.query(
+                db.func.min(Task.user_id),
+                db.func.count(Task.id),
+                db.func.min(Task.start_date),
+                db.func.max(Task.start_date),
+                db.func.sum(db.case((is_completed, 1), else_=0)),
+                db.func.sum(db.case((is_completed, Task.points), else_=0))
+            ).filter(*conditions).one()
+
+            rules = update_series_rules(series_id, changes, from_date)
+            if not task_count and not rules:
+                return jsonify({'success': False, 'message': '任务系列不存在或没有匹配的任务'})
+            user_id = user_id or rules[0].user_id
+
+            updated = 0
+            if task_count:
+                values = dict(changes, updated_at=datetime.now())
+                if 'category' in changes:
+                    values['category_id'] = category_id_for(changes['category'])
+                updated = Task.query.filter(*conditions).update(values, synchronize_session=False)
+
+            # 已完成任务按新旧积分之差调整金币（减少时最多扣到0）
+            gold_delta = 0
+            if 'points' in changes and completed_count:
+                gold_delta = changes['points'] * completed_count - (completed_points or 0)
+                if gold_delta:
+                    change_gold(user_id, gold_delta, REASON_SERIES_EDIT, clamp=True)
+
+            # 分类和积分影响日统计
+            if task_count and ('category' in changes or 'points' in changes):
+                refresh_daily_stats(user_id, first_date, last_date)
+
+            current_user_id = request.args.get('current_user_id', type=int)
+            operator = User.query.get(current_user_id or user_id)
+            scope_text = f'{from_date}及之后的任务' if from_date else '所有任务'
+            changed_text = '，'.join(f'{field}={value}' for field, value in changes.items())
+            gold_text = f'，金币{gold_delta:+d}' if gold_delta else ''
+            log = OperationLog(
+                user_id=operator.id if operator else user_id,
+                user_nickname=(operator.nickname or operator.username) if operator else '未知用户',
+                operation_type='编辑任务系列',
+                operation_content=f'编辑系列({series_id})的{scope_text}：{changed_text}，共{updated}个任务{gold_text}',
+                operation_time=datetime.now(),
+                operation_result='成功'
+            )
+            db.session.add(log)
+            db.session.commit()
+
+            return jsonify({'success': True, 'updated': updated, 'rules': len(rules), 'gold_delta': gold_delta})
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"编辑任务系列时发生异常，series_id: {series_id}, 错误信息: {str(e)}")
+            return jsonify({'success': False, 'message': f'编辑任务系列失败: {str(e)}'}), 500
+
     @app.route('/api/tasks/series/<series_id>', methods=['DELETE'])
     def delete_task_series(series_id):
         """
@@ -1092,54 +1426,47 @@ def register_routes(app):
         try:
             from_date = request.args.get('from_date')
 
-            # 根据是否提供 from_date 选择删除范围
+            # 根据是否提供 from_date 选择删除范围，以下均为整体操作，不逐条加载任务
+            conditions = [Task.series_id == series_id]
             if from_date:
-                tasks = Task.query.filter(Task.series_id == series_id, Task.start_date >= from_date).all()
-            else:
-                tasks = Task.query.filter_by(series_id=series_id).all()
+                conditions.append(Task.start_date >= from_date)
 
-            if not tasks:
-                return jsonify({'success': False, 'message': '任务系列不存在或没有匹配的任务'})
-
-            user_id = tasks[0].user_id
-            total_deducted_points = 0
-
-            # 为每个任务删除对应的附件目录（图片、音频等）
-            for task in tasks:
-                try:
-                    upload_folder = app.config['UPLOAD_FOLDER']
-                    task_dir = os.path.join(upload_folder, 'task_images', str(user_id), str(task.id))
-                    import shutil
-                    if os.path.exists(task_dir):
-                        try:
-                            shutil.rmtree(task_dir)
-                        except Exception as e:
-                            print(f"删除任务目录时出错 {task_dir}: {str(e)}")
-                except Exception as e:
-                    print(f"删除任务附件目录时出错: {str(e)}")
+            # 一次汇总：任务归属、日期范围、需要扣回的金币（已完成且积分为正的任务）
+            refund_points = db.case(((Task.status == '已完成') & (Task.points > 0), Task.points), else_=0)
+            user_id, task_count, first_date, last_date, total_deducted_points = db.session.query(
+                db.func.min(Task.user_id),
+                db.func.count(Task.id),
+                db.func.min(Task.start_date),
+                db.func.max(Task.start_date),
+                db.func.coalesce(db.func.sum(refund_points), 0)
+            ).filter(*conditions).one()
 
-                # 删除任务的备注，避免外键约束导致删除失败
-                try:
-                    remarks = TaskRemark.query.filter_by(task_id=task.id).all()
-                    for r in remarks:
-                        db.session.delete(r)
-                except Exception as e:
-                    print(f"删除任务备注时出错 task_id={task.id}: {str(e)}")
+            # 删除重复规则，或把规则截止到 from_date 前一天（尚未写入的虚拟任务随之消失）
+            rules = delete_series_rules(series_id, from_date)
 
-                # 统计金币扣除（已完成任务）
-                if task.status == '已完成' and task.points > 0:
-                    total_deducted_points += task.points
+            if not task_count and not rules:
+                return jsonify({'success': False, 'message': '任务系列不存在或没有匹配的任务'})
 
-                # 删除任务记录
-                db.session.delete(task)
+            user_id = user_id or rules[0].user_id
+            deleted_ids = []
+            if task_count:
+                # 先删除备注，避免外键约束导致删除失败
+                task_ids = db.session.query(Task.id).filter(*conditions)
+                TaskRemark.query.filter(TaskRemark.task_id.in_(task_ids.scalar_subquery())).delete(
+                    synchronize_session=False
+                )
+                deleted_ids = db.session.execute(
+                    db.delete(Task).where(*conditions).returning(Task.id),
+                    execution_options={'synchronize_session': False}
+                ).scalars().all()
 
             # 更新用户金币数
             if total_deducted_points > 0:
-                user = User.query.get(user_id)
-                if user:
-                    user.total_gold = max(0, user.total_gold - total_deducted_points)
+                change_gold(user_id, -total_deducted_points, REASON_SERIES_DELETE, clamp=True)
 
-            db.session.commit()
+            # 更新日统计和打卡位图
+            if task_count:
+                refresh_daily_stats(user_id, first_date, last_date)
 
             # 记录操作日志（健壮处理current_user可能为空的情况）
             current_user = User.query.get(user_id)
@@ -1157,15 +1484,18 @@ def register_routes(app):
                 operation_result='成功'
             )
             db.session.add(log)
+
+            # 任务删除和日志在同一个事务中提交
             db.session.commit()
 
-            return jsonify({'success': True})
+            # 提交成功后再把附件目录（图片、音频等）交给后台线程删除
+            upload_folder = app.config['UPLOAD_FOLDER']
+            remove_dirs_later(task_attachment_dir(upload_folder, user_id, task_id) for task_id in deleted_ids)
+
+            return jsonify({'success': True, 'deleted': len(deleted_ids)})
         except Exception as e:
             db.session.rollback()
-            try:
-                app.logger.error(f"删除任务系列时发生异常，series_id: {series_id}, 错误信息: {str(e)}")
-            except Exception:
-                print(f"删除任务系列时发生异常，series_id: {series_id}, 错误信息: {str(e)}")
+            app.logger.error(f"删除任务系列时发生异常，series_id: {series_id}, 错误信息: {str(e)}")
             return jsonify({'success': False, 'message': f'删除任务系列失败: {str(e)}'}), 500
     
     # 任务分类相关路由
@@ -1237,14 +1567,8 @@ def register_routes(app):
             if existing_category:
                 return jsonify({'success': False, 'message': '分类名称已存在'})
             
-            # 如果修改了名称，需要同步更新所有使用该分类的任务
-            if data['name'] != category.name:
-                old_name = category.name
-                category.name = data['name']
-                # 更新所有使用该分类的任务
-                tasks = Task.query.filter_by(category=old_name).all()
-                for task in tasks:
-                    task.category = data['name']
+            # 任务和日统计通过 category_id 关联分类，读取时取分类表中的名称，只需修改分类这一行
+            category.name = data['name']
         
         # 更新颜色
         if 'color' in data:
@@ -1276,9 +1600,12 @@ def register_routes(app):
         if category.is_builtin:
             return jsonify({'success': False, 'message': '内置分类不能删除'})
         
-        # 检查是否有任务使用该分类
-        tasks = Task.query.filter_by(category=category.name).all()
-        if tasks:
+        # 检查是否有任务或重复规则使用该分类（按 category_id 索引查询是否存在）
+        in_use = db.session.query(
+            db.exists().where(Task.category_id == category_id)
+            | db.exists().where(TaskSeries.category_id == category_id)
+        ).scalar()
+        if in_use:
             return jsonify({'success': False, 'message': '该分类下还有任务，无法删除'})
         
         db.session.delete(category)
@@ -1289,28 +1616,60 @@ def register_routes(app):
     # 批量更新分类排序
     @app.route('/api/categories/reorder', methods=['PUT'])
     def reorder_categories():
+        """
+        请求体 {user_id, orders: [{id, sort_order}]}。只能调整当前用户自己的分类：内置分类的排序所有用户共用，
+        不能由某个用户修改，包含内置分类或其他用户的分类时返回400。
+        所有排序用一条 UPDATE ... SET sort_order = CASE id WHEN ... END 写入，返回调整后的分类顺序。
+        """
+        data = request.json or {}
+        user_id = data.get('user_id')
+        orders = data.get('orders') or data.get('category_orders') or []
+        if not user_id:
+            return jsonify({'success': False, 'message': '缺少用户ID参数'}), 400
+        if not isinstance(orders, list) or not orders:
+            return jsonify({'success': False, 'message': '请求数据格式错误'}), 400
+
+        new_orders = {}
+        for item in orders:
+            category_id = item.get('id') if isinstance(item, dict) else None
+            sort_order = item.get('sort_order') if isinstance(item, dict) else None
+            if isinstance(category_id, bool) or not isinstance(category_id, int) \
+                    or isinstance(sort_order, bool) or not isinstance(sort_order, int):
+                return jsonify({'success': False, 'message': 'id 和 sort_order 必须为整数'}), 400
+            if category_id in new_orders:
+                return jsonify({'success': False, 'message': f'分类{category_id}重复'}), 400
+            new_orders[category_id] = sort_order
+
+        visible = (TaskCategory.is_builtin == True) | (TaskCategory.user_id == user_id)
         try:
-            data = request.json or {}
-            orders = data.get('orders') or data.get('category_orders') or []
-            if not isinstance(orders, list):
-                return jsonify({'success': False, 'message': '请求数据格式错误'}), 400
+            allowed = {category_id for (category_id,) in db.session.query(TaskCategory.id).filter(
+                TaskCategory.id.in_(list(new_orders)), TaskCategory.user_id == user_id
+            )}
+            invalid = sorted(set(new_orders) - allowed)
+            if invalid:
+                return jsonify({'success': False, 'message': '分类不存在或无权修改', 'invalid_ids': invalid}), 400
 
-            updated = 0
-            for item in orders:
-                cid = item.get('id')
-                order = item.get('sort_order')
-                if cid is None or order is None:
-                    continue
-                category = TaskCategory.query.get(cid)
-                if category:
-                    try:
-                        category.sort_order = int(order)
-                        updated += 1
-                    except Exception:
-                        pass
+            updated = db.session.execute(
+                db.update(TaskCategory)
+                .where(TaskCategory.id.in_(list(new_orders)), TaskCategory.user_id == user_id)
+                .values(sort_order=db.case(new_orders, value=TaskCategory.id)),
+                execution_options={'synchronize_session': False}
+            ).rowcount
             db.session.commit()
-            return jsonify({'success': True, 'updated': updated})
+
+            categories = db.session.query(TaskCategory.id, TaskCategory.name, TaskCategory.sort_order).filter(
+                visible
+            ).order_by(TaskCategory.sort_order.asc(), TaskCategory.name.asc()).all()
+            return jsonify({
+                'success': True,
+                'updated': updated,
+                'categories': [
+                    {'id': category.id, 'name': category.name, 'sort_order': category.sort_order}
+                    for category in categories
+                ]
+            })
         except Exception as e:
+            db.session.rollback()
             return jsonify({'success': False, 'message': str(e)}), 500
     
     # 心愿相关路由
@@ -1372,10 +1731,10 @@ def register_routes(app):
             # 生成图片URL，使用/static/uploads/开头，便于前端直接访问
             image_url = f'/static/uploads/wish/{user_id}/{filename}'
             
-            print(f"图片上传成功: {filepath}")
+            logger.debug('心愿图片上传成功', extra={'path': filepath})
             return jsonify({'success': True, 'image_url': image_url, 'message': '图片上传成功'})
         except Exception as e:
-            print(f"图片上传异常: {str(e)}")
+            logger.exception('心愿图片上传失败')
             return jsonify({'success': False, 'message': f'图片保存失败：{str(e)}'})
     
     @app.route('/api/wishes', methods=['GET'])
@@ -1477,7 +1836,7 @@ def register_routes(app):
                     image_path = wish.icon[len('/static/uploads/'):]
                 else:
                     # 不是上传的图片，可能是内置图标或其他类型，不删除
-                    print(f"跳过删除非上传图片: {wish.icon}")
+                    logger.debug('跳过删除非上传图片', extra={'icon': wish.icon})
                     # 使用continue的替代方案，直接进入下一个if语句块
                     image_path = None
                 
@@ -1486,7 +1845,7 @@ def register_routes(app):
                     # 安全检查：防止路径遍历攻击
                     safe_image_path = os.path.normpath(image_path)
                     if '..' in safe_image_path.split(os.sep):
-                        print(f"安全警告：尝试访问受限路径: {image_path}")
+                        logger.warning('安全警告：尝试访问受限路径', extra={'path': image_path})
                         image_path = None
                 
                 # 只有在image_path有效且安全检查通过时才继续执行文件删除逻辑
@@ -1502,16 +1861,16 @@ def register_routes(app):
                         try:
                             if os.path.exists(full_path):
                                 os.remove(full_path)
-                                print(f"删除心愿图片成功: {full_path}")
+                                logger.debug('删除心愿图片成功', extra={'path': full_path})
                             else:
-                                print(f"心愿图片不存在: {full_path}")
-                        except Exception as e:
-                            print(f"删除心愿图片时出错: {str(e)}")
+                                logger.debug('心愿图片不存在', extra={'path': full_path})
+                        except Exception:
+                            logger.exception('删除心愿图片时出错', extra={'path': full_path})
                             # 继续执行，不因图片删除失败而中断删除心愿
                     else:
-                        print(f"安全警告：尝试删除uploads目录外的文件: {full_path}")
-            except Exception as e:
-                print(f"处理心愿图片路径时出错: {str(e)}")
+                        logger.warning('安全警告：尝试删除uploads目录外的文件', extra={'path': full_path})
+            except Exception:
+                logger.exception('处理心愿图片路径时出错', extra={'icon': wish.icon})
         
         db.session.delete(wish)
         db.session.commit()
@@ -1540,45 +1899,79 @@ def register_routes(app):
         # 计算总金币消耗
         total_cost = wish.cost * quantity
         
-        if user.total_gold < total_cost:
+        # 扣除金币：余额检查和扣除在同一条UPDATE中完成，并发兑换不会透支
+        remaining_gold = change_gold(user.id, -total_cost, REASON_WISH_EXCHANGE, wish_id=wish.id)
+        if remaining_gold is None:
+            db.session.rollback()
             return jsonify({'success': False, 'message': '金币不足'})
-        
-        # 扣除金币
-        user.total_gold -= total_cost
         # 增加兑换次数
-        wish.exchange_count += quantity
-        
-        db.session.commit()
+        Wish.query.filter_by(id=wish.id).update(
+            {Wish.exchange_count: db.func.coalesce(Wish.exchange_count, 0) + quantity}, synchronize_session=False
+        )
         
         # 记录操作日志，包含兑换数量和单位信息
         if wish.unit:
             total_amount = wish.exchange_amount * quantity if wish.exchange_amount else quantity
             unit_info = f"{total_amount}{wish.unit}"
         else:
+            total_amount = quantity
             unit_info = str(quantity)
-            
-        # 获取当前操作用户信息
-        current_user = User.query.get(user_id)
         
         # 构建操作内容，包含备注（如果有）
+        safe_remark = str(remark).replace('\n', ' ').strip() if remark else ''
         operation_content = f'兑换心愿：{wish.name}，消耗{total_cost}金币，兑换{unit_info}'
-        if remark:
+        if safe_remark:
             # 清理换行，避免解析影响
-            safe_remark = str(remark).replace('\n', ' ').strip()
             operation_content += f'，备注：{safe_remark}'
 
+        now = datetime.now()
         log = OperationLog(
-            user_id=user_id,
-            user_nickname=current_user.nickname or current_user.username if current_user else '未知用户',  # 使用昵称或用户名
+            user_id=user.id,
+            user_nickname=user.nickname or user.username,  # 使用昵称或用户名
             operation_type='兑换心愿',
             operation_content=operation_content,
-            operation_time=datetime.now(),
+            operation_time=now,
             operation_result='成功'
         )
         db.session.add(log)
+        db.session.flush()
+        
+        # 结构化的兑换记录，与扣除金币、操作日志在同一事务中提交
+        db.session.add(WishExchange(
+            user_id=user.id,
+            wish_id=wish.id,
+            wish_name=wish.name,
+            quantity=quantity,
+            total_cost=total_cost,
+            amount=total_amount,
+            unit=wish.unit,
+            remark=safe_remark or None,
+            operation_log_id=log.id,
+            created_at=now
+        ))
         db.session.commit()
         
-        return jsonify({'success': True, 'remaining_gold': user.total_gold, 'total_cost': total_cost, 'quantity': quantity})
+        return jsonify({'success': True, 'remaining_gold': remaining_gold, 'total_cost': total_cost, 'quantity': quantity})
+    
+    def serialize_exchange(exchange, username, wish_name, wish_icon):
+        if exchange.unit:
+            exchange_info = f'{exchange.amount}{exchange.unit}'
+        else:
+            exchange_info = str(exchange.quantity)
+        return {
+            'id': exchange.id,
+            'user_id': exchange.user_id,
+            'username': username,
+            'wish_id': exchange.wish_id,
+            'wish_name': wish_name or exchange.wish_name,
+            'cost': exchange.total_cost,
+            'quantity': exchange.quantity,
+            'exchange_info': exchange_info,
+            'remark': exchange.remark or '',
+            'operation_time': exchange.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'operation_result': '成功',
+            'icon': wish_icon
+        }
     
     @app.route('/api/exchange-history', methods=['GET'])
     def get_exchange_history():
@@ -1594,84 +1987,52 @@ def register_routes(app):
         if not user:
             return jsonify({'success': False, 'message': '用户不存在'})
         
-        # 构建查询条件，支持主账号和子账号之间的双向可见性
-        # 获取用户及其关联账号（主账号和子账号）的所有兑换记录
-        related_user_ids = [user_id]
+        # 支持主账号和子账号之间的双向可见性：主账号及其所有子账号的兑换记录
+        root_id = user.parent_id or user.id
+        related_user_ids = db.session.query(User.id).filter(
+            db.or_(User.id == root_id, User.parent_id == root_id)
+        ).scalar_subquery()
+        
+        # 单条关联查询取一页兑换记录，心愿取当前名称和图标（心愿被删除时使用兑换时的名称）
+        query = db.session.query(WishExchange, User.username, Wish.name, Wish.icon).join(
+            User, User.id == WishExchange.user_id
+        ).outerjoin(
+            Wish, Wish.id == WishExchange.wish_id
+        ).filter(
+            WishExchange.user_id.in_(related_user_ids)
+        )
         
-        # 如果是主账号，包含所有子账号的ID
-        if user.parent_id is None:
-            subaccounts = User.query.filter_by(parent_id=user_id).all()
-            related_user_ids.extend([sub.id for sub in subaccounts])
-        # 如果是子账号，包含主账号的ID
-        elif user.parent_id:
-            related_user_ids.append(user.parent_id)
-            # 同时包含其他兄弟子账号的ID
-            siblings = User.query.filter_by(parent_id=user.parent_id).filter(User.id != user_id).all()
-            related_user_ids.extend([sibling.id for sibling in siblings])
+        # 游标分页模式：?cursor=<created_at,id>&limit=，第一页传空的cursor
+        if 'cursor' in request.args:
+            try:
+                cursor = parse_cursor(request.args.get('cursor'))
+            except ValueError:
+                return jsonify({'success': False, 'message': 'cursor格式错误'}), 400
+            limit = parse_limit(request.args.get('limit'))
+            rows, next_cursor = keyset_page(query, WishExchange.created_at, WishExchange.id, cursor, limit)
+            response = {
+                'success': True,
+                'data': [serialize_exchange(*row) for row in rows],
+                'next_cursor': next_cursor
+            }
+            if request.args.get('with_total') == '1':
+                response['total'] = count_cache.get(
+                    ('exchange-history', root_id),
+                    lambda: WishExchange.query.filter(WishExchange.user_id.in_(related_user_ids)).count()
+                )
+            return jsonify(response)
         
-        # 查询兑换心愿的操作日志，按时间倒序排列
-        logs = OperationLog.query.filter(
-            OperationLog.user_id.in_(related_user_ids),
-            OperationLog.operation_type=='兑换心愿'
-        ).order_by(OperationLog.operation_time.desc()).paginate(
+        exchanges = query.order_by(WishExchange.created_at.desc(), WishExchange.id.desc()).paginate(
             page=page,
             per_page=per_page,
             error_out=False
         )
         
-        result = []
-        for log in logs.items:
-            # 获取用户信息
-            log_user = User.query.get(log.user_id)
-            username = log_user.username if log_user else f'用户{log.user_id}'
-            
-            # 从操作内容中提取心愿名称、消耗金币和兑换数量信息
-            content = log.operation_content
-            
-            # 解析心愿名称
-            wish_name_match = re.search(r'兑换心愿：([^，]+)', content)
-            wish_name = wish_name_match.group(1) if wish_name_match else '未知心愿'
-            
-            # 解析消耗金币
-            cost_match = re.search(r'消耗(\d+)金币', content)
-            cost = int(cost_match.group(1)) if cost_match else 0
-            
-            # 解析兑换数量和单位
-            exchange_match = re.search(r'兑换([^，]+)', content)
-            exchange_info = exchange_match.group(1) if exchange_match else '未知数量'
-            
-            # 解析备注（可选）
-            remark_match = re.search(r'备注：(.+)', content)
-            remark = remark_match.group(1).strip() if remark_match else ''
-
-            # 查询心愿图标信息
-            wish_icon = None
-            try:
-                # 根据心愿名称查询心愿图标
-                wish = Wish.query.filter_by(name=wish_name).first()
-                if wish:
-                    wish_icon = wish.icon
-            except Exception as e:
-                print(f'查询心愿图标失败: {str(e)}')
-            
-            result.append({
-                'id': log.id,
-                'user_id': log.user_id,
-                'username': username,
-                'wish_name': wish_name,
-                'cost': cost,
-                'exchange_info': exchange_info,
-                'remark': remark,
-                'operation_time': log.operation_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'operation_result': log.operation_result,
-                'icon': wish_icon
-            })
-        
         return jsonify({
             'success': True,
-            'data': result,
-            'total': logs.total,
-            'pages': logs.pages,
+            'data': [serialize_exchange(*row) for row in exchanges.items],
+            'total': exchanges.total,
+            'pages': exchanges.pages,
             'page': page,
             'per_page': per_page
         })
@@ -1684,12 +2045,20 @@ def register_routes(app):
         amount = data.get('amount')
         reason = data.get('reason')
         
+        try:
+            amount = int(amount)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': '金币数量必须是整数'})
+        
         user = User.query.get(user_id)
         if not user:
             return jsonify({'success': False, 'message': '用户不存在'})
         
-        # 更新金币
-        user.total_gold += amount
+        # 更新金币（原子增减，扣除时余额不足则不修改）
+        total_gold = change_gold(user.id, amount, REASON_MANUAL_ADJUST)
+        if total_gold is None:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': '金币不足'})
         
         db.session.commit()
         
@@ -1707,10 +2076,70 @@ def register_routes(app):
         db.session.add(log)
         db.session.commit()
         
-        return jsonify({'success': True, 'total_gold': user.total_gold})
-    
+        return jsonify({'success': True, 'total_gold': total_gold})
+
+    # 金币流水（按流水ID倒序翻页，cursor 为上一页返回的 next_cursor）
+    @app.route('/api/gold/history', methods=['GET'])
+    def get_gold_history():
+        user_id = request.args.get('user_id', type=int)
+        cursor = request.args.get('cursor', type=int)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        if not user_id:
+            return jsonify({'success': False, 'message': '缺少用户ID'}), 400
+
+        query = GoldLedger.query.filter(GoldLedger.user_id == user_id)
+        if cursor:
+            query = query.filter(GoldLedger.id < cursor)
+        entries = query.order_by(GoldLedger.id.desc()).limit(limit + 1).all()
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        return jsonify({
+            'success': True,
+            'data': [{
+                'id': entry.id,
+                'delta': entry.delta,
+                'reason_code': entry.reason_code,
+                'reason': REASON_LABELS.get(entry.reason_code, entry.reason_code),
+                'task_id': entry.task_id,
+                'wish_id': entry.wish_id,
+                'balance_after': entry.balance_after,
+                'created_at': entry.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            } for entry in entries],
+            'next_cursor': entries[-1].id if has_more else None
+        })
+
+    # 查询某一时刻的金币余额（最近的快照 + 有限条流水）
+    @app.route('/api/gold/balance-at', methods=['GET'])
+    def get_gold_balance_at():
+        user_id = request.args.get('user_id', type=int)
+        at = request.args.get('time')
+        if not user_id or not at:
+            return jsonify({'success': False, 'message': '缺少必要参数'}), 400
+        try:
+            at_time = datetime.strptime(at, '%Y-%m-%d %H:%M:%S') if ' ' in at else \
+                datetime.strptime(at, '%Y-%m-%d') + timedelta(days=1, microseconds=-1)
+        except ValueError:
+            return jsonify({'success': False, 'message': '时间格式错误，应为YYYY-MM-DD或YYYY-MM-DD HH:MM:SS'}), 400
+
+        balance = balance_at(user_id, at_time)
+        if balance is None:
+            return jsonify({'success': False, 'message': '该时间之前没有金币流水记录'})
+        return jsonify({'success': True, 'balance': balance, 'time': at_time.strftime('%Y-%m-%d %H:%M:%S')})
+
     # 用户信息路由已在文件开头定义，包含完整用户信息
     
+    def serialize_operation_log(log):
+        return {
+            'id': log.id,
+            'user_nickname': log.user_nickname,  # 使用用户昵称代替操作人
+            'operation_type': log.operation_type,
+            'operation_content': log.operation_content,
+            'operation_time': log.operation_time.strftime('%Y-%m-%d %H:%M:%S') if log.operation_time else None,
+            'operation_result': log.operation_result,
+            'user_id': log.user_id  # 添加用户ID以便前端识别操作来源
+        }
+    
     # 操作记录路由
     @app.route('/api/logs', methods=['GET'])
     def get_operation_logs():
@@ -1761,6 +2190,26 @@ def register_routes(app):
                 # 时间格式不正确，忽略该参数
                 pass
         
+        # 游标分页模式：?cursor=<operation_time,id>&limit=，第一页传空的cursor
+        if 'cursor' in request.args:
+            try:
+                cursor = parse_cursor(request.args.get('cursor'))
+            except ValueError:
+                return jsonify({'success': False, 'message': 'cursor格式错误'}), 400
+            limit = parse_limit(request.args.get('limit'))
+            logs, next_cursor = keyset_page(query, OperationLog.operation_time, OperationLog.id, cursor, limit)
+            response = {
+                'success': True,
+                'data': [serialize_operation_log(log) for log in logs],
+                'next_cursor': next_cursor
+            }
+            # 总数可选，按查询条件缓存一段时间
+            if request.args.get('with_total') == '1':
+                response['total'] = count_cache.get(
+                    ('logs', tuple(related_user_ids), start_time_str, end_time_str), query.count
+                )
+            return jsonify(response)
+        
         # 如果没有提供时间范围，默认获取最近一个月的记录
         if not start_time_str and not end_time_str:
             one_month_ago = datetime.now() - timedelta(days=30)
@@ -1770,31 +2219,17 @@ def register_routes(app):
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         
-        # 获取总数
-        total = query.count()
-        
-        # 获取分页数据
+        # 获取分页数据（paginate 同时返回总数）
         pagination = query.order_by(OperationLog.operation_time.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
-        logs = pagination.items
-        result = []
-        for log in logs:
-            result.append({
-                'id': log.id,
-                'user_nickname': log.user_nickname,  # 使用用户昵称代替操作人
-                'operation_type': log.operation_type,
-                'operation_content': log.operation_content,
-                'operation_time': log.operation_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'operation_result': log.operation_result,
-                'user_id': log.user_id  # 添加用户ID以便前端识别操作来源
-            })
+        result = [serialize_operation_log(log) for log in pagination.items]
         
         return jsonify({
             'success': True, 
             'data': result,
-            'total': total,
+            'total': pagination.total,
             'pages': pagination.pages,
             'current_page': page
         })
@@ -1862,9 +2297,6 @@ def register_routes(app):
     # 荣誉达成检测路由
     @app.route('/api/honors/check', methods=['POST'])
     def check_and_grant_honors():
-        from datetime import datetime, timedelta
-        import json
-        
         data = request.json
         user_id = data.get('user_id')
         
@@ -1887,359 +2319,13 @@ def register_routes(app):
         # 新获得的荣誉列表
         newly_obtained_honors = []
         
+        # 按规则注册表批量聚合并判断所有荣誉的达成条件（见 honor_rules.py）
+        achieved_names = evaluate_honors([honor.name for honor in all_honors], user, effective_user)
+        
         # 检测每个荣誉的达成条件
         for honor in all_honors:
-            # 如果用户已经获得过该荣誉，跳过（可以根据需要修改为可以重复获得）
             # 这里我们允许重复获得，比如连续打卡可以多次获得
-            
-            # 根据荣誉名称判断达成条件
-            is_achieved = False
-            
-            if honor.name == '连续打卡7天':
-                # 检查连续7天完成任务
-                today = datetime.now().date()
-                consecutive_days = 0
-                
-                for i in range(7):
-                    check_date = today - timedelta(days=i)
-                    check_date_str = check_date.strftime('%Y-%m-%d')
-                    
-                    # 检查该日期是否有完成的任务
-                    tasks = Task.query.filter_by(
-                        user_id=effective_user_id,
-                        start_date=check_date_str,
-                        status='已完成'
-                    ).all()
-                    
-                    if tasks:
-                        consecutive_days += 1
-                    else:
-                        break
-                
-                is_achieved = consecutive_days >= 7
-            
-            elif honor.name == '学习达人':
-                # 检查单日学习时长超过3小时（180分钟）
-                today = datetime.now().date().strftime('%Y-%m-%d')
-                today_tasks = Task.query.filter_by(
-                    user_id=effective_user_id,
-                    start_date=today,
-                    status='已完成'
-                ).all()
-                
-                total_time = sum(task.actual_time for task in today_tasks if task.actual_time)
-                is_achieved = total_time >= 180
-            
-            elif honor.name == '专注达人':
-                # 检查单次学习时长超过1小时
-                completed_tasks = Task.query.filter_by(
-                    user_id=effective_user_id,
-                    status='已完成'
-                ).all()
-                
-                max_time = max((task.actual_time for task in completed_tasks if task.actual_time), default=0)
-                is_achieved = max_time >= 60
-            
-            elif honor.name == '全能选手':
-                # 检查单日完成所有学科任务
-                today = datetime.now().date().strftime('%Y-%m-%d')
-                
-                # 获取所有学科
-                all_subjects = db.session.query(Task.category).filter_by(user_id=effective_user_id).distinct().all()
-                all_subjects = [s[0] for s in all_subjects if s[0]]
-                
-                # 检查每个学科今天是否都有完成的任务
-                all_completed = True
-                for subject in all_subjects:
-                    subject_tasks = Task.query.filter_by(
-                        user_id=effective_user_id,
-                        start_date=today,
-                        category=subject,
-                        status='已完成'
-                    ).all()
-                    
-                    if not subject_tasks:
-                        all_completed = False
-                        break
-                
-                is_achieved = all_completed and all_subjects
-            
-            elif honor.name == '积分富翁':
-                # 检查累计获得积分超过1000
-                is_achieved = effective_user.total_gold >= 1000
-            
-            elif honor.name == '任务高手':
-                # 检查单日完成任务数量超过15个
-                today = datetime.now().date().strftime('%Y-%m-%d')
-                completed_tasks = Task.query.filter_by(
-                    user_id=effective_user_id,
-                    start_date=today,
-                    status='已完成'
-                ).count()
-                is_achieved = completed_tasks >= 15
-            
-            elif honor.name == '勤奋努力':
-                # 检查连续30天有打卡记录
-                today = datetime.now().date()
-                consecutive_days = 0
-                
-                for i in range(30):
-                    check_date = today - timedelta(days=i)
-                    check_date_str = check_date.strftime('%Y-%m-%d')
-                    
-                    tasks = Task.query.filter_by(
-                        user_id=user_id,
-                        start_date=check_date_str
-                    ).all()
-                    
-                    if tasks:
-                        consecutive_days += 1
-                    else:
-                        break
-                
-                is_achieved = consecutive_days >= 30
-            
-            elif honor.name == '周末战士':
-                # 检查周末连续完成任务
-                today = datetime.now().date()
-                # 计算最近的周末
-                if today.weekday() == 5:  # 周六
-                    saturday = today
-                    sunday = today + timedelta(days=1)
-                elif today.weekday() == 6:  # 周日
-                    saturday = today - timedelta(days=1)
-                    sunday = today
-                else:
-                    # 计算距离周六还有几天
-                    days_to_saturday = 5 - today.weekday()
-                    saturday = today + timedelta(days=days_to_saturday)
-                    sunday = saturday + timedelta(days=1)
-                
-                saturday_tasks = Task.query.filter_by(
-                    user_id=user_id,
-                    start_date=saturday.strftime('%Y-%m-%d'),
-                    status='已完成'
-                ).all()
-                
-                sunday_tasks = Task.query.filter_by(
-                    user_id=user_id,
-                    start_date=sunday.strftime('%Y-%m-%d'),
-                    status='已完成'
-                ).all()
-                
-                is_achieved = len(saturday_tasks) > 0 and len(sunday_tasks) > 0
-            
-            elif honor.name == '坚持到底':
-                # 检查连续完成同一任务30天
-                # 这个实现比较复杂，这里简化为检查连续30天都有完成任务
-                today = datetime.now().date()
-                consecutive_days = 0
-                
-                for i in range(30):
-                    check_date = today - timedelta(days=i)
-                    check_date_str = check_date.strftime('%Y-%m-%d')
-                    
-                    tasks = Task.query.filter_by(
-                        user_id=user_id,
-                        start_date=check_date_str,
-                        status='已完成'
-                    ).all()
-                    
-                    if tasks:
-                        consecutive_days += 1
-                    else:
-                        break
-                
-                is_achieved = consecutive_days >= 30
-            
-            elif honor.name == '学科之星':
-                # 检查单科任务完成率100%
-                # 获取用户的所有学科
-                subjects = db.session.query(Task.category).filter_by(user_id=user_id).distinct().all()
-                subjects = [s[0] for s in subjects if s[0]]
-                
-                for subject in subjects:
-                    # 统计该学科的任务总数和已完成数
-                    total_tasks = Task.query.filter_by(user_id=user_id, category=subject).count()
-                    completed_tasks = Task.query.filter_by(
-                        user_id=user_id, 
-                        category=subject, 
-                        status='已完成'
-                    ).count()
-                    
-                    # 如果任务数大于5且完成率为100%，则达成条件
-                    if total_tasks >= 5 and completed_tasks == total_tasks:
-                        is_achieved = True
-                        break
-            
-            elif honor.name == '完美主义':
-                # 检查连续5天任务完成率100%
-                today = datetime.now().date()
-                perfect_days = 0
-                
-                for i in range(5):
-                    check_date = today - timedelta(days=i)
-                    check_date_str = check_date.strftime('%Y-%m-%d')
-                    
-                    day_tasks = Task.query.filter_by(
-                        user_id=user_id,
-                        start_date=check_date_str
-                    ).all()
-                    
-                    if day_tasks:  # 如果当天有任务
-                        completed_tasks = [t for t in day_tasks if t.status == '已完成']
-                        if len(completed_tasks) == len(day_tasks):
-                            perfect_days += 1
-                        else:
-                            break
-                    else:
-                        # 如果当天没有任务，不算作完美天
-                        break
-                
-                is_achieved = perfect_days >= 5
-            
-            elif honor.name == '心愿达人':
-                # 检查累计完成心愿10个
-                # 查询用户兑换心愿的操作日志
-                wish_logs = OperationLog.query.filter_by(
-                    user_id=user_id,
-                    operation_type='兑换心愿'
-                ).count()
-                
-                is_achieved = wish_logs >= 10
-            
-            elif honor.name == '持之以恒':
-                # 检查连续打卡30天
-                today = datetime.now().date()
-                consecutive_days = 0
-                
-                for i in range(30):
-                    check_date = today - timedelta(days=i)
-                    check_date_str = check_date.strftime('%Y-%m-%d')
-                    
-                    tasks = Task.query.filter_by(
-                        user_id=user_id,
-                        start_date=check_date_str,
-                        status='已完成'
-                    ).all()
-                    
-                    if tasks:
-                        consecutive_days += 1
-                    else:
-                        break
-                
-                is_achieved = consecutive_days >= 30
-            
-            elif honor.name == '时间管理':
-                # 检查提前完成任务规划
-                # 这里简化为检查任务的实际时间是否小于计划时间的80%
-                completed_tasks = Task.query.filter_by(
-                    user_id=user_id,
-                    status='已完成'
-                ).filter(Task.planned_time > 0).all()
-                
-                efficient_tasks = 0
-                for task in completed_tasks:
-                    if task.actual_time and task.actual_time <= task.planned_time * 0.8:
-                        efficient_tasks += 1
-                
-                is_achieved = efficient_tasks >= 10
-            
-            elif honor.name == '计划大师':
-                # 检查单日规划任务超过20个
-                today = datetime.now().date().strftime('%Y-%m-%d')
-                today_tasks = Task.query.filter_by(
-                    user_id=user_id,
-                    start_date=today
-                ).count()
-                
-                is_achieved = today_tasks >= 20
-            
-            elif honor.name == '进步神速':
-                # 检查任务完成率提升20%
-                # 这里简化为检查最近7天的完成率是否比之前7天高20%
-                today = datetime.now().date()
-                
-                # 计算最近7天和之前7天的日期范围
-                recent_end = today
-                recent_start = today - timedelta(days=6)
-                previous_end = recent_start - timedelta(days=1)
-                previous_start = previous_end - timedelta(days=6)
-                
-                # 计算最近7天的完成率
-                recent_tasks = Task.query.filter(
-                    Task.user_id == user_id,
-                    Task.start_date >= recent_start.strftime('%Y-%m-%d'),
-                    Task.start_date <= recent_end.strftime('%Y-%m-%d')
-                ).all()
-                
-                recent_completed = len([t for t in recent_tasks if t.status == '已完成'])
-                recent_rate = recent_completed / len(recent_tasks) * 100 if recent_tasks else 0
-                
-                # 计算之前7天的完成率
-                previous_tasks = Task.query.filter(
-                    Task.user_id == user_id,
-                    Task.start_date >= previous_start.strftime('%Y-%m-%d'),
-                    Task.start_date <= previous_end.strftime('%Y-%m-%d')
-                ).all()
-                
-                previous_completed = len([t for t in previous_tasks if t.status == '已完成'])
-                previous_rate = previous_completed / len(previous_tasks) * 100 if previous_tasks else 0
-                
-                # 检查是否提升了20%
-                if previous_rate > 0 and recent_rate >= previous_rate * 1.2:
-                    is_achieved = True
-            
-            elif honor.name == '高效学习':
-                # 检查学习效率提升30%
-                # 这里简化为检查任务的实际时间是否小于计划时间的70%
-                completed_tasks = Task.query.filter_by(
-                    user_id=user_id,
-                    status='已完成'
-                ).filter(Task.planned_time > 0).all()
-                
-                efficient_tasks = 0
-                for task in completed_tasks:
-                    if task.actual_time and task.actual_time <= task.planned_time * 0.7:
-                        efficient_tasks += 1
-                
-                is_achieved = efficient_tasks >= 10
-            
-            elif honor.name == '阅读之星':
-                # 检查累计阅读时长超过10小时（600分钟）
-                # 假设阅读类任务包含"阅读"关键词或属于语文科目
-                reading_tasks = Task.query.filter(
-                    Task.user_id == user_id,
-                    Task.status == '已完成',
-                    Task.name.contains('阅读') | Task.category.contains('语文')
-                ).all()
-                
-                total_reading_time = sum(task.actual_time for task in reading_tasks if task.actual_time)
-                is_achieved = total_reading_time >= 600
-            
-            elif honor.name == '早起鸟':
-                # 检查连续7天在早上6点前打卡
-                today = datetime.now().date()
-                consecutive_early_days = 0
-                
-                for i in range(7):
-                    check_date = today - timedelta(days=i)
-                    check_date_str = check_date.strftime('%Y-%m-%d')
-                    
-                    # 检查该日期最早完成的任务时间
-                    early_tasks = Task.query.filter_by(
-                        user_id=user_id,
-                        start_date=check_date_str,
-                        status='已完成'
-                    ).all()
-                    
-                    if early_tasks:
-                        # 简化实现：假设有任务就认为是早起打卡
-                        consecutive_early_days += 1
-                    else:
-                        break
-                
-                is_achieved = consecutive_early_days >= 7
+            is_achieved = honor.name in achieved_names
             
             # 如果达成条件
             if is_achieved:
@@ -2315,7 +2401,14 @@ def register_routes(app):
     @app.route('/api/statistics', methods=['GET'])
     def get_statistics():
         user_id = request.args.get('user_id')
-        date = request.args.get('date')
+        # 统计周期：day（默认）、week（周一至周日）、month、year
+        period = request.args.get('period', 'day')
+        if period not in STAT_PERIODS:
+            return jsonify({'error': f'不支持的统计周期：{period}'}), 400
+        try:
+            stat_date = parse_stat_date(request.args.get('date'))
+        except ValueError:
+            return jsonify({'error': '日期格式错误，应为YYYY-MM-DD'}), 400
         
         # 获取用户信息，检查是否是子账号
         user = User.query.get(user_id)
@@ -2323,30 +2416,29 @@ def register_routes(app):
             return jsonify({'error': '用户不存在'})
         
         # 如果是子账号，使用父账号的ID来查询数据
-        query_user_id = user.parent_id if user.parent_id else user_id
-        query_user = User.query.get(query_user_id)
-        
-        # 计算日统计数据
-        day_tasks = Task.query.filter_by(user_id=query_user_id, start_date=date).all()
-        
-        # 今日总任务个数（所有状态的任务）
-        total_count = len(day_tasks)
-        # 已完成任务数
-        completed_count = sum(1 for task in day_tasks if task.status == '已完成')
-        # 今日总时长（仅已完成任务的实际时间总和）
-        total_time = sum(task.actual_time for task in day_tasks if task.status == '已完成' and task.actual_time is not None)
-        # 完成率
-        completion_rate = (completed_count / total_count * 100) if total_count > 0 else 0
+        query_user_id = user.parent_id if user.parent_id else user.id
+        query_user = user.parent if user.parent_id else user
         
-        # 计算日金币（已完成任务的积分总和）
-        day_gold = sum(task.points for task in day_tasks if task.status == '已完成')
+        # 从日统计表按主键读取汇总数据
+        start_date, end_date = period_range(stat_date, period)
+        summary = summarize_daily_stats(query_user_id, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        
+        # 总任务个数（所有状态的任务）
+        total_count = summary['total']
+        # 完成率
+        completion_rate = (summary['completed'] / total_count * 100) if total_count > 0 else 0
         
         return jsonify({
-            'day_time': total_time,
-            'task_count': total_count,  # 返回今日总任务个数
-            'day_gold': day_gold,
+            'day_time': summary['completed_time'],  # 已完成任务的实际时间总和
+            'task_count': total_count,  # 返回周期内总任务个数
+            'day_gold': summary['completed_points'],  # 已完成任务的积分总和
             'completion_rate': round(completion_rate, 1),
-            'total_gold': query_user.total_gold
+            'total_gold': query_user.total_gold,
+            'completed_count': summary['completed'],
+            'period': period,
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d'),
+            'categories': summary['categories']
         })
     
     # 检查用户名是否可用
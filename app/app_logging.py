@@ -0,0 +1,126 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+# 日志
+# 请求线程只把日志记录放入队列（QueueHandler），由单独的写线程（QueueListener）格式化为一行JSON写到标准输出，
+# 写日志不会阻塞请求。gunicorn 预加载时写线程在 fork 后的worker中重新启动。
+# 环境变量：
+#   LOG_LEVEL          根日志级别，默认 INFO（FLASK_DEBUG=1 时为 DEBUG）
+#   LOG_LEVELS         按日志名称设置级别，例如 "app.request=DEBUG,api=WARNING,werkzeug=ERROR"
+#   LOG_DEBUG_SAMPLE   DEBUG 日志的采样比例（0~1），默认 1 即全部输出；单条日志可用 extra={'sample': 0.01} 指定
+# 生产环境默认 INFO，逐请求的路径、文件等调试日志（DEBUG）不输出。
+
+# LogRecord 自带的属性，其余属性（通过 extra 传入）作为JSON字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName', 'sample'}
+
+_state = {'handler': None, 'listener': None}
+
+
+def _is_true(value):
+    return str(value).strip().lower() in ('1', 'true', 'on', 'yes')
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON：时间、级别、日志名称、消息、extra 字段和异常信息"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """按比例采样 DEBUG 及以下级别的日志，INFO 及以上全部保留"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = getattr(record, 'sample', self.rate)
+        return rate >= 1 or random.random() < rate
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # 在请求线程中先合并消息参数，写线程中只做格式化；保留 exc_info 交给 JsonFormatter 输出
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def parse_levels(value):
+    """解析 LOG_LEVELS："名称=级别,名称=级别" -> {名称: 级别}，忽略格式错误的项"""
+    levels = {}
+    for item in (value or '').split(','):
+        name, _, level = item.partition('=')
+        name, level = name.strip(), level.strip().upper()
+        if name and level in logging.getLevelNamesMapping():
+            levels[name] = level
+    return levels
+
+
+def _start_listener():
+    """新建队列和写线程；fork 出的子进程中继承来的写线程已不存在，需要重新启动"""
+    log_queue = queue.SimpleQueue()
+    _state['handler'].queue = log_queue
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, stream)
+    listener.start()
+    _state['listener'] = listener
+
+
+def _stop_listener():
+    listener = _state['listener']
+    if listener is not None and listener._thread is not None:
+        listener.stop()
+
+
+def setup_logging(environ=None):
+    """配置根日志（可重复调用，只生效一次）"""
+    if _state['handler'] is not None:
+        return
+    environ = os.environ if environ is None else environ
+    default_level = 'DEBUG' if _is_true(environ.get('FLASK_DEBUG', '0')) else 'INFO'
+    root_level = environ.get('LOG_LEVEL', default_level).strip().upper()
+    if root_level not in logging.getLevelNamesMapping():
+        root_level = default_level
+    try:
+        sample_rate = float(environ.get('LOG_DEBUG_SAMPLE', '1'))
+    except ValueError:
+        sample_rate = 1.0
+
+    handler = _QueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter(sample_rate))
+    _state['handler'] = handler
+    _start_listener()
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(root_level)
+    for name, level in parse_levels(environ.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+    atexit.register(_stop_listener)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_start_listener)
@@ -0,0 +1,76 @@
+import atexit
+import logging
+import os
+import queue
+import shutil
+import threading
+
+# 任务附件目录异步清理
+# 删除任务后，其附件目录（uploads/task_images/<user_id>/<task_id>）交给后台线程删除，
+# 请求在事务提交后只负责入队即可返回，耗时不随任务数量增长。
+# 队列在进程内：每个gunicorn worker在第一次入队时启动自己的清理线程，进程退出前处理完剩余目录。
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def task_attachment_dir(upload_folder, user_id, task_id):
+    return os.path.join(upload_folder, 'task_images', str(user_id), str(task_id))
+
+
+def _remove(path):
+    if not os.path.isdir(path):
+        return
+    try:
+        shutil.rmtree(path)
+    except Exception:
+        logger.exception('删除任务附件目录时出错', extra={'path': path})
+
+
+def _run():
+    while True:
+        path = _queue.get()
+        try:
+            _remove(path)
+        finally:
+            _queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        # fork 出的子进程继承了变量但没有继承线程，需要重新启动
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='attachment-cleanup', daemon=True)
+            _worker.start()
+
+
+def remove_dirs_later(paths):
+    """把目录加入后台删除队列并立即返回入队数量；应在数据库事务提交之后调用"""
+    paths = [path for path in paths if path]
+    if not paths:
+        return 0
+    _ensure_worker()
+    for path in paths:
+        _queue.put(path)
+    return len(paths)
+
+
+def wait_until_idle():
+    """等待队列中的目录全部处理完（脚本和检查工具使用）"""
+    _queue.join()
+
+
+@atexit.register
+def _drain():
+    """进程退出前同步处理尚未删除的目录"""
+    while True:
+        try:
+            path = _queue.get_nowait()
+        except queue.Empty:
+            return
+        _remove(path)
+        _queue.task_done()
@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from sqlalchemy import exists, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import BackfillCheckpoint, OperationLog, Wish, WishExchange
+from sqlite_tuning import write_lock
+
+# 数据回填
+# 大表的数据修正按主键区间分批执行：每批最多 batch_size 行，一批一个事务，提交时同时记录已处理到的主键，
+# 中断后再次执行从记录的位置继续，全部完成后记录完成时间，之后不再执行。
+# 每批之间暂停 pause 秒，把数据库写锁让给线上请求；执行过程中定期输出处理速度（行/秒）。
+# 回填函数 fill(conn, low, high) 处理 low < id <= high 的行，返回修改的行数，需要可以重复执行。
+# docker-entrypoint.sh 启动时在后台执行尚未完成的回填（script/run_backfill.py）。
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_PAUSE = 0.1  # 秒
+# 输出进度的最小间隔（秒）
+PROGRESS_INTERVAL = 5
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+
+
+def fill_operation_log_nickname(conn, low, high):
+    """没有昵称的操作日志填写用户当前的昵称（没有昵称时用用户名），找不到用户时填写未知用户"""
+    return conn.exec_driver_sql(
+        """
+        UPDATE operation_log SET user_nickname = COALESCE((
+            SELECT COALESCE(user.nickname, user.username) FROM user WHERE user.id = operation_log.user_id
+        ), '未知用户')
+        WHERE id > ? AND id <= ? AND user_nickname IS NULL
+        """,
+        (low, high)
+    ).rowcount
+
+
+def fill_task_image_paths(conn, low, high):
+    """任务图片从 /uploads/task_{task_id}/文件名 迁移到 /uploads/task_images/{user_id}/{task_id}/文件名，同时移动文件"""
+    rows = conn.exec_driver_sql(
+        "SELECT id, user_id, images FROM task WHERE id > ? AND id <= ? AND images LIKE '%/uploads/task\\_%' ESCAPE '\\'",
+        (low, high)
+    ).all()
+    changed = 0
+    for task_id, user_id, images in rows:
+        try:
+            urls = json.loads(images)
+        except (TypeError, ValueError):
+            continue
+        new_urls = []
+        for url in urls:
+            if '/uploads/task_images/' in url:
+                new_urls.append(url)
+                continue
+            filename = os.path.basename(url)
+            old_path = os.path.join(UPLOAD_FOLDER, f'task_{task_id}', filename)
+            new_dir = os.path.join(UPLOAD_FOLDER, 'task_images', str(user_id), str(task_id))
+            # 文件已移动而事务未提交时，重新执行只改写路径
+            if os.path.exists(old_path):
+                os.makedirs(new_dir, exist_ok=True)
+                shutil.move(old_path, os.path.join(new_dir, filename))
+            new_urls.append(f'/uploads/task_images/{user_id}/{task_id}/{filename}')
+        if new_urls != urls:
+            conn.exec_driver_sql("UPDATE task SET images = ? WHERE id = ?", (json.dumps(new_urls), task_id))
+            changed += 1
+    return changed
+
+
+WISH_NAME_PATTERN = re.compile(r'兑换心愿：([^，]+)')
+COST_PATTERN = re.compile(r'消耗(\d+)金币')
+EXCHANGE_PATTERN = re.compile(r'，兑换([^，]+)')
+REMARK_PATTERN = re.compile(r'备注：(.+)')
+AMOUNT_PATTERN = re.compile(r'^(\d+)(.*)$')
+
+
+def _find_wish(name, user_id, wishes_by_name):
+    """按名称匹配心愿，优先匹配该用户的自定义心愿"""
+    candidates = wishes_by_name.get(name, [])
+    for wish in candidates:
+        if wish.user_id == user_id:
+            return wish
+    for wish in candidates:
+        if wish.is_builtin:
+            return wish
+    return candidates[0] if candidates else None
+
+
+def parse_wish_exchange_log(log, wishes_by_name):
+    """
+    解析 "兑换心愿" 操作日志（例如 "兑换心愿：看电视，消耗30金币，兑换30分钟，备注：周末"），
+    返回 wish_exchange 的一行。wishes_by_name 为 {心愿名称: [心愿行（按ID排序）]}。
+    """
+    content = log.operation_content or ''
+    name_match = WISH_NAME_PATTERN.search(content)
+    cost_match = COST_PATTERN.search(content)
+    exchange_match = EXCHANGE_PATTERN.search(content)
+    remark_match = REMARK_PATTERN.search(content)
+
+    wish_name = name_match.group(1).strip() if name_match else '未知心愿'
+    total_cost = int(cost_match.group(1)) if cost_match else 0
+    wish = _find_wish(wish_name, log.user_id, wishes_by_name)
+
+    amount, unit = None, None
+    if exchange_match:
+        amount_match = AMOUNT_PATTERN.match(exchange_match.group(1).strip())
+        if amount_match:
+            amount = int(amount_match.group(1))
+            unit = amount_match.group(2).strip() or None
+
+    # 日志中没有直接记录兑换次数：优先按心愿单价推算，其次按单次兑换数量推算
+    if wish and wish.cost and total_cost:
+        quantity = max(1, total_cost // wish.cost)
+    elif amount and unit and wish and wish.exchange_amount:
+        quantity = max(1, amount // wish.exchange_amount)
+    elif amount and not unit:
+        quantity = amount
+    else:
+        quantity = 1
+    if amount is None:
+        amount = quantity
+
+    return {
+        'user_id': log.user_id,
+        'wish_id': wish.id if wish else None,
+        'wish_name': wish_name,
+        'quantity': quantity,
+        'total_cost': total_cost,
+        'amount': amount,
+        'unit': unit,
+        'remark': remark_match.group(1).strip() if remark_match else None,
+        'operation_log_id': log.id,
+        'created_at': log.operation_time or datetime.now(),
+    }
+
+
+def fill_wish_exchanges(conn, low, high):
+    """由历史 "兑换心愿" 操作日志生成兑换记录，已有兑换记录（operation_log_id 相同）的日志跳过"""
+    logs = conn.execute(
+        select(OperationLog.id, OperationLog.user_id, OperationLog.operation_content, OperationLog.operation_time)
+        .where(
+            OperationLog.id > low,
+            OperationLog.id <= high,
+            OperationLog.operation_type == '兑换心愿',
+            OperationLog.operation_result == '成功',
+            ~exists().where(WishExchange.operation_log_id == OperationLog.id)
+        )
+    ).all()
+    if not logs:
+        return 0
+    names = {match.group(1).strip() for match in (WISH_NAME_PATTERN.search(log.operation_content or '') for log in logs) if match}
+    wishes_by_name = {}
+    if names:
+        wishes = conn.execute(
+            select(Wish.id, Wish.name, Wish.user_id, Wish.is_builtin, Wish.cost, Wish.exchange_amount)
+            .where(Wish.name.in_(names)).order_by(Wish.id)
+        )
+        for wish in wishes:
+            wishes_by_name.setdefault(wish.name, []).append(wish)
+    conn.execute(insert(WishExchange), [parse_wish_exchange_log(log, wishes_by_name) for log in logs])
+    return len(logs)
+
+
+# (名称, 说明, 表名, 回填函数)，名称即 backfill_checkpoint 中的主键
+BACKFILLS = (
+    ('operation_log_user_nickname', '操作日志补填操作人昵称', 'operation_log', fill_operation_log_nickname),
+    ('task_image_paths', '任务图片迁移到按用户和任务分目录的路径', 'task', fill_task_image_paths),
+    ('wish_exchanges', '由历史兑换心愿操作日志生成兑换记录', 'operation_log', fill_wish_exchanges),
+)
+
+
+def _next_high(conn, table, low, batch_size):
+    """low 之后第 batch_size 行的主键（不足时为最大主键），没有更多行时返回 None"""
+    high = conn.exec_driver_sql(
+        f"SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?", (low, batch_size - 1)
+    ).scalar()
+    if high is None:
+        high = conn.exec_driver_sql(f"SELECT MAX(id) FROM {table} WHERE id > ?", (low,)).scalar()
+    return high
+
+
+def _save_checkpoint(conn, name, last_id, rows_changed, finished=False):
+    now = datetime.now()
+    values = {
+        'last_id': last_id,
+        'rows_changed': rows_changed,
+        'finished_at': now if finished else None,
+        'updated_at': now
+    }
+    statement = sqlite_insert(BackfillCheckpoint).values(name=name, **values)
+    conn.execute(statement.on_conflict_do_update(index_elements=['name'], set_=values))
+
+
+def load_checkpoints(conn):
+    """{名称: BackfillCheckpoint 行}"""
+    return {row.name: row for row in conn.execute(select(BackfillCheckpoint.__table__))}
+
+
+def run_backfill(engine, name, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE, restart=False, log=print):
+    """
+    执行一个回填任务，从上次的进度继续（restart 时从头开始）。
+    返回 {'name', 'scanned', 'changed', 'seconds', 'skipped'}，已完成的任务 skipped 为 True。
+    """
+    backfills = {item[0]: item for item in BACKFILLS}
+    if name not in backfills:
+        raise ValueError(f'未知的回填任务: {name}')
+    _, description, table, fill = backfills[name]
+
+    with engine.connect() as conn:
+        checkpoint = load_checkpoints(conn).get(name)
+    if checkpoint is not None and checkpoint.finished_at is not None and not restart:
+        return {'name': name, 'scanned': 0, 'changed': 0, 'seconds': 0, 'skipped': True}
+    resume = checkpoint is not None and not restart
+    low = checkpoint.last_id if resume else 0
+    rows_changed = checkpoint.rows_changed if resume else 0
+
+    log(f'[{name}] {description}：从 id > {low} 开始，每批 {batch_size} 行')
+    started = last_report = time.perf_counter()
+    scanned = changed = 0
+    while True:
+        with write_lock(engine) as conn:
+            high = _next_high(conn, table, low, batch_size)
+            if high is None:
+                _save_checkpoint(conn, name, low, rows_changed, finished=True)
+                break
+            batch_rows = conn.exec_driver_sql(
+                f"SELECT COUNT(*) FROM {table} WHERE id > ? AND id <= ?", (low, high)
+            ).scalar()
+            batch_changed = fill(conn, low, high)
+            rows_changed += batch_changed
+            _save_checkpoint(conn, name, high, rows_changed)
+        scanned += batch_rows
+        changed += batch_changed
+        low = high
+
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            log(f'[{name}] 已处理到 id {high}：扫描 {scanned} 行，修改 {changed} 行，{scanned / (now - started):.0f} 行/秒')
+        if pause:
+            time.sleep(pause)
+
+    seconds = time.perf_counter() - started
+    rate = scanned / seconds if seconds else 0
+    log(f'[{name}] 完成：扫描 {scanned} 行，修改 {changed} 行，用时 {seconds:.2f} 秒，{rate:.0f} 行/秒')
+    return {'name': name, 'scanned': scanned, 'changed': changed, 'seconds': seconds, 'skipped': False}
+
+
+def pending_backfills(engine):
+    """尚未完成的回填任务名称（一条查询）"""
+    with engine.connect() as conn:
+        checkpoints = load_checkpoints(conn)
+    return [
+        name for name, _, _, _ in BACKFILLS
+        if name not in checkpoints or checkpoints[name].finished_at is None
+    ]
@@ -0,0 +1,166 @@
+import hashlib
+import json
+from datetime import datetime
+from sqlalchemy import delete, insert, select, update
+from sqlite_tuning import write_lock
+from models import Task, TaskSeries, TaskCategory, Wish, Honor, SeedState
+
+# 内置数据：学科分类、心愿、荣誉
+# 每份数据的校验和保存在 seed_state 表中。启动时校验和一致就直接返回（只有一条 SELECT），
+# 数据有变化时在一个事务中按差异写入：补上缺少的记录、更新有变化的字段、删除不再使用的内置学科。
+# 有变化时先取得数据库写锁（SQLite 下为 BEGIN IMMEDIATE）再检查一次校验和，多个 worker 同时启动时只有一个进程写入，
+# 其余进程等到锁释放后发现校验和已经一致，直接返回。
+
+BUILTIN_CATEGORIES = [
+    {'name': '语文', 'color': '#FF6B6B', 'is_builtin': True, 'sort_order': 1},
+    {'name': '数学', 'color': '#4ECDC4', 'is_builtin': True, 'sort_order': 2},
+    {'name': '英语', 'color': '#45B7D1', 'is_builtin': True, 'sort_order': 3},
+    {'name': '科学', 'color': '#96CEB4', 'is_builtin': True, 'sort_order': 4},
+    {'name': '体育', 'color': '#FFEAA7', 'is_builtin': True, 'sort_order': 5},
+    {'name': '其他', 'color': '#DDA0DD', 'is_builtin': True, 'sort_order': 6}
+]
+
+# 内置心愿允许用户编辑，已存在的同名内置心愿不会被覆盖，只补上缺少的
+BUILTIN_WISHES = [
+    {'name': '看电视', 'content': '可以看喜欢的电视节目', 'icon': '看电视.png', 'cost': 1, 'unit': '分钟', 'exchange_count': 0, 'is_builtin': True},
+    {'name': '零花钱', 'content': '获得额外的零花钱', 'icon': '零花钱.png', 'cost': 3, 'unit': '元', 'exchange_count': 0, 'is_builtin': True},
+    {'name': '玩平板', 'content': '可以玩平板电脑', 'icon': '玩平板.png', 'cost': 1, 'unit': '分钟', 'exchange_count': 0, 'is_builtin': True},
+    {'name': '玩手机', 'content': '可以玩手机', 'icon': '玩手机.png', 'cost': 1, 'unit': '分钟', 'exchange_count': 0, 'is_builtin': True},
+    {'name': '玩游戏', 'content': '可以玩电子游戏', 'icon': '玩游戏.png', 'cost': 1, 'unit': '分钟', 'exchange_count': 0, 'is_builtin': True},
+    {'name': '自由活动', 'content': '可以自由支配时间', 'icon': '自由活动.png', 'cost': 1, 'unit': '分钟', 'exchange_count': 0, 'is_builtin': True}
+]
+
+BUILTIN_HONORS = [
+    {'name': '专注达人', 'description': '单次学习时长超过1小时', 'condition': '单次学习时长>60分钟', 'icon': '专注达人.png'},
+    {'name': '任务高手', 'description': '单日完成任务数量超过15个', 'condition': '单日完成任务数>15', 'icon': '任务高手.png'},
+    {'name': '全能选手', 'description': '单日完成所有学科任务', 'condition': '单日完成所有学科任务', 'icon': '全能选手.png'},
+    {'name': '勤奋努力', 'description': '连续30天有打卡记录', 'condition': '连续30天有打卡', 'icon': '勤奋努力.png'},
+    {'name': '周末战士', 'description': '周末连续完成任务', 'condition': '周末连续完成任务', 'icon': '周末战士.png'},
+    {'name': '坚持到底', 'description': '连续完成同一任务30天', 'condition': '连续完成同一任务30天', 'icon': '坚持到底.png'},
+    {'name': '学科之星', 'description': '单科任务完成率100%', 'condition': '单科任务完成率100%', 'icon': '学科之星.png'},
+    {'name': '完美主义', 'description': '连续5天任务完成率100%', 'condition': '连续5天任务完成率100%', 'icon': '完美主义.png'},
+    {'name': '心愿达人', 'description': '累计完成心愿10个', 'condition': '累计完成心愿10个', 'icon': '心愿达人.png'},
+    {'name': '成长先锋', 'description': '累计获得10种不同的荣誉', 'condition': '获得10种不同荣誉', 'icon': '成长先锋.png'},
+    {'name': '持之以恒', 'description': '连续打卡30天', 'condition': '连续打卡30天', 'icon': '持之以恒.png'},
+    {'name': '时间管理', 'description': '提前完成任务规划', 'condition': '提前完成任务规划', 'icon': '时间管理.png'},
+    {'name': '积分富翁', 'description': '累计获得积分超过1000分', 'condition': '累计获得积分>1000', 'icon': '积分富翁.png'},
+    {'name': '计划大师', 'description': '单日规划任务超过20个', 'condition': '单日规划任务>20个', 'icon': '计划大师.png'},
+    {'name': '进步神速', 'description': '任务完成率提升20%', 'condition': '任务完成率提升20%', 'icon': '进步神速.png'},
+    {'name': '高效学习', 'description': '学习效率提升30%', 'condition': '学习效率提升30%', 'icon': '高效学习.png'},
+    {'name': '学习达人', 'description': '单日学习时长超过3小时', 'condition': '单日学习时长>180分钟', 'icon': '学习达人.png'},
+    {'name': '连续打卡7天', 'description': '连续7天完成学习任务', 'condition': '连续7天完成学习任务', 'icon': '连续打卡7天.png'},
+    {'name': '阅读之星', 'description': '累计阅读时长超过10小时', 'condition': '累计阅读时长>600分钟', 'icon': '阅读之星.png'},
+    {'name': '早起鸟', 'description': '连续7天在早上6点前打卡', 'condition': '连续7天早上6点前打卡', 'icon': '早起鸟.png'}
+]
+
+
+def catalog_checksum(items):
+    payload = json.dumps(items, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _changed_values(row, item):
+    return {key: value for key, value in item.items() if getattr(row, key) != value}
+
+
+def _seed_categories(conn, items):
+    """同名记录（无论是否内置）就地改为内置学科，保持分类ID不变（任务通过 category_id 引用分类）；
+    删除不再使用的旧内置学科，引用它们的任务改为按名称显示"""
+    names = [item['name'] for item in items]
+    existing = {row.name: row for row in conn.execute(
+        select(TaskCategory.__table__).where(TaskCategory.name.in_(names))
+    )}
+    new_rows = []
+    for item in items:
+        row = existing.get(item['name'])
+        if row is None:
+            new_rows.append(item)
+            continue
+        values = _changed_values(row, item)
+        if row.user_id is not None:
+            values['user_id'] = None
+        if values:
+            conn.execute(update(TaskCategory).where(TaskCategory.id == row.id).values(**values))
+    if new_rows:
+        conn.execute(insert(TaskCategory), new_rows)
+
+    old_builtin = conn.execute(
+        select(TaskCategory.id, TaskCategory.name)
+        .where(TaskCategory.is_builtin == True, TaskCategory.name.not_in(names))
+    ).all()
+    for category_id, name in old_builtin:
+        for model in (Task, TaskSeries):
+            conn.execute(
+                update(model).where(model.category_id == category_id).values(category=name, category_id=None)
+            )
+    if old_builtin:
+        conn.execute(delete(TaskCategory).where(TaskCategory.id.in_([row.id for row in old_builtin])))
+
+
+def _seed_wishes(conn, items):
+    existing = set(conn.execute(
+        select(Wish.name).where(Wish.is_builtin == True, Wish.name.in_([item['name'] for item in items]))
+    ).scalars())
+    new_rows = [item for item in items if item['name'] not in existing]
+    if new_rows:
+        conn.execute(insert(Wish), new_rows)
+
+
+def _seed_honors(conn, items):
+    existing = {row.name: row for row in conn.execute(
+        select(Honor.__table__).where(Honor.name.in_([item['name'] for item in items]))
+    )}
+    new_rows = []
+    for item in items:
+        row = existing.get(item['name'])
+        if row is None:
+            new_rows.append(item)
+            continue
+        values = _changed_values(row, item)
+        if values:
+            conn.execute(update(Honor).where(Honor.id == row.id).values(**values))
+    if new_rows:
+        conn.execute(insert(Honor), new_rows)
+
+
+# (名称, 数据, 写入函数)，名称即 seed_state 中的主键
+CATALOGS = (
+    ('task_category', BUILTIN_CATEGORIES, _seed_categories),
+    ('wish', BUILTIN_WISHES, _seed_wishes),
+    ('honor', BUILTIN_HONORS, _seed_honors),
+)
+
+
+def _pending_catalogs(conn):
+    """校验和与数据库中记录不一致的内置数据：[(名称, 数据, 写入函数, 校验和)]"""
+    stored = dict(conn.execute(select(SeedState.name, SeedState.checksum)).all())
+    pending = []
+    for name, items, apply in CATALOGS:
+        checksum = catalog_checksum(items)
+        if stored.get(name) != checksum:
+            pending.append((name, items, apply, checksum))
+    return pending
+
+
+def apply_builtin_catalogs(conn, names=None):
+    """在 conn 的事务中写入有变化的内置数据（names 指定时只处理其中几份），返回写入的数据名称列表"""
+    applied = []
+    for name, items, apply, checksum in _pending_catalogs(conn):
+        if names is not None and name not in names:
+            continue
+        apply(conn, items)
+        conn.execute(delete(SeedState).where(SeedState.name == name))
+        conn.execute(insert(SeedState).values(name=name, checksum=checksum, applied_at=datetime.now()))
+        applied.append(name)
+    return applied
+
+
+def seed_builtin_data(engine):
+    """启动时调用：内置数据有变化时写入差异并提交，返回本次写入的数据名称列表，没有变化时返回空列表"""
+    with engine.connect() as conn:
+        if not _pending_catalogs(conn):
+            return []
+
+    # 取得锁后再检查一次，其他进程可能已经写入
+    with write_lock(engine) as conn:
+        return apply_builtin_catalogs(conn)
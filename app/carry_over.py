@@ -0,0 +1,145 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, User, Task, TaskSeriesException, OperationLog, CarryOverRun, UserSettings
+from daily_stats import refresh_daily_stats
+from task_series import lazy_series_enabled, virtual_occurrences
+from recurrence import bulk_insert_tasks
+
+# 未完成任务迁移
+# 把家庭（主账号）开始日期早于今天的未完成任务整体迁移到今天：一条 UPDATE 修改日期、重复设置和描述，
+# 任务ID、备注和附件保持不变。按需展开模式下过期的虚拟任务没有 Task 记录，
+# 为它们批量写入当天的任务，并把原日期记为已删除的例外，不再展开。
+# 每个家庭每天在 carry_over_run 中写入一条记录，同一天重复调用（多设备、定时任务、接口）直接返回。
+
+CARRY_OVER_OPERATION = '迁移未完成任务'
+# 追加到任务描述末尾的迁移信息：前缀 + 原任务日期 + 迁移时间，格式与原前端迁移一致
+MIGRATION_NOTE_PREFIX = '\n\n【迁移信息】原任务日期：'
+
+
+def _moved_at_text(moved_at):
+    return f'，迁移时间：{moved_at}'
+
+
+def _claim_run(user_id, today_text, force):
+    """写入当天的迁移记录，返回是否由本次写入；force 时已有记录也继续执行"""
+    statement = sqlite_insert(CarryOverRun).values(
+        user_id=user_id, run_date=today_text, moved_count=0, created_at=datetime.now()
+    )
+    if force:
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'run_date'], set_={'created_at': statement.excluded.created_at}
+        )
+    else:
+        statement = statement.on_conflict_do_nothing()
+    return db.session.execute(statement).rowcount == 1
+
+
+def _carry_over_virtual(user_id, today, today_text, moved_at):
+    """把过期的虚拟任务写成今天的任务，原日期写入例外记录；返回 (写入数, 最早原日期)"""
+    occurrences = virtual_occurrences(user_id, None, today - timedelta(days=1))
+    if not occurrences:
+        return 0, None
+    now = datetime.now()
+    rows = [{
+        'user_id': series.user_id,
+        'series_id': series.series_id,
+        'name': series.name,
+        'description': (series.description or '') + MIGRATION_NOTE_PREFIX + day.isoformat() + _moved_at_text(moved_at),
+        'icon': series.icon,
+        'category': series.category_name,
+        'category_id': series.category_id,
+        'planned_time': series.planned_time,
+        'actual_time': 0,
+        'points': series.points,
+        'repeat_setting': '无',
+        'start_date': today_text,
+        'end_date': today_text,
+        'status': '未完成',
+        'images': series.images,
+        'created_at': now,
+        'updated_at': now
+    } for series, day in occurrences]
+    bulk_insert_tasks(rows)
+    db.session.execute(
+        sqlite_insert(TaskSeriesException).on_conflict_do_nothing(),
+        [{'series_pk': series.id, 'date': day.isoformat(), 'task_id': None, 'created_at': now}
+         for series, day in occurrences]
+    )
+    return len(rows), occurrences[0][1].isoformat()
+
+
+def carry_over_tasks(user_id, today=None, operator=None, force=False):
+    """
+    把 user_id 所在家庭的过期未完成任务迁移到 today（date，默认今天），在一个事务中完成并提交。
+    返回 {'user_id', 'date', 'moved', 'already_done'}；当天已经迁移过且未指定 force 时 already_done 为 True。
+    operator 为执行操作的用户（记录到操作日志），默认为家庭主账号。
+    """
+    user = db.session.get(User, user_id)
+    if user is None:
+        raise ValueError('用户不存在')
+    household_id = user.parent_id or user.id
+    today = today or date.today()
+    today_text = today.isoformat()
+
+    try:
+        if not _claim_run(household_id, today_text, force):
+            db.session.rollback()
+            return {'user_id': household_id, 'date': today_text, 'moved': 0, 'already_done': True}
+
+        conditions = (Task.user_id == household_id, Task.status == '未完成', Task.start_date < today_text)
+        first_date = db.session.query(db.func.min(Task.start_date)).filter(*conditions).scalar()
+
+        # 描述中的原日期取自每行更新前的 start_date
+        moved_at = datetime.now().strftime('%Y/%m/%d %H:%M:%S')
+        moved = db.session.execute(
+            update(Task).where(*conditions).values(
+                description=(
+                    db.func.coalesce(Task.description, '') + MIGRATION_NOTE_PREFIX + Task.start_date
+                    + _moved_at_text(moved_at)
+                ),
+                repeat_setting='无',
+                start_date=today_text,
+                end_date=today_text,
+                updated_at=datetime.now()
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+
+        if lazy_series_enabled():
+            virtual_moved, virtual_first = _carry_over_virtual(household_id, today, today_text, moved_at)
+            moved += virtual_moved
+            if virtual_first and (first_date is None or virtual_first < first_date):
+                first_date = virtual_first
+
+        if moved:
+            refresh_daily_stats(household_id, first_date, today_text)
+            operator = operator or user
+            db.session.add(OperationLog(
+                user_id=household_id,
+                user_nickname=operator.nickname or operator.username,
+                operation_type=CARRY_OVER_OPERATION,
+                operation_content=f'迁移{moved}个未完成任务到{today_text}（最早原日期：{first_date}）',
+                operation_time=datetime.now(),
+                operation_result='成功'
+            ))
+
+        db.session.execute(
+            update(CarryOverRun)
+            .where(CarryOverRun.user_id == household_id, CarryOverRun.run_date == today_text)
+            .values(moved_count=CarryOverRun.moved_count + moved)
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {'user_id': household_id, 'date': today_text, 'moved': moved, 'already_done': False}
+
+
+def auto_carry_over_households():
+    """开启了自动迁移设置的主账号ID列表（定时任务使用）"""
+    return [
+        user_id for (user_id,) in db.session.query(UserSettings.user_id)
+        .join(User, User.id == UserSettings.user_id)
+        .filter(UserSettings.task_auto_migrate == True, User.parent_id.is_(None))
+        .order_by(UserSettings.user_id)
+    ]
@@ -1,5 +1,5 @@
-from app import app, db
-from models import Wish
+from wsgi import app
+from models import db, Wish
 
 with app.app_context():
     wishes = Wish.query.all()
@@ -0,0 +1,179 @@
+from datetime import datetime, date, timedelta
+from sqlalchemy import case, func, select
+from models import db, Task, DailyStat
+from activity_bitmap import day_number, refresh_activity_days
+from task_series import virtual_day_counts
+from recurrence import parse_day
+from task_categories import category_name_column, join_category
+
+# 每日统计汇总
+# daily_stats 表按 (user_id, date, category_id, category) 保存任务总数、完成数、完成用时、完成积分，
+# 分类名称在读取时关联分类表取得（未关联分类的历史任务按任务中保存的名称分行）。
+# 任务新增/修改/删除时，只重新汇总受影响的日期并写回，与任务变更处于同一事务；
+# /api/statistics 按主键前缀读取，不再把当天所有任务加载到内存中求和。
+
+COMPLETED = '已完成'
+STAT_PERIODS = ('day', 'week', 'month', 'year')
+
+
+def _stat_category_columns():
+    """任务对应的日统计分类键：(分类ID, 名称)，关联了分类时为 (category_id, '')，否则为 (0, 任务中保存的名称)"""
+    return [
+        func.coalesce(Task.category_id, 0),
+        case((Task.category_id.is_(None), func.coalesce(Task.category, '')), else_=''),
+    ]
+
+
+def _rollup_columns():
+    is_completed = Task.status == COMPLETED
+    return [
+        Task.user_id,
+        Task.start_date,
+        *_stat_category_columns(),
+        func.count(Task.id),
+        func.sum(case((is_completed, 1), else_=0)),
+        func.sum(case((is_completed, func.coalesce(Task.actual_time, 0)), else_=0)),
+        func.sum(case((is_completed, func.coalesce(Task.points, 0)), else_=0)),
+    ]
+
+
+def refresh_daily_stats(user_id, start_date, end_date=None):
+    """
+    重新汇总用户 [start_date, end_date] 内的日统计，并同步刷新打卡位图。
+    在任务变更之后、提交之前调用，由调用方提交。
+    """
+    if not user_id:
+        return
+    first_day = day_number(start_date)
+    if first_day is None:
+        return
+    last_day = day_number(end_date) if end_date else None
+    if last_day is None or last_day < first_day:
+        last_day = first_day
+    start = date.fromordinal(first_day).strftime('%Y-%m-%d')
+    end = date.fromordinal(last_day).strftime('%Y-%m-%d')
+
+    rows = db.session.query(*_rollup_columns()).filter(
+        Task.user_id == user_id,
+        Task.start_date >= start,
+        Task.start_date <= end
+    ).group_by(Task.start_date, *_stat_category_columns()).all()
+
+    table = DailyStat.__table__
+    db.session.execute(table.delete().where(
+        table.c.user_id == user_id,
+        table.c.date >= start,
+        table.c.date <= end
+    ))
+    values = []
+    day_counts = {}
+    for _, day, category_id, category, total, completed, completed_time, completed_points in rows:
+        values.append({
+            'user_id': user_id,
+            'date': day,
+            'category_id': category_id,
+            'category': category,
+            'total': total or 0,
+            'completed': completed or 0,
+            'completed_time': completed_time or 0,
+            'completed_points': completed_points or 0,
+        })
+        number = day_number(day)
+        if number is not None:
+            day_total, day_completed = day_counts.get(number, (0, 0))
+            day_counts[number] = (day_total + (total or 0), day_completed + (completed or 0))
+    if values:
+        db.session.execute(table.insert(), values)
+
+    refresh_activity_days(user_id, start, end, day_counts=day_counts)
+
+
+def rebuild_daily_stats(user_id=None):
+    """根据任务表重建日统计（全部用户或指定用户），返回写入的行数，由调用方提交"""
+    table = DailyStat.__table__
+    delete = table.delete()
+    query = select(*_rollup_columns())
+    if user_id is not None:
+        delete = delete.where(table.c.user_id == user_id)
+        query = query.where(Task.user_id == user_id)
+    query = query.group_by(Task.user_id, Task.start_date, *_stat_category_columns())
+
+    db.session.execute(delete)
+    result = db.session.execute(table.insert().from_select(
+        ['user_id', 'date', 'category_id', 'category', 'total', 'completed', 'completed_time', 'completed_points'],
+        query
+    ))
+    return result.rowcount
+
+
+def ensure_daily_stats():
+    """启动时检查：日统计表为空而任务表有数据（刚升级到该版本）时整体重建一次"""
+    if db.session.query(DailyStat.user_id).first() is not None:
+        return False
+    if db.session.query(Task.id).first() is None:
+        return False
+    rebuild_daily_stats()
+    db.session.commit()
+    return True
+
+
+def period_range(day, period='day'):
+    """返回包含 day 的统计区间 (开始日期, 结束日期)，period 为 day/week/month/year"""
+    if period == 'day':
+        return day, day
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == 'month':
+        start = day.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    if period == 'year':
+        return day.replace(month=1, day=1), day.replace(month=12, day=31)
+    raise ValueError(f'不支持的统计周期: {period}')
+
+
+def summarize_daily_stats(user_id, start_date, end_date=None):
+    """汇总区间内的日统计，按主键 (user_id, date) 前缀读取，并叠加尚未写入的重复任务"""
+    end_date = end_date or start_date
+    category_name = category_name_column(DailyStat)
+    rows = join_category(db.session.query(
+        category_name,
+        func.sum(DailyStat.total),
+        func.sum(DailyStat.completed),
+        func.sum(DailyStat.completed_time),
+        func.sum(DailyStat.completed_points)
+    ), DailyStat).filter(
+        DailyStat.user_id == user_id,
+        DailyStat.date >= start_date,
+        DailyStat.date <= end_date
+    ).group_by(category_name).all()
+
+    summary = {'total': 0, 'completed': 0, 'completed_time': 0, 'completed_points': 0, 'categories': {}}
+    for category, total, completed, completed_time, completed_points in rows:
+        item = {
+            'total': total or 0,
+            'completed': completed or 0,
+            'completed_time': completed_time or 0,
+            'completed_points': completed_points or 0,
+        }
+        summary['categories'][category] = item
+        for key, value in item.items():
+            summary[key] += value
+
+    # 按规则展开的虚拟任务都是未完成状态，只计入总数
+    for counts in virtual_day_counts(user_id, parse_day(start_date), parse_day(end_date)).values():
+        for category, count in counts.items():
+            item = summary['categories'].setdefault(
+                category, {'total': 0, 'completed': 0, 'completed_time': 0, 'completed_points': 0}
+            )
+            item['total'] += count
+            summary['total'] += count
+    return summary
+
+
+def parse_stat_date(value):
+    """解析统计日期参数，为空时取今天"""
+    if not value:
+        return datetime.now().date()
+    return datetime.strptime(value, '%Y-%m-%d').date()
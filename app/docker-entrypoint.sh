@@ -7,5 +7,15 @@ cd /app/app
 echo "[entrypoint] Running DB migration before app boot..."
 python script/run_migration.py
 
+echo "[entrypoint] Running pending data backfills in background..."
+python script/run_backfill.py &
+
+# 每隔 CARRY_OVER_INTERVAL 秒把开启自动迁移的家庭的过期未完成任务迁移到当天（同一天只迁移一次），设为0关闭
+CARRY_OVER_INTERVAL="${CARRY_OVER_INTERVAL:-3600}"
+if [ "$CARRY_OVER_INTERVAL" != "0" ]; then
+  echo "[entrypoint] Starting carry-over job every ${CARRY_OVER_INTERVAL}s in background..."
+  python script/carry_over_tasks.py --every "$CARRY_OVER_INTERVAL" &
+fi
+
 echo "[entrypoint] Starting Gunicorn..."
-exec gunicorn -w "${GUNICORN_WORKERS:-2}" -b 0.0.0.0:5050 app:app
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py wsgi:app
\ No newline at end of file
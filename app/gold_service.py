@@ -0,0 +1,157 @@
+from datetime import datetime
+from sqlalchemy import func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from models import db, User, GoldLedger, GoldSnapshot
+
+# 金币余额服务
+# 所有金币变更都通过这里的单条原子UPDATE完成，由数据库在行上完成"读-改-写"，
+# 多个gunicorn worker、主账号和子账号同时操作时不会丢失更新或透支。
+# 每次变更同时追加一条金币流水（gold_ledger），并定期记录余额快照（gold_snapshot），
+# 变更、流水、快照与调用方的其他修改处于同一事务，由调用方提交。
+
+# 金币变更原因
+REASON_TASK_COMPLETE = 'task_complete'
+REASON_TASK_UNCOMPLETE = 'task_uncomplete'
+REASON_TASK_DELETE = 'task_delete'
+REASON_SERIES_DELETE = 'series_delete'
+REASON_SERIES_EDIT = 'series_edit'
+REASON_WISH_EXCHANGE = 'wish_exchange'
+REASON_MANUAL_ADJUST = 'manual_adjust'
+REASON_MANUAL_SET = 'manual_set'
+
+REASON_LABELS = {
+    REASON_TASK_COMPLETE: '完成任务',
+    REASON_TASK_UNCOMPLETE: '撤销完成',
+    REASON_TASK_DELETE: '删除任务',
+    REASON_SERIES_DELETE: '删除循环任务',
+    REASON_SERIES_EDIT: '修改循环任务积分',
+    REASON_WISH_EXCHANGE: '兑换心愿',
+    REASON_MANUAL_ADJUST: '修改金币',
+    REASON_MANUAL_SET: '设置金币数量',
+}
+
+# 当前余额：旧数据中 total_gold 可能为 NULL，按0处理，否则 NULL + delta 仍为 NULL，条件更新不会命中任何行
+CURRENT_GOLD = func.coalesce(User.total_gold, 0)
+
+# 每累计多少条流水记录一次快照，查询历史余额时最多需要累加这么多条流水
+SNAPSHOT_INTERVAL = 100
+
+
+def _sync_loaded_user(user_id, balance):
+    """把新余额同步到会话中已加载的User对象，避免后续读取到旧值"""
+    user = db.session.identity_map.get(db.session.identity_key(User, user_id))
+    if user is not None:
+        set_committed_value(user, 'total_gold', balance)
+
+
+def _update_balance(user_id, new_balance, *conditions):
+    row = db.session.execute(
+        update(User)
+        .where(User.id == user_id, *conditions)
+        .values(total_gold=new_balance)
+        .returning(User.total_gold),
+        execution_options={'synchronize_session': False}
+    ).first()
+    return row[0] if row is not None else None
+
+
+def _record(user_id, delta, balance_after, reason, task_id=None, wish_id=None):
+    """追加金币流水，必要时写入余额快照"""
+    if not delta:
+        return None
+    now = datetime.now()
+    last_snapshot = GoldSnapshot.query.filter_by(user_id=user_id).order_by(
+        GoldSnapshot.created_at.desc(), GoldSnapshot.id.desc()
+    ).first()
+    if last_snapshot is None:
+        # 第一次写流水时记录期初余额，之前的余额变化没有流水
+        db.session.add(GoldSnapshot(user_id=user_id, ledger_id=0, balance=balance_after - delta, created_at=now))
+
+    entry = GoldLedger(
+        user_id=user_id,
+        delta=delta,
+        reason_code=reason,
+        task_id=task_id,
+        wish_id=wish_id,
+        balance_after=balance_after,
+        created_at=now
+    )
+    db.session.add(entry)
+    db.session.flush()
+
+    if last_snapshot is not None:
+        # 只数到 SNAPSHOT_INTERVAL 条为止，代价有上限
+        since_snapshot = db.session.execute(
+            select(func.count()).select_from(
+                select(GoldLedger.id).where(
+                    GoldLedger.user_id == user_id, GoldLedger.id > last_snapshot.ledger_id
+                ).limit(SNAPSHOT_INTERVAL).subquery()
+            )
+        ).scalar()
+        if since_snapshot >= SNAPSHOT_INTERVAL:
+            db.session.add(GoldSnapshot(user_id=user_id, ledger_id=entry.id, balance=balance_after, created_at=now))
+    return entry
+
+
+def change_gold(user_id, delta, reason, task_id=None, wish_id=None, clamp=False):
+    """
+    原子地把用户金币增加 delta（可为负数），写入流水并返回变更后的余额。
+    默认余额不足时不做修改并返回 None（不需要事先查询余额）；
+    clamp=True 时余额不足则扣到0为止，用于撤销完成、删除任务等"不允许变为负数"的扣除，流水记录实际扣除数。
+    用户不存在时同样返回 None。
+    """
+    delta = int(delta)
+    balance = _update_balance(user_id, CURRENT_GOLD + delta, CURRENT_GOLD + delta >= 0)
+    applied = delta
+    if balance is None and clamp:
+        # 余额不足：读取当前余额后比较并设置，保证流水中记录的是实际扣除数
+        # （SQLite下上面的UPDATE已取得写锁，这里不会与其他写入交错；其他数据库下冲突时重试）
+        for _ in range(3):
+            current = db.session.execute(select(CURRENT_GOLD).where(User.id == user_id)).scalar()
+            if current is None:
+                return None
+            target = max(0, current + delta)
+            balance = _update_balance(user_id, target, CURRENT_GOLD == current)
+            if balance is not None:
+                applied = target - current
+                break
+    if balance is None:
+        return None
+    _sync_loaded_user(user_id, balance)
+    _record(user_id, applied, balance, reason, task_id=task_id, wish_id=wish_id)
+    return balance
+
+
+def set_gold(user_id, new_gold, expected_gold, reason=REASON_MANUAL_SET):
+    """
+    比较并设置：仅当当前余额仍为 expected_gold 时改为 new_gold，返回是否成功。
+    用于家长直接修改金币数量，避免覆盖期间其他请求产生的变更。
+    """
+    new_gold = int(new_gold)
+    balance = _update_balance(user_id, new_gold, CURRENT_GOLD == (expected_gold or 0))
+    if balance is None:
+        return False
+    _sync_loaded_user(user_id, balance)
+    _record(user_id, new_gold - (expected_gold or 0), balance, reason)
+    return True
+
+
+def balance_at(user_id, at):
+    """
+    查询某一时刻的余额：取该时刻之前最近的快照，再累加快照之后、该时刻之前的流水，
+    需要累加的流水不超过 SNAPSHOT_INTERVAL 条。启用流水之前的时刻返回 None。
+    """
+    snapshot = GoldSnapshot.query.filter(
+        GoldSnapshot.user_id == user_id, GoldSnapshot.created_at <= at
+    ).order_by(GoldSnapshot.created_at.desc(), GoldSnapshot.id.desc()).first()
+    if snapshot is None:
+        return None
+    conditions = [GoldLedger.user_id == user_id, GoldLedger.id > snapshot.ledger_id, GoldLedger.created_at <= at]
+    # 下一个快照之后的流水一定晚于该时刻，用它的流水ID给扫描范围封顶
+    next_snapshot = GoldSnapshot.query.filter(
+        GoldSnapshot.user_id == user_id, GoldSnapshot.created_at > at
+    ).order_by(GoldSnapshot.created_at, GoldSnapshot.id).first()
+    if next_snapshot is not None:
+        conditions.append(GoldLedger.id <= next_snapshot.ledger_id)
+    delta_sum = db.session.query(func.coalesce(func.sum(GoldLedger.delta), 0)).filter(*conditions).scalar()
+    return snapshot.balance + delta_sum
@@ -0,0 +1,33 @@
+# gunicorn 配置
+# preload_app：主进程执行一次 create_app（建表、写入内置数据、注册路由），worker 由主进程 fork，
+# 以写时复制的方式共享已初始化的应用，不再各自重复启动工作。
+# 运行指标：各worker把指标写入 METRICS_DIR 下各自的文件，/metrics 汇总输出（见 metrics.py）。
+import os
+
+# 应用入口（wsgi.py 中按环境变量配置创建的应用）
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5050')
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').strip().lower() not in ('0', 'false', 'off', 'no')
+
+
+def on_starting(server):
+    # 清除上次运行留下的指标文件
+    from metrics import clear_metrics_dir
+    clear_metrics_dir()
+
+
+def child_exit(server, worker):
+    # worker 退出：保留其计数器和直方图，删除按 pid 输出的仪表
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    # 主进程在启动完成后已经释放了连接池，这里再确保worker不会复用继承来的连接
+    app = getattr(worker.app, 'callable', None)
+    if app is None:  # 未预加载时由worker自己导入应用
+        return
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,322 @@
+from datetime import datetime, timedelta
+from sqlalchemy import case, func
+from models import db, Task, OperationLog, DailyStat
+from activity_bitmap import streak_summary
+from task_series import virtual_occurrences, virtual_day_counts
+from task_categories import category_name_column, join_category
+
+# 荣誉规则注册表
+# 每条规则声明自己需要的聚合数据（needs），引擎先按所有规则的需要合并成少量分组SQL，
+# 一次性取回聚合结果，再在内存中逐条判断，避免按天循环查询。
+#
+# needs 支持的聚合：
+#   'daily'          最近N天（含今天）每天的任务总数/完成数/完成时长（来自日统计表），值为天数N
+#   'streaks'        截止今天的连续打卡天数（来自打卡位图，见 activity_bitmap.py）
+#   'weekend'        本周末（或即将到来的周末）两天的每日聚合
+#   'categories'     按学科分组的全量汇总（总数、完成数、今日完成数、时长统计等）
+#   'wish_exchanges' 兑换心愿次数
+#   'gold'           当前金币
+#
+# scope 表示规则统计的对象：'effective' 为主账号（子账号使用父账号），'self' 为请求中的用户本身
+
+COMPLETED = '已完成'
+
+
+class HonorRule:
+    def __init__(self, name, needs, check, scope='self'):
+        self.name = name
+        self.needs = needs
+        self.check = check
+        self.scope = scope
+
+
+HONOR_RULES = {}
+
+
+def honor_rule(name, needs, scope='self'):
+    def decorator(func):
+        HONOR_RULES[name] = HonorRule(name, needs, func, scope)
+        return func
+    return decorator
+
+
+class HonorStats:
+    """单个用户的聚合结果"""
+
+    def __init__(self, user_id, today):
+        self.user_id = user_id
+        self.today = today
+        self.days = {}          # 'YYYY-MM-DD' -> (总数, 完成数, 完成时长)
+        self.categories = {}    # 学科 -> 汇总字典
+        self.wish_exchanges = 0
+        self.total_gold = None
+        self.streaks = {}
+
+    def day(self, day):
+        return self.days.get(day.strftime('%Y-%m-%d'), (0, 0, 0))
+
+    def consecutive_days(self, predicate, limit):
+        """从今天往前数，满足predicate的连续天数（最多limit天）"""
+        count = 0
+        for i in range(limit):
+            if not predicate(*self.day(self.today - timedelta(days=i))):
+                break
+            count += 1
+        return count
+
+    def range_totals(self, start, end):
+        total = completed = 0
+        current = start
+        while current <= end:
+            day_total, day_completed, _ = self.day(current)
+            total += day_total
+            completed += day_completed
+            current += timedelta(days=1)
+        return total, completed
+
+    def category_sum(self, key):
+        return sum(c[key] for c in self.categories.values())
+
+
+def weekend_of(today):
+    """计算本周末（周一至周五时取即将到来的周末）"""
+    if today.weekday() == 5:
+        saturday = today
+    elif today.weekday() == 6:
+        saturday = today - timedelta(days=1)
+    else:
+        saturday = today + timedelta(days=5 - today.weekday())
+    return saturday, saturday + timedelta(days=1)
+
+
+# =====================
+# 规则定义
+# =====================
+@honor_rule('连续打卡7天', needs={'streaks': True}, scope='effective')
+def check_streak_7(stats):
+    return stats.streaks['current_streak'] >= 7
+
+
+@honor_rule('学习达人', needs={'daily': 1}, scope='effective')
+def check_study_time(stats):
+    return stats.day(stats.today)[2] >= 180
+
+
+@honor_rule('专注达人', needs={'categories': True}, scope='effective')
+def check_focus(stats):
+    return max((c['max_time'] for c in stats.categories.values()), default=0) >= 60
+
+
+@honor_rule('全能选手', needs={'categories': True}, scope='effective')
+def check_all_subjects(stats):
+    subjects = [name for name in stats.categories if name]
+    return bool(subjects) and all(stats.categories[name]['completed_today'] > 0 for name in subjects)
+
+
+@honor_rule('积分富翁', needs={'gold': True}, scope='effective')
+def check_rich(stats):
+    return (stats.total_gold or 0) >= 1000
+
+
+@honor_rule('任务高手', needs={'daily': 1}, scope='effective')
+def check_task_master(stats):
+    return stats.day(stats.today)[1] >= 15
+
+
+@honor_rule('勤奋努力', needs={'streaks': True})
+def check_diligent(stats):
+    return stats.streaks['current_active_streak'] >= 30
+
+
+@honor_rule('周末战士', needs={'weekend': True})
+def check_weekend(stats):
+    saturday, sunday = weekend_of(stats.today)
+    return stats.day(saturday)[1] > 0 and stats.day(sunday)[1] > 0
+
+
+@honor_rule('坚持到底', needs={'streaks': True})
+def check_persist(stats):
+    # 简化为检查连续30天都有完成任务
+    return stats.streaks['current_streak'] >= 30
+
+
+@honor_rule('学科之星', needs={'categories': True})
+def check_subject_star(stats):
+    return any(
+        c['total'] >= 5 and c['completed'] == c['total']
+        for name, c in stats.categories.items() if name
+    )
+
+
+@honor_rule('完美主义', needs={'streaks': True})
+def check_perfect(stats):
+    return stats.streaks['current_perfect_streak'] >= 5
+
+
+@honor_rule('心愿达人', needs={'wish_exchanges': True})
+def check_wishes(stats):
+    return stats.wish_exchanges >= 10
+
+
+@honor_rule('持之以恒', needs={'streaks': True})
+def check_perseverance(stats):
+    return stats.streaks['current_streak'] >= 30
+
+
+@honor_rule('时间管理', needs={'categories': True})
+def check_time_management(stats):
+    # 简化为实际用时不超过计划时间80%的已完成任务达到10个
+    return stats.category_sum('efficient_80') >= 10
+
+
+@honor_rule('计划大师', needs={'daily': 1})
+def check_planner(stats):
+    return stats.day(stats.today)[0] >= 20
+
+
+@honor_rule('进步神速', needs={'daily': 14})
+def check_progress(stats):
+    # 简化为最近7天的完成率比之前7天高20%
+    recent_end = stats.today
+    recent_start = stats.today - timedelta(days=6)
+    previous_end = recent_start - timedelta(days=1)
+    previous_start = previous_end - timedelta(days=6)
+
+    recent_total, recent_completed = stats.range_totals(recent_start, recent_end)
+    previous_total, previous_completed = stats.range_totals(previous_start, previous_end)
+    recent_rate = recent_completed / recent_total * 100 if recent_total else 0
+    previous_rate = previous_completed / previous_total * 100 if previous_total else 0
+    return previous_rate > 0 and recent_rate >= previous_rate * 1.2
+
+
+@honor_rule('高效学习', needs={'categories': True})
+def check_efficient(stats):
+    # 简化为实际用时不超过计划时间70%的已完成任务达到10个
+    return stats.category_sum('efficient_70') >= 10
+
+
+@honor_rule('阅读之星', needs={'categories': True})
+def check_reading(stats):
+    # 阅读类任务：名称包含"阅读"或属于语文学科
+    return stats.category_sum('reading_time') >= 600
+
+
+@honor_rule('早起鸟', needs={'streaks': True})
+def check_early_bird(stats):
+    # 简化实现：有完成任务就认为是早起打卡
+    return stats.streaks['current_streak'] >= 7
+
+
+# =====================
+# 聚合查询
+# =====================
+def _load_daily(stats_by_user, start, end):
+    # 直接读取日统计表（见 daily_stats.py），按 (user_id, date) 主键前缀范围查询
+    rows = db.session.query(
+        DailyStat.user_id, DailyStat.date,
+        func.sum(DailyStat.total), func.sum(DailyStat.completed), func.sum(DailyStat.completed_time)
+    ).filter(
+        DailyStat.user_id.in_(list(stats_by_user)),
+        DailyStat.date >= start.strftime('%Y-%m-%d'),
+        DailyStat.date <= end.strftime('%Y-%m-%d')
+    ).group_by(DailyStat.user_id, DailyStat.date).all()
+    for user_id, day, total, done, done_time in rows:
+        stats_by_user[user_id].days[day] = (total or 0, done or 0, done_time or 0)
+    # 叠加按规则展开、尚未写入的重复任务（都是未完成状态）
+    for user_id, stats in stats_by_user.items():
+        for day, counts in virtual_day_counts(user_id, start, end).items():
+            total, done, done_time = stats.days.get(day, (0, 0, 0))
+            stats.days[day] = (total + sum(counts.values()), done, done_time)
+
+
+def _load_categories(stats_by_user, today):
+    is_completed = Task.status == COMPLETED
+    timed = (Task.actual_time.isnot(None)) & (Task.actual_time != 0) & (Task.planned_time > 0)
+    category = category_name_column(Task)
+    rows = join_category(db.session.query(
+        Task.user_id,
+        category,
+        func.count(Task.id),
+        func.sum(case((is_completed, 1), else_=0)),
+        func.sum(case((is_completed & (Task.start_date == today.strftime('%Y-%m-%d')), 1), else_=0)),
+        func.max(case((is_completed, Task.actual_time))),
+        func.sum(case((is_completed & timed & (Task.actual_time <= Task.planned_time * 0.8), 1), else_=0)),
+        func.sum(case((is_completed & timed & (Task.actual_time <= Task.planned_time * 0.7), 1), else_=0)),
+        func.sum(case(
+            (is_completed & (Task.name.contains('阅读') | category.contains('语文')), func.coalesce(Task.actual_time, 0)),
+            else_=0
+        )),
+    ), Task).filter(Task.user_id.in_(list(stats_by_user))).group_by(Task.user_id, category).all()
+    for user_id, category, total, done, done_today, max_time, eff80, eff70, reading in rows:
+        stats_by_user[user_id].categories[category] = {
+            'total': total or 0,
+            'completed': done or 0,
+            'completed_today': done_today or 0,
+            'max_time': max_time or 0,
+            'efficient_80': eff80 or 0,
+            'efficient_70': eff70 or 0,
+            'reading_time': reading or 0,
+        }
+    for user_id, stats in stats_by_user.items():
+        for series, _ in virtual_occurrences(user_id):
+            item = stats.categories.setdefault(series.category_name, {
+                'total': 0, 'completed': 0, 'completed_today': 0, 'max_time': 0,
+                'efficient_80': 0, 'efficient_70': 0, 'reading_time': 0,
+            })
+            item['total'] += 1
+
+
+def _load_wish_exchanges(stats_by_user):
+    rows = db.session.query(OperationLog.user_id, func.count(OperationLog.id)).filter(
+        OperationLog.user_id.in_(list(stats_by_user)),
+        OperationLog.operation_type == '兑换心愿'
+    ).group_by(OperationLog.user_id).all()
+    for user_id, count in rows:
+        stats_by_user[user_id].wish_exchanges = count
+
+
+def evaluate_honors(honor_names, user, effective_user, today=None):
+    """
+    计算指定荣誉是否达成，返回已达成的荣誉名称集合。
+    user 为请求中的用户，effective_user 为其主账号（主账号时两者相同）。
+    """
+    today = today or datetime.now().date()
+    rules = [HONOR_RULES[name] for name in honor_names if name in HONOR_RULES]
+    if not rules:
+        return set()
+
+    scope_users = {'self': user, 'effective': effective_user}
+    stats_by_user = {}
+    for rule in rules:
+        scoped = scope_users.get(rule.scope)
+        if scoped is not None and scoped.id not in stats_by_user:
+            stats_by_user[scoped.id] = HonorStats(scoped.id, today)
+            stats_by_user[scoped.id].total_gold = scoped.total_gold
+    if not stats_by_user:
+        return set()
+
+    # 合并所有规则的需求
+    days_needed = max((rule.needs.get('daily', 0) for rule in rules), default=0)
+    needs_weekend = any(rule.needs.get('weekend') for rule in rules)
+    if days_needed or needs_weekend:
+        start = end = today
+        if days_needed:
+            start = today - timedelta(days=days_needed - 1)
+        if needs_weekend:
+            saturday, sunday = weekend_of(today)
+            start, end = min(start, saturday), max(end, sunday)
+        _load_daily(stats_by_user, start, end)
+    if any(rule.needs.get('categories') for rule in rules):
+        _load_categories(stats_by_user, today)
+    if any(rule.needs.get('wish_exchanges') for rule in rules):
+        _load_wish_exchanges(stats_by_user)
+    if any(rule.needs.get('streaks') for rule in rules):
+        for stats in stats_by_user.values():
+            stats.streaks = streak_summary(stats.user_id, today)
+
+    achieved = set()
+    for rule in rules:
+        scoped = scope_users.get(rule.scope)
+        if scoped is not None and rule.check(stats_by_user[scoped.id]):
+            achieved.add(rule.name)
+    return achieved
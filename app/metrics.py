@@ -0,0 +1,331 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import resource
+import tempfile
+import threading
+import time
+from flask import Response, request
+from sqlalchemy import event
+
+# 运行指标（Prometheus 文本格式，GET /metrics）
+# 每个进程在内存中累计指标，后台线程每 FLUSH_INTERVAL 秒把有变化的指标写入 METRICS_DIR 下本进程的文件
+# （先写临时文件再改名，读取时不会读到写了一半的文件）。/metrics 先写入本进程的指标，再读取目录下所有进程的文件合并输出，
+# 所以由哪个 gunicorn worker 处理都返回全部worker的汇总；其他worker最近不超过 FLUSH_INTERVAL 秒的数据可能还未写入。
+# 计数器和直方图按进程累加，已退出worker的累计值保留；仪表（gauge）按 pid 分别输出，worker 退出时删除。
+# 请求处理中只做内存中的累加，每个请求一次加锁；开销用 script/benchmark_metrics.py 测量。
+# 环境变量：
+#   METRICS_ENABLED  默认 1，设为 0 时不采集指标、不注册 /metrics
+#   METRICS_DIR      指标文件目录，默认为系统临时目录下的 homerecord_metrics；gunicorn 启动时清空
+
+FLUSH_INTERVAL = 1.0  # 秒
+
+REQUEST_DURATION = 'homerecord_http_request_duration_seconds'
+REQUESTS_TOTAL = 'homerecord_http_requests_total'
+REQUEST_SQL_STATEMENTS = 'homerecord_http_request_sql_statements'
+REQUEST_SQL_SECONDS = 'homerecord_http_request_sql_seconds'
+UPLOAD_BYTES = 'homerecord_http_upload_bytes_total'
+WORKERS = 'homerecord_workers'
+WORKER_IN_FLIGHT = 'homerecord_worker_in_flight_requests'
+WORKER_START_TIME = 'homerecord_worker_start_time_seconds'
+WORKER_MAX_RSS = 'homerecord_worker_max_rss_bytes'
+
+# 直方图区间上限（不含 +Inf）
+BUCKETS = {
+    REQUEST_DURATION: (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    REQUEST_SQL_STATEMENTS: (0, 1, 2, 5, 10, 20, 50, 100, 200),
+    REQUEST_SQL_SECONDS: (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+}
+
+# (名称, 类型, 说明)，按此顺序输出
+METRICS = (
+    (REQUEST_DURATION, 'histogram', '请求处理时间（秒），按接口和请求方法'),
+    (REQUESTS_TOTAL, 'counter', '请求数，按接口、请求方法和状态码'),
+    (REQUEST_SQL_STATEMENTS, 'histogram', '每个请求执行的SQL语句数，按接口'),
+    (REQUEST_SQL_SECONDS, 'histogram', '每个请求执行SQL的总时间（秒），按接口'),
+    (UPLOAD_BYTES, 'counter', '上传请求（multipart）的请求体字节数，按接口'),
+    (WORKERS, 'gauge', '正在运行、已写入指标的worker进程数'),
+    (WORKER_IN_FLIGHT, 'gauge', '各worker正在处理的请求数'),
+    (WORKER_START_TIME, 'gauge', '各worker的启动时间（Unix时间戳，秒）'),
+    (WORKER_MAX_RSS, 'gauge', '各worker的最大常驻内存（字节）'),
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+
+def default_metrics_dir(environ=None):
+    environ = os.environ if environ is None else environ
+    return environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'homerecord_metrics')
+
+
+def metrics_enabled(environ=None):
+    environ = os.environ if environ is None else environ
+    return environ.get('METRICS_ENABLED', '1').strip().lower() not in ('0', 'false', 'off', 'no')
+
+
+class MetricsStore:
+    """本进程的指标"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset(dirty=False)
+
+    def reset(self, dirty):
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.counters = {}  # (名称, 标签) -> 值
+        self.histograms = {}  # (名称, 标签) -> [各区间计数..., +Inf 区间计数, 总和]
+        self.in_flight = 0
+        self.dirty = dirty
+
+    def _inc(self, name, labels, value):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def _observe(self, name, labels, value):
+        key = (name, labels)
+        data = self.histograms.get(key)
+        if data is None:
+            data = self.histograms[key] = [0] * (len(BUCKETS[name]) + 2)
+        data[bisect.bisect_left(BUCKETS[name], value)] += 1
+        data[-1] += value
+
+    def request_started(self):
+        with self.lock:
+            self.in_flight += 1
+            self.dirty = True
+
+    def request_finished(self, endpoint, method, status, seconds, sql_statements, sql_seconds, upload_bytes):
+        endpoint_labels = (('endpoint', endpoint),)
+        with self.lock:
+            self.in_flight -= 1
+            self._observe(REQUEST_DURATION, (('endpoint', endpoint), ('method', method)), seconds)
+            self._inc(REQUESTS_TOTAL, (('endpoint', endpoint), ('method', method), ('status', status)), 1)
+            self._observe(REQUEST_SQL_STATEMENTS, endpoint_labels, sql_statements)
+            self._observe(REQUEST_SQL_SECONDS, endpoint_labels, sql_seconds)
+            if upload_bytes:
+                self._inc(UPLOAD_BYTES, endpoint_labels, upload_bytes)
+            self.dirty = True
+
+    def snapshot(self, force=False):
+        """本进程指标的可序列化副本，没有变化时返回 None"""
+        with self.lock:
+            if not (self.dirty or force):
+                return None
+            self.dirty = False
+            return {
+                'pid': self.pid,
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, list(data)] for (name, labels), data in self.histograms.items()],
+                'gauges': {
+                    WORKER_IN_FLIGHT: self.in_flight,
+                    WORKER_START_TIME: self.started,
+                    WORKER_MAX_RSS: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                },
+            }
+
+    def flush(self, directory, force=False):
+        data = self.snapshot(force)
+        if data is None:
+            return
+        try:
+            _write_json(os.path.join(directory, f'worker_{self.pid}.json'), data)
+        except OSError:
+            logger.exception('写入指标文件失败', extra={'directory': directory})
+
+
+def _write_json(path, data):
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def _worker_files(directory):
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names if name.startswith('worker_') and name.endswith('.json')]
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # 读取时文件被删除
+
+
+def collect(directory):
+    """合并目录下所有进程的指标，返回 (计数器, 直方图, 仪表)，仪表为 {名称: [(pid, 值)]}"""
+    counters = {}
+    histograms = {}
+    gauges = {}
+    for path in _worker_files(directory):
+        data = _read_json(path)
+        if data is None:
+            continue
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in data['histograms']:
+            if name not in BUCKETS or len(values) != len(BUCKETS[name]) + 2:
+                continue  # 其他版本写入的文件
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+        for name, value in (data.get('gauges') or {}).items():
+            gauges.setdefault(name, []).append((data['pid'], value))
+    gauges[WORKERS] = [(None, len(gauges.get(WORKER_START_TIME, [])))]
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def render(counters, histograms, gauges):
+    """输出 Prometheus 文本格式"""
+    lines = []
+    for name, kind, description in METRICS:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        elif kind == 'histogram':
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS[name] + ('+Inf',), values):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _number(float(bound))
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(values[-1])}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        else:
+            for pid, value in sorted(gauges.get(name, []), key=lambda item: item[0] or 0):
+                labels = (('pid', pid),) if pid is not None else ()
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def clear_metrics_dir(directory=None):
+    """删除上次运行留下的指标文件（gunicorn 主进程启动时调用）"""
+    directory = directory or default_metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    for path in _worker_files(directory):
+        os.remove(path)
+
+
+def mark_process_dead(pid, directory=None):
+    """worker 退出后删除其仪表，保留计数器和直方图的累计值（gunicorn child_exit 中调用）"""
+    path = os.path.join(directory or default_metrics_dir(), f'worker_{pid}.json')
+    data = _read_json(path)
+    if data is None:
+        return
+    data['gauges'] = {}
+    _write_json(path, data)
+
+
+_store = MetricsStore()
+_state = {'directory': None, 'stop': None}
+# 当前线程正在处理的请求：[开始时间, SQL语句数, SQL时间, 当前语句的开始时间]，不在请求中时为 None。
+# 一个线程中的SQL语句依次执行，语句的开始时间也记在这里；请求之外（启动、后台线程）执行的语句不计入
+_local = threading.local()
+
+
+def _flush_loop(stop, directory):
+    while not stop.wait(FLUSH_INTERVAL):
+        _store.flush(directory)
+
+
+def _start_flusher():
+    stop = threading.Event()
+    threading.Thread(target=_flush_loop, args=(stop, _state['directory']), name='metrics-flush', daemon=True).start()
+    _state['stop'] = stop
+
+
+def _after_fork_in_child():
+    # fork 前主进程中的指标不属于子进程；继承来的写入线程已不存在，需要重新启动
+    _store.reset(dirty=True)
+    _start_flusher()
+
+
+def _start_store(directory):
+    if _state['directory'] is not None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _state['directory'] = directory
+    _start_flusher()
+    atexit.register(lambda: _store.flush(_state['directory']))
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = getattr(_local, 'request', None)
+    if current is not None:
+        current[3] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = getattr(_local, 'request', None)
+    if current is not None:
+        current[1] += 1
+        current[2] += time.perf_counter() - current[3]
+
+
+def register_metrics(app, engine):
+    """注册请求计时、SQL计数和 /metrics 路由"""
+    directory = app.config.get('METRICS_DIR') or default_metrics_dir()
+    _start_store(directory)
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_metrics():
+        now = time.perf_counter()
+        _local.request = [now, 0, 0.0, now]
+        _store.request_started()
+
+    @app.after_request
+    def record_request_metrics(response):
+        current = getattr(_local, 'request', None)
+        if current is None:
+            return response
+        _local.request = None
+        upload_bytes = request.content_length or 0
+        if upload_bytes and request.mimetype != 'multipart/form-data':
+            upload_bytes = 0
+        _store.request_finished(
+            request.endpoint or 'unmatched', request.method, str(response.status_code),
+            time.perf_counter() - current[0], current[1], current[2], upload_bytes
+        )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        _store.flush(directory, force=True)
+        return Response(render(*collect(directory)), content_type=CONTENT_TYPE)
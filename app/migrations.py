@@ -0,0 +1,263 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex
+from models import db, DailyStat, SchemaVersion, TASK_REMARK_COUNT_TRIGGERS
+from builtin_data import apply_builtin_catalogs
+from sqlite_tuning import write_lock
+
+# 数据库结构迁移
+# MIGRATIONS 按版本号顺序登记迁移步骤，每执行一步在 schema_version 中写入一条记录。
+# 启动时先用一条 SELECT max(version) 判断是否已是最新版本，是则直接返回；
+# 否则取得数据库写锁，在一个事务中依次执行尚未执行的步骤，任何一步失败整体回滚。
+# 步骤需要可以在任意旧版本的数据库上执行（新建的数据库由第1步按模型建表，之后的加列步骤自动跳过）。
+# 大表的数据修正不放在迁移事务中，由 backfill.py 分批执行。
+# 修改模型（新增表、字段或索引）时在末尾追加新步骤，已发布的步骤不要修改编号和内容。
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info({table})')]
+
+
+def add_column(conn, table, column, ddl):
+    """表中没有该字段时添加，返回是否新增"""
+    if column in table_columns(conn, table):
+        return False
+    conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}')
+    return True
+
+
+def create_tables(conn):
+    """按模型创建缺少的表（新数据库创建全部表、索引和触发器）"""
+    db.metadata.create_all(conn)
+
+
+def user_profile_columns(conn):
+    add_column(conn, 'user', 'nickname', 'TEXT')
+    add_column(conn, 'user', 'phone', 'TEXT')
+    add_column(conn, 'user', 'avatar', "TEXT DEFAULT 'default.svg'")
+    # 子账号相关字段
+    add_column(conn, 'user', 'parent_id', 'INTEGER REFERENCES user(id)')
+    add_column(conn, 'user', 'role', "TEXT DEFAULT 'user'")
+    add_column(conn, 'user', 'permissions', "TEXT DEFAULT '{}'")
+    conn.exec_driver_sql("UPDATE user SET nickname = username WHERE nickname IS NULL")
+    conn.exec_driver_sql("UPDATE user SET avatar = 'default.svg' WHERE avatar IS NULL")
+    conn.exec_driver_sql("UPDATE user SET role = 'user' WHERE role IS NULL")
+    conn.exec_driver_sql("UPDATE user SET permissions = '{}' WHERE permissions IS NULL")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_user_parent_id ON user(parent_id)")
+
+
+def wish_exchange_amount(conn):
+    add_column(conn, 'wish', 'exchange_amount', 'INTEGER DEFAULT 1')
+    conn.exec_driver_sql("UPDATE wish SET exchange_amount = 1 WHERE exchange_amount IS NULL")
+
+
+def user_settings_tts_enabled(conn):
+    add_column(conn, 'user_settings', 'tts_enabled', 'INTEGER DEFAULT 1')
+    conn.exec_driver_sql("UPDATE user_settings SET tts_enabled = 1 WHERE tts_enabled IS NULL")
+
+
+def honor_icon(conn):
+    add_column(conn, 'honor', 'icon', "TEXT DEFAULT 'default.png'")
+    conn.exec_driver_sql("UPDATE honor SET icon = 'default.png' WHERE icon IS NULL")
+
+
+def task_remark_indexes(conn):
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_task_remark_task_id ON task_remark(task_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_task_remark_parent_id ON task_remark(parent_id)")
+
+
+def task_category_sort_order(conn):
+    if not add_column(conn, 'task_category', 'sort_order', 'INTEGER DEFAULT 0'):
+        return
+    # 内置学科使用默认顺序，其余分类按ID升序排在后面
+    builtin_order = [('语文', 1), ('数学', 2), ('英语', 3), ('科学', 4), ('体育', 5), ('其他', 6)]
+    for name, order in builtin_order:
+        conn.exec_driver_sql("UPDATE task_category SET sort_order = ? WHERE name = ?", (order, name))
+    max_order = conn.exec_driver_sql("SELECT MAX(sort_order) FROM task_category").scalar() or 0
+    rows = conn.exec_driver_sql(
+        "SELECT id FROM task_category WHERE sort_order IS NULL OR sort_order = 0 ORDER BY id ASC"
+    ).all()
+    for (category_id,) in rows:
+        max_order += 1
+        conn.exec_driver_sql("UPDATE task_category SET sort_order = ? WHERE id = ?", (max_order, category_id))
+
+
+def task_remark_count(conn):
+    if add_column(conn, 'task', 'remark_count', 'INTEGER DEFAULT 0'):
+        # 仅在新增字段时回填一次，之后由触发器维护
+        conn.exec_driver_sql(
+            """
+            UPDATE task SET remark_count = (
+                SELECT COUNT(*) FROM task_remark
+                WHERE task_remark.task_id = task.id AND COALESCE(task_remark.is_deleted, 0) = 0
+            )
+            """
+        )
+    for trigger_sql in TASK_REMARK_COUNT_TRIGGERS:
+        conn.exec_driver_sql(trigger_sql)
+
+
+def task_images_column(conn):
+    """原 script/update_task_images_migration.py"""
+    add_column(conn, 'task', 'images', 'TEXT')
+
+
+def operation_log_user_nickname(conn):
+    """原 script/update_operation_logs_migration.py：只填写没有昵称的日志，已有的操作人昵称保持不变"""
+    add_column(conn, 'operation_log', 'user_nickname', 'TEXT')
+    conn.exec_driver_sql(
+        """
+        UPDATE operation_log SET user_nickname = (
+            SELECT COALESCE(user.nickname, user.username) FROM user WHERE user.id = operation_log.user_id
+        )
+        WHERE user_nickname IS NULL
+        """
+    )
+    conn.exec_driver_sql("UPDATE operation_log SET user_nickname = '未知用户' WHERE user_nickname IS NULL")
+
+
+def user_settings_task_auto_migrate(conn):
+    add_column(conn, 'user_settings', 'task_auto_migrate', 'INTEGER DEFAULT 0')
+
+
+def task_category_id(conn):
+    for table_name in ('task', 'task_series'):
+        if add_column(conn, table_name, 'category_id', 'INTEGER REFERENCES task_category(id)'):
+            # 仅在新增字段时回填一次，之后由应用写入
+            conn.exec_driver_sql(
+                f"""
+                UPDATE {table_name} SET category_id = (
+                    SELECT task_category.id FROM task_category WHERE task_category.name = {table_name}.category
+                )
+                """
+            )
+
+
+def model_indexes(conn):
+    """为已有的表创建models中声明的索引"""
+    existing_tables = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table'")}
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            conn.exec_driver_sql(str(CreateIndex(index, if_not_exists=True).compile(dialect=sqlite_dialect.dialect())))
+
+
+def task_image_paths(conn):
+    """
+    原 script/update_task_images_paths.py：任务图片从 /uploads/task_{task_id}/文件名
+    迁移到 /uploads/task_images/{user_id}/{task_id}/文件名，同时移动文件
+    """
+    rows = conn.exec_driver_sql(
+        "SELECT id, user_id, images FROM task WHERE images LIKE '%/uploads/task\\_%' ESCAPE '\\'"
+    ).all()
+    for task_id, user_id, images in rows:
+        try:
+            urls = json.loads(images)
+        except (TypeError, ValueError):
+            continue
+        new_urls = []
+        for url in urls:
+            if '/uploads/task_images/' in url:
+                new_urls.append(url)
+                continue
+            filename = os.path.basename(url)
+            old_path = os.path.join(UPLOAD_FOLDER, f'task_{task_id}', filename)
+            new_dir = os.path.join(UPLOAD_FOLDER, 'task_images', str(user_id), str(task_id))
+            if os.path.exists(old_path):
+                os.makedirs(new_dir, exist_ok=True)
+                shutil.move(old_path, os.path.join(new_dir, filename))
+            new_urls.append(f'/uploads/task_images/{user_id}/{task_id}/{filename}')
+        if new_urls != urls:
+            conn.exec_driver_sql("UPDATE task SET images = ? WHERE id = ?", (json.dumps(new_urls), task_id))
+
+
+def builtin_honors(conn):
+    """原 script/update_honors_migration.py：按 builtin_data.BUILTIN_HONORS 更新荣誉"""
+    apply_builtin_catalogs(conn, names=('honor',))
+
+
+def daily_stats_category_id(conn):
+    """日统计改为按分类ID分行：主键变化需要重建表，数据由启动时的 ensure_daily_stats 根据任务表重新生成"""
+    if 'category_id' in table_columns(conn, DailyStat.__tablename__):
+        return
+    conn.exec_driver_sql(f'DROP TABLE {DailyStat.__tablename__}')
+    DailyStat.__table__.create(conn)
+
+
+# (版本号, 说明, 步骤)，版本号连续递增
+MIGRATIONS = (
+    (1, '按模型创建缺少的表', create_tables),
+    (2, 'user表添加昵称、头像、子账号字段', user_profile_columns),
+    (3, 'wish表添加exchange_amount字段', wish_exchange_amount),
+    (4, 'user_settings表添加tts_enabled字段', user_settings_tts_enabled),
+    (5, 'honor表添加icon字段', honor_icon),
+    (6, 'task_remark表索引', task_remark_indexes),
+    (7, 'task_category表添加sort_order字段', task_category_sort_order),
+    (8, 'task表添加remark_count字段和触发器', task_remark_count),
+    (9, 'task表添加images字段', task_images_column),
+    (10, 'operation_log表添加user_nickname字段', operation_log_user_nickname),
+    (11, 'user_settings表添加task_auto_migrate字段', user_settings_task_auto_migrate),
+    (12, 'task、task_series表添加category_id字段', task_category_id),
+    (13, '创建models中声明的索引', model_indexes),
+    (14, '任务图片迁移到按用户和任务分目录的路径', task_image_paths),
+    (15, '更新内置荣誉', builtin_honors),
+    (16, 'daily_stats表按category_id分行', daily_stats_category_id),
+    (17, '创建backfill_checkpoint表（大表的数据回填见 backfill.py）', create_tables),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """数据库当前版本，没有 schema_version 表（新数据库或尚未使用版本化迁移的数据库）时为0"""
+    if not conn.dialect.has_table(conn, SchemaVersion.__tablename__):
+        return 0
+    return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def applied_migrations(conn):
+    """已执行的迁移：{版本号: (执行时间, 用时毫秒)}"""
+    if not conn.dialect.has_table(conn, SchemaVersion.__tablename__):
+        return {}
+    rows = conn.execute(select(SchemaVersion.version, SchemaVersion.applied_at, SchemaVersion.duration_ms))
+    return {version: (applied_at, duration_ms) for version, applied_at, duration_ms in rows}
+
+
+def run_migrations(engine, log=print):
+    """执行尚未执行的迁移并提交，返回本次执行的版本号列表；数据库已是最新版本时只执行一条 SELECT"""
+    with engine.connect() as conn:
+        try:
+            if (conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0) >= LATEST_VERSION:
+                return []
+        except OperationalError:
+            pass  # 还没有 schema_version 表
+
+    applied = []
+    with write_lock(engine) as conn:
+        # 取得锁后再检查一次，其他进程可能已经执行
+        version = current_version(conn)
+        pending = [migration for migration in MIGRATIONS if migration[0] > version]
+        if not pending:
+            return applied
+        log(f'数据库版本 {version}，需要执行 {len(pending)} 个迁移')
+        started = time.perf_counter()
+        for number, name, step in pending:
+            step_started = time.perf_counter()
+            step(conn)
+            duration_ms = (time.perf_counter() - step_started) * 1000
+            conn.execute(insert(SchemaVersion).values(
+                version=number, name=name, applied_at=datetime.now(), duration_ms=round(duration_ms)
+            ))
+            log(f'  [{number:04d}] {name}：{duration_ms:.1f} ms')
+            applied.append(number)
+        log(f'迁移完成，当前版本 {LATEST_VERSION}，共用时 {(time.perf_counter() - started) * 1000:.1f} ms')
+    return applied
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 from datetime import datetime
 import hashlib
 
@@ -38,6 +39,10 @@ class User(db.Model):
     honors = db.relationship('UserHonor', backref='user', lazy=True)
     subaccounts = db.relationship('User', backref=db.backref('parent', remote_side=[id]), lazy=True)  # 子账号关系
 
+    __table_args__ = (
+        db.Index('idx_user_parent_id', 'parent_id'),  # 查询子账号/兄弟账号
+    )
+
 # 任务表
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -46,7 +51,8 @@ class Task(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     icon = db.Column(db.String(100))
-    category = db.Column(db.String(50), nullable=False)
+    category = db.Column(db.String(50), nullable=False)  # 写入时的分类名称，分类不存在时作为显示名称
+    category_id = db.Column(db.Integer, db.ForeignKey('task_category.id'))  # 所属分类，名称和颜色以分类表为准
     planned_time = db.Column(db.Integer, default=10)  # 默认10分钟
     actual_time = db.Column(db.Integer, default=0)
     points = db.Column(db.Integer, default=1)  # 可以为负数，表示惩罚
@@ -58,6 +64,82 @@ class Task(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     remark = db.Column(db.Text)
     images = db.Column(db.Text)  # 存储任务图片路径，JSON格式
+    remark_count = db.Column(db.Integer, default=0)  # 未删除备注数量，由task_remark表触发器维护
+
+    __table_args__ = (
+        # 按日期列出任务、日统计、荣誉检测：user_id + start_date (+ status)
+        db.Index('idx_task_user_start_date_status', 'user_id', 'start_date', 'status'),
+        # 未完成任务、已完成任务汇总：user_id + status
+        db.Index('idx_task_user_status', 'user_id', 'status'),
+        # 按学科筛选、学科去重：user_id + category
+        db.Index('idx_task_user_category', 'user_id', 'category'),
+        # 按系列删除/编辑：series_id + start_date
+        db.Index('idx_task_series_start_date', 'series_id', 'start_date'),
+        # 删除分类前检查是否仍有任务使用：category_id
+        db.Index('idx_task_category_id', 'category_id'),
+    )
+
+    # 分类名称和颜色随任务一起查询（LEFT OUTER JOIN），修改分类名称不需要改写任务
+    category_ref = db.relationship('TaskCategory', lazy='joined')
+
+    @property
+    def category_name(self):
+        return self.category_ref.name if self.category_ref is not None else self.category
+
+    @property
+    def category_color(self):
+        return self.category_ref.color if self.category_ref is not None else None
+
+# 重复任务规则表：只保存规则和任务模板，具体日期的任务在读取时按规则展开（虚拟任务），
+# 完成、编辑、添加备注时才写入一条 Task 记录。
+# 从某天起修改系列时规则会拆成首尾相接的多段，各段 series_id 相同
+class TaskSeries(db.Model):
+    __tablename__ = 'task_series'
+    id = db.Column(db.Integer, primary_key=True)
+    series_id = db.Column(db.String(50), nullable=False)  # 与 Task.series_id 对应
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    repeat_setting = db.Column(db.String(50), nullable=False)
+    weekday_mask = db.Column(db.Integer, nullable=False)  # 第i位表示星期i（0为周一）执行，见 recurrence.py
+    start_date = db.Column(db.String(20), nullable=False)
+    end_date = db.Column(db.String(20), nullable=False)
+    # 任务模板
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    icon = db.Column(db.String(100))
+    category = db.Column(db.String(50), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('task_category.id'))
+    planned_time = db.Column(db.Integer, default=10)
+    points = db.Column(db.Integer, default=1)
+    images = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        # 按日期展开：user_id + start_date（再过滤 end_date）
+        db.Index('idx_task_series_user_start', 'user_id', 'start_date'),
+        # 按系列编辑/删除：series_id + start_date
+        db.Index('idx_task_series_series_start', 'series_id', 'start_date'),
+        # 删除分类前检查是否仍有规则使用：category_id
+        db.Index('idx_task_series_category_id', 'category_id'),
+    )
+
+    category_ref = db.relationship('TaskCategory', lazy='joined')
+
+    @property
+    def category_name(self):
+        return self.category_ref.name if self.category_ref is not None else self.category
+
+    @property
+    def category_color(self):
+        return self.category_ref.color if self.category_ref is not None else None
+
+# 重复任务例外表：某一天的任务已写入 Task（task_id 非空）或已被删除（task_id 为空），不再按规则展开
+class TaskSeriesException(db.Model):
+    __tablename__ = 'task_series_exception'
+    series_pk = db.Column(db.Integer, db.ForeignKey('task_series.id'), primary_key=True)
+    date = db.Column(db.String(20), primary_key=True)
+    task_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.now)
 
 # 任务备注表（支持文本、图片、语音、回复）
 class TaskRemark(db.Model):
@@ -76,6 +158,51 @@ class TaskRemark(db.Model):
     task = db.relationship('Task', backref=db.backref('remarks', lazy=True))
     user = db.relationship('User')
 
+    __table_args__ = (
+        db.Index('idx_task_remark_task_deleted', 'task_id', 'is_deleted'),
+        db.Index('idx_task_remark_parent_id', 'parent_id'),
+    )
+
+# 维护 task.remark_count 的触发器：新增、软删除/恢复、物理删除备注时同步计数
+# 建表时由 create_all 创建，已有数据库由 migrations.py 中的迁移步骤创建并回填
+TASK_REMARK_COUNT_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_task_remark_count_insert
+    AFTER INSERT ON task_remark
+    WHEN COALESCE(NEW.is_deleted, 0) = 0
+    BEGIN
+        UPDATE task SET remark_count = COALESCE(remark_count, 0) + 1 WHERE id = NEW.task_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_task_remark_count_soft_delete
+    AFTER UPDATE OF is_deleted ON task_remark
+    WHEN COALESCE(OLD.is_deleted, 0) = 0 AND COALESCE(NEW.is_deleted, 0) != 0
+    BEGIN
+        UPDATE task SET remark_count = MAX(COALESCE(remark_count, 0) - 1, 0) WHERE id = NEW.task_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_task_remark_count_restore
+    AFTER UPDATE OF is_deleted ON task_remark
+    WHEN COALESCE(OLD.is_deleted, 0) != 0 AND COALESCE(NEW.is_deleted, 0) = 0
+    BEGIN
+        UPDATE task SET remark_count = COALESCE(remark_count, 0) + 1 WHERE id = NEW.task_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_task_remark_count_delete
+    AFTER DELETE ON task_remark
+    WHEN COALESCE(OLD.is_deleted, 0) = 0
+    BEGIN
+        UPDATE task SET remark_count = MAX(COALESCE(remark_count, 0) - 1, 0) WHERE id = OLD.task_id;
+    END
+    """
+]
+
+for _trigger_sql in TASK_REMARK_COUNT_TRIGGERS:
+    event.listen(TaskRemark.__table__, 'after_create', DDL(_trigger_sql).execute_if(dialect='sqlite'))
+
 # 任务分类表
 class TaskCategory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -85,6 +212,20 @@ class TaskCategory(db.Model):
     sort_order = db.Column(db.Integer, default=0)
     is_builtin = db.Column(db.Boolean, default=False)
 
+
+def _sync_category_id(mapper, connection, target):
+    """通过ORM写入任务或重复规则时，按分类名称填写 category_id（名称修改过或尚未填写时）"""
+    history = db.inspect(target).attrs.category.history
+    if target.category and (target.category_id is None or history.has_changes()):
+        target.category_id = connection.execute(
+            db.select(TaskCategory.id).where(TaskCategory.name == target.category)
+        ).scalar()
+
+
+for _model in (Task, TaskSeries):
+    event.listen(_model, 'before_insert', _sync_category_id)
+    event.listen(_model, 'before_update', _sync_category_id)
+
 # 心愿表
 class Wish(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -98,6 +239,26 @@ class Wish(db.Model):
     exchange_amount = db.Column(db.Integer, default=1)  # 兑换数量
     is_builtin = db.Column(db.Boolean, default=False)
 
+# 心愿兑换记录表：兑换时写入结构化记录，兑换历史不再解析操作日志文本
+class WishExchange(db.Model):
+    __tablename__ = 'wish_exchange'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    wish_id = db.Column(db.Integer)  # 心愿可能被删除，不设外键
+    wish_name = db.Column(db.String(100), nullable=False)  # 兑换时的心愿名称，心愿被删除后用于展示
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    total_cost = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Integer)  # 兑换得到的数量，例如30（分钟）
+    unit = db.Column(db.String(20))
+    remark = db.Column(db.Text)
+    operation_log_id = db.Column(db.Integer)  # 对应的操作日志，用于回填时去重
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_wish_exchange_user_time', 'user_id', 'created_at'),
+        db.Index('idx_wish_exchange_log', 'operation_log_id'),
+    )
+
 # 操作记录表
 class OperationLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -108,6 +269,13 @@ class OperationLog(db.Model):
     operation_time = db.Column(db.DateTime, default=datetime.now)
     operation_result = db.Column(db.String(20), default='成功')
 
+    __table_args__ = (
+        # 操作记录分页：user_id + operation_time
+        db.Index('idx_operation_log_user_time', 'user_id', 'operation_time'),
+        # 兑换记录、按类型统计：user_id + operation_type + operation_time
+        db.Index('idx_operation_log_user_type_time', 'user_id', 'operation_type', 'operation_time'),
+    )
+
 # 荣誉表
 class Honor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -127,12 +295,105 @@ class UserHonor(db.Model):
     obtained_at = db.Column(db.DateTime, default=datetime.now)
     obtained_count = db.Column(db.Integer, default=1)
 
+    __table_args__ = (
+        db.Index('idx_user_honor_user_honor', 'user_id', 'honor_id'),
+    )
+
+# 金币流水表：只追加，每次金币变更都在同一事务中写入一行
+class GoldLedger(db.Model):
+    __tablename__ = 'gold_ledger'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)  # 实际变更的金币数（扣到0为止时为实际扣除数）
+    reason_code = db.Column(db.String(30), nullable=False)  # 变更原因，见 gold_service.py
+    task_id = db.Column(db.Integer)  # 关联任务（任务可能已被删除，不设外键）
+    wish_id = db.Column(db.Integer)  # 关联心愿
+    balance_after = db.Column(db.Integer, nullable=False)  # 变更后的余额
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        # 按用户倒序翻页：user_id + id
+        db.Index('idx_gold_ledger_user_id', 'user_id', 'id'),
+        # 按时间查询余额：user_id + created_at
+        db.Index('idx_gold_ledger_user_time', 'user_id', 'created_at'),
+    )
+
+# 金币余额快照表：每个用户每累计一定数量的流水记录一次余额，查询历史余额时从最近的快照开始累加
+class GoldSnapshot(db.Model):
+    __tablename__ = 'gold_snapshot'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    ledger_id = db.Column(db.Integer, nullable=False)  # 快照包含的最后一条流水ID（0表示启用流水前的期初余额）
+    balance = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_gold_snapshot_user_time', 'user_id', 'created_at'),
+    )
+
+# 每日统计汇总表：按 用户+日期+学科 汇总任务数据，任务增删改时在同一事务中刷新
+class DailyStat(db.Model):
+    __tablename__ = 'daily_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    date = db.Column(db.String(20), primary_key=True)  # 与 Task.start_date 格式一致，YYYY-MM-DD
+    # 按分类ID分行，分类名称读取时关联分类表取得，修改分类名称不需要改写日统计；
+    # 未关联分类的历史任务 category_id 为0，category 为任务中保存的名称（关联了分类的行为空字符串）
+    category_id = db.Column(db.Integer, primary_key=True, default=0)
+    category = db.Column(db.String(50), primary_key=True, default='')
+    total = db.Column(db.Integer, nullable=False, default=0)  # 任务总数（所有状态）
+    completed = db.Column(db.Integer, nullable=False, default=0)  # 已完成任务数
+    completed_time = db.Column(db.Integer, nullable=False, default=0)  # 已完成任务的实际用时之和
+    completed_points = db.Column(db.Integer, nullable=False, default=0)  # 已完成任务的积分之和
+
+# 用户打卡位图表：按天序号（date.toordinal() - base_day）记录每天的任务状态
+# any_bits: 当天有任务；completed_bits: 当天有已完成任务；perfect_bits: 当天任务全部完成
+class UserActivityBitmap(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    base_day = db.Column(db.Integer, nullable=False)  # 第0位对应的天序号
+    any_bits = db.Column(db.LargeBinary, default=b'')
+    completed_bits = db.Column(db.LargeBinary, default=b'')
+    perfect_bits = db.Column(db.LargeBinary, default=b'')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+# 未完成任务迁移记录表：每个家庭（主账号）每天一条，保证同一天只迁移一次
+class CarryOverRun(db.Model):
+    __tablename__ = 'carry_over_run'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    run_date = db.Column(db.String(20), primary_key=True)  # YYYY-MM-DD
+    moved_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+# 数据库结构版本表：每执行一个迁移步骤写入一条（migrations.MIGRATIONS）
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.now)
+    duration_ms = db.Column(db.Integer)  # 执行用时（毫秒）
+
+# 数据回填进度表：每个回填任务（backfill.BACKFILLS）一条，记录已处理到的主键，中断后从这里继续
+class BackfillCheckpoint(db.Model):
+    __tablename__ = 'backfill_checkpoint'
+    name = db.Column(db.String(100), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)  # 已处理完 id <= last_id 的行
+    rows_changed = db.Column(db.Integer, nullable=False, default=0)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.now)
+
+# 内置数据版本表：每份内置数据（分类、心愿、荣誉）一条，记录最近一次写入时的校验和
+class SeedState(db.Model):
+    __tablename__ = 'seed_state'
+    name = db.Column(db.String(50), primary_key=True)
+    checksum = db.Column(db.String(64), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.now)
+
 # 用户设置表
 class UserSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
     fixed_tomato_page = db.Column(db.Boolean, default=False)
     task_auto_sort = db.Column(db.Boolean, default=False)
+    task_auto_migrate = db.Column(db.Boolean, default=False)  # 每天自动把过期未完成任务迁移到当天
     tts_enabled = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
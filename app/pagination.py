@@ -0,0 +1,100 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.engine import Row
+
+# 游标（keyset）分页
+# 游标为上一页最后一条记录的 "时间,ID"，下一页通过 (时间, ID) < (游标时间, 游标ID) 在索引上直接定位，
+# 不使用 OFFSET，翻到再深的页也不需要扫描并丢弃前面的记录。
+# 旧数据中时间可能为 NULL：这些记录按 ID 倒序接在有时间的记录之后，游标的时间部分为空（",ID"）。
+# 有时间的记录取完后再单独查询没有时间的记录，两段都能在索引上定位（不用 COALESCE 或 OR 改写条件）。
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_ID = 2 ** 63 - 1  # SQLite INTEGER 的上限，超出时绑定参数会抛出 OverflowError
+COUNT_CACHE_SECONDS = 60
+
+
+def encode_cursor(moment, record_id):
+    return f'{moment.isoformat() if moment is not None else ""},{record_id}'
+
+
+def parse_cursor(value):
+    """
+    解析 "时间,ID" 格式的游标（时间为空表示上一页停在没有时间的记录上），
+    空字符串表示第一页，返回 None；格式错误统一抛出 ValueError，由调用方返回400
+    """
+    if not value:
+        return None
+    moment, separator, record_id = value.rpartition(',')
+    if not separator:
+        raise ValueError(f'cursor格式错误: {value}')
+    try:
+        moment = datetime.fromisoformat(moment.strip()) if moment.strip() else None
+        record_id = int(record_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'cursor格式错误: {value}') from e
+    if not 0 <= record_id <= MAX_ID:
+        raise ValueError(f'cursor格式错误: {value}')
+    return moment, record_id
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    try:
+        limit = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        limit = default
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def keyset_page(query, time_column, id_column, cursor, limit):
+    """
+    按 (时间, ID) 倒序取一页，返回 (记录列表, next_cursor)。
+    query 的结果可以是模型对象，也可以是以模型对象开头的行（关联查询）。
+    """
+    moment, record_id = cursor if cursor is not None else (None, None)
+    rows = []
+    if cursor is None or moment is not None:
+        timed = query.filter(time_column.isnot(None))
+        if cursor is not None:
+            timed = timed.filter(tuple_(time_column, id_column) < tuple_(moment, record_id))
+        rows = timed.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        untimed = query.filter(time_column.is_(None))
+        if cursor is not None and moment is None:
+            untimed = untimed.filter(id_column < record_id)
+        rows += untimed.order_by(id_column.desc()).limit(limit + 1 - len(rows)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1][0] if isinstance(rows[-1], Row) else rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+
+class CountCache:
+    """进程内的计数缓存：总数只在需要时计算，并在有效期内复用，避免每次翻页都COUNT"""
+
+    def __init__(self, ttl=COUNT_CACHE_SECONDS):
+        self.ttl = ttl
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(key)
+            if cached and cached[1] > now:
+                return cached[0]
+        value = compute()
+        with self._lock:
+            if len(self._values) >= 1000:
+                # 清理过期的缓存项，避免无限增长
+                self._values = {k: v for k, v in self._values.items() if v[1] > now}
+            self._values[key] = (value, now + self.ttl)
+        return value
+
+
+count_cache = CountCache()
@@ -0,0 +1,110 @@
+from datetime import date, datetime
+from models import db, Task
+from task_categories import category_id_for
+
+# 重复任务规则
+# repeat_setting 为逗号分隔的多选设置，例如 "每个工作日,每周六"，统一转换为星期位掩码：
+# 第i位表示星期i（0为周一）需要执行。开始日期当天无论星期几都有一次任务（与原有逐条创建的行为一致）。
+# 执行日期按天序号（date.toordinal()）直接计算：每个置位的星期在区间内是一个步长为7的等差数列，
+# 不需要逐天判断；多选设置取并集，同一天只有一次任务。
+
+WEEKDAY_SETTINGS = {
+    '每周一': 0,
+    '每周二': 1,
+    '每周三': 2,
+    '每周四': 3,
+    '每周五': 4,
+    '每周六': 5,
+    '每周日': 6
+}
+EVERY_DAY_MASK = 0b1111111
+WORKDAY_MASK = 0b0011111
+
+# 逐日写入模式下每次 executemany 插入的行数
+INSERT_CHUNK_SIZE = 500
+
+# 按首个任务展开其余执行日期时沿用的字段
+TEMPLATE_FIELDS = (
+    'user_id', 'series_id', 'name', 'description', 'icon', 'category', 'category_id',
+    'planned_time', 'points', 'repeat_setting', 'end_date', 'images'
+)
+
+
+def weekday_mask(repeat_setting):
+    """把重复设置转换为星期位掩码，'无'或无法识别时返回0"""
+    mask = 0
+    for setting in (repeat_setting or '').split(','):
+        setting = setting.strip()
+        if setting == '每天':
+            mask |= EVERY_DAY_MASK
+        elif setting == '每个工作日':
+            mask |= WORKDAY_MASK
+        elif setting in WEEKDAY_SETTINGS:
+            mask |= 1 << WEEKDAY_SETTINGS[setting]
+    return mask
+
+
+def parse_day(value):
+    """'YYYY-MM-DD' 转换为date，格式错误返回None"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def is_occurrence(day, start, end, mask):
+    return start <= day <= end and (day == start or (mask >> day.weekday()) & 1 == 1)
+
+
+def occurrence_days(start, end, mask, range_start=None, range_end=None):
+    """返回 [start, end] 与 [range_start, range_end] 交集内所有执行日期的天序号（升序）"""
+    first, last = start.toordinal(), end.toordinal()
+    low = max(first, range_start.toordinal()) if range_start else first
+    high = min(last, range_end.toordinal()) if range_end else last
+    if low > high:
+        return []
+    if mask & EVERY_DAY_MASK == EVERY_DAY_MASK:
+        return list(range(low, high + 1))
+    low_weekday = date.fromordinal(low).weekday()
+    days = []
+    for weekday in range(7):
+        if (mask >> weekday) & 1:
+            days.extend(range(low + (weekday - low_weekday) % 7, high + 1, 7))
+    days.sort()
+    if low == first and (not days or days[0] != first):
+        days.insert(0, first)
+    return days
+
+
+def occurrence_dates(start, end, mask, range_start=None, range_end=None):
+    """与 occurrence_days 相同，返回date列表"""
+    return [date.fromordinal(day) for day in occurrence_days(start, end, mask, range_start, range_end)]
+
+
+def series_task_rows(task):
+    """
+    以首个任务（开始日期当天）为模板，生成其余执行日期的 Task 插入数据；
+    不是有效的重复任务时返回空列表。
+    """
+    start, end = parse_day(task.start_date), parse_day(task.end_date)
+    mask = weekday_mask(task.repeat_setting)
+    if not start or not end or not mask:
+        return []
+    now = datetime.now()
+    template = {field: getattr(task, field) for field in TEMPLATE_FIELDS}
+    if template['category_id'] is None:
+        # 模板任务尚未写入时由这里填写分类ID（批量插入不经过ORM监听器）
+        template['category_id'] = category_id_for(task.category)
+    template.update(actual_time=0, status='未完成', created_at=now, updated_at=now)
+    first = start.toordinal()
+    return [
+        dict(template, start_date=date.fromordinal(day).isoformat())
+        for day in occurrence_days(start, end, mask) if day != first
+    ]
+
+
+def bulk_insert_tasks(rows, chunk_size=INSERT_CHUNK_SIZE):
+    """按 chunk_size 分批以 executemany 写入 Task 行，与调用方处于同一事务，由调用方提交"""
+    for offset in range(0, len(rows), chunk_size):
+        db.session.execute(Task.__table__.insert(), rows[offset:offset + chunk_size])
+    return len(rows)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+运行指标开销基准测试
+
+开启运行指标（metrics.py）后每个请求增加的用时由三部分组成：
+- 请求钩子：before_request/after_request 中的计时和记录；
+- 引擎注册了游标事件后 SQLAlchemy 的事件分发：每个连接执行第一条语句时要建立事件分发表，之后每条语句调用两个游标钩子；
+- 后台线程每秒写一次指标文件（不在请求中，可忽略）。
+同一台机器上两次请求的用时本身相差百分之几，直接比较开启、关闭指标的请求用时分辨不出这么小的差别，
+所以分别在循环中测量前两部分（多次取最小值），再按压测接口平均每个请求使用的连接数和SQL语句数估算每个请求增加的用时，
+与关闭指标时每个请求的用时比较。估算的增加比例超过预算（默认 5%）时以1退出。
+
+用法：python script/benchmark_metrics.py [--requests 400] [--budget 0.05]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 使用临时数据库和临时指标目录，避免影响 instance/homerecord.db
+tmp_dir = tempfile.mkdtemp(prefix='homerecord_metrics_')
+DATABASE_URI = f"sqlite:///{os.path.join(tmp_dir, 'metrics_bench.db')}"
+METRICS_DIR = os.path.join(tmp_dir, 'metrics')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+# 添加父目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from app import create_app
+from models import db
+import metrics
+
+REPEAT = 5
+
+
+def seed(client):
+    today = datetime.now().strftime('%Y-%m-%d')
+    user = client.post('/api/register', json={'username': 'benchuser', 'password': 'Benchuser123'}).get_json()['user']
+    for i in range(10):
+        client.post('/api/tasks', json={
+            'user_id': user['id'], 'name': f'任务{i}', 'category': '语文', 'start_date': today, 'points': 2
+        })
+    return [
+        f"/api/categories?user_id={user['id']}",
+        f"/api/tasks?user_id={user['id']}&date={today}",
+        f"/api/users/{user['id']}",
+        f"/api/statistics?user_id={user['id']}",
+    ]
+
+
+def best_of(fn, count):
+    """重复 REPEAT 次执行 count 次 fn，返回单次用时（CPU时间，秒）的最小值"""
+    best = None
+    for _ in range(REPEAT):
+        started = time.process_time()
+        for i in range(count):
+            fn(i)
+        elapsed = (time.process_time() - started) / count
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_requests(client, urls, count):
+    """轮流调用接口，返回每个请求的用时"""
+    def call(i):
+        response = client.get(urls[i % len(urls)])
+        if response.status_code != 200:
+            raise RuntimeError(f'{urls[i % len(urls)]} 请求失败: {response.status_code}')
+    return best_of(call, count)
+
+
+def count_per_request(app, client, urls, count):
+    """开启指标的应用中平均每个请求使用的 (连接数, SQL语句数)"""
+    connections = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *args: connections.append(1)
+    event.listen(engine, 'engine_connect', listener)
+    metrics._store.histograms.clear()
+    for i in range(count):
+        client.get(urls[i % len(urls)])
+    event.remove(engine, 'engine_connect', listener)
+    statements = [data for (name, _), data in metrics._store.histograms.items() if name == metrics.REQUEST_SQL_STATEMENTS]
+    return len(connections) / count, sum(data[-1] for data in statements) / count
+
+
+def time_request_hooks(app, url, count):
+    """每个请求的 before_request/after_request 钩子"""
+    before = next(f for f in app.before_request_funcs[None] if f.__name__ == 'start_request_metrics')
+    after = next(f for f in app.after_request_funcs[None] if f.__name__ == 'record_request_metrics')
+    with app.test_request_context(url):
+        response = app.response_class('')
+
+        def call(i):
+            before()
+            after(response)
+        return best_of(call, count)
+
+
+def time_sql_events(uri, count):
+    """注册游标钩子后增加的用时：(新连接执行第一条语句, 之后每条语句)"""
+    plain = create_engine(uri)
+    hooked = create_engine(uri)
+    event.listen(hooked, 'before_cursor_execute', metrics._before_cursor_execute)
+    event.listen(hooked, 'after_cursor_execute', metrics._after_cursor_execute)
+    metrics._local.request = [0.0, 0, 0.0, 0.0]
+
+    def first_statement(engine):
+        def call(i):
+            with engine.connect() as conn:
+                conn.exec_driver_sql('SELECT 1').scalar()
+        return best_of(call, count)
+
+    def next_statement(engine):
+        with engine.connect() as conn:
+            return best_of(lambda i: conn.exec_driver_sql('SELECT 1').scalar(), count)
+
+    try:
+        return (first_statement(hooked) - first_statement(plain), next_statement(hooked) - next_statement(plain))
+    finally:
+        metrics._local.request = None
+        plain.dispose()
+        hooked.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运行指标开销基准测试')
+    parser.add_argument('--requests', type=int, default=400, help='测量请求用时的请求数')
+    parser.add_argument('--budget', type=float, default=0.05, help='允许的请求用时增加比例')
+    args = parser.parse_args()
+
+    config = {'SQLALCHEMY_DATABASE_URI': DATABASE_URI, 'METRICS_DIR': METRICS_DIR}
+    enabled_app = create_app({**config, 'METRICS_ENABLED': True})
+    enabled = enabled_app.test_client()
+    disabled = create_app({**config, 'METRICS_ENABLED': False}).test_client()
+    urls = seed(enabled)
+
+    time_requests(disabled, urls, 50)  # 预热
+    request_time = time_requests(disabled, urls, args.requests)
+    connections, statements = count_per_request(enabled_app, enabled, urls, args.requests)
+    hooks = time_request_hooks(enabled_app, urls[0], 20000)
+    first_statement, next_statement = time_sql_events(DATABASE_URI, 5000)
+    added = hooks + connections * first_statement + max(statements - connections, 0) * next_statement
+    overhead = added / request_time
+
+    print(f'关闭指标：每个请求 {request_time * 1e6:.0f} µs（平均 {connections:.1f} 个连接、{statements:.1f} 条SQL）')
+    print(f'请求钩子：每个请求 {hooks * 1e6:.1f} µs')
+    print(f'SQL事件：每个连接的第一条语句 {first_statement * 1e6:.1f} µs，之后每条语句 {next_statement * 1e6:.1f} µs')
+    print(f'开启指标：每个请求增加约 {added * 1e6:.1f} µs（{overhead:.1%}）')
+    if overhead > args.budget:
+        print(f'❌ 开销超过预算 {args.budget:.0%}')
+        return 1
+    print(f'✅ 开销在预算 {args.budget:.0%} 以内')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+重复任务创建基准测试
+
+在临时数据库上通过 /api/tasks/batch 一次提交 100 个"每天"重复、为期一年的任务，分别测量：
+- 逐条创建（原实现：每个执行日期构造一个ORM Task 对象并 db.session.add，逐天 strftime）
+- 逐日写入模式（TASK_SERIES_MODE=materialize：按星期位掩码计算日期，executemany 分批插入）
+- 按需展开模式（默认：每个任务只写入一条 task_series 规则）
+输出耗时、写入的行数和执行的SQL语句数，另外单独测量日期展开本身的耗时。
+
+用法：python script/benchmark_recurrence.py [--tasks 100] [--days 365] [--repeat 3]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+# 使用临时数据库，避免影响 instance/homerecord.db
+tmp_dir = tempfile.mkdtemp(prefix='homerecord_recurrence_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp_dir, 'recurrence_bench.db')}"
+
+# 添加父目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from wsgi import app
+    from models import db, Task, TaskSeries
+    from recurrence import occurrence_days, weekday_mask, EVERY_DAY_MASK
+    from task_series import TASK_SERIES_MODE_ENV
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def legacy_create(user_id, tasks_data):
+    """原实现的写法：每个执行日期一个ORM对象，每个顶层任务flush一次"""
+    for task_data in tasks_data:
+        task = Task(user_id=user_id, status='未完成', actual_time=0, series_id=task_data['series_id'], **{
+            key: task_data[key] for key in ('name', 'category', 'points', 'repeat_setting', 'start_date', 'end_date')
+        })
+        db.session.add(task)
+        db.session.flush()
+        start = datetime.strptime(task_data['start_date'], '%Y-%m-%d')
+        end = datetime.strptime(task_data['end_date'], '%Y-%m-%d')
+        current_date = start
+        while current_date <= end:
+            if current_date.strftime('%Y-%m-%d') != task_data['start_date']:
+                db.session.add(Task(
+                    user_id=user_id, name=task_data['name'], category=task_data['category'],
+                    points=task_data['points'], actual_time=0, repeat_setting=task_data['repeat_setting'],
+                    start_date=current_date.strftime('%Y-%m-%d'), end_date=task_data['end_date'],
+                    status='未完成', series_id=task.series_id
+                ))
+            current_date += timedelta(days=1)
+    db.session.commit()
+
+
+def reset_tables():
+    with app.app_context():
+        Task.query.delete()
+        TaskSeries.query.delete()
+        db.session.commit()
+
+
+def table_rows():
+    with app.app_context():
+        return Task.query.count(), TaskSeries.query.count()
+
+
+def measure(label, engine, run):
+    counter = StatementCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run()
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+    tasks, series = table_rows()
+    print(f'{label:<12} 耗时 {elapsed * 1000:9.1f} ms  task行 {tasks:7d}  规则行 {series:4d}  SQL语句 {counter.count:6d}')
+    reset_tables()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重复任务创建基准测试')
+    parser.add_argument('--tasks', type=int, default=100, help='每批任务数')
+    parser.add_argument('--days', type=int, default=365, help='每个任务的重复天数')
+    parser.add_argument('--repeat', type=int, default=3, help='每种方式重复次数')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        user = client.post('/api/register', json={'username': 'benchuser', 'password': 'Benchuser123'}).get_json()['user']
+    start = date.today()
+    end = start + timedelta(days=args.days - 1)
+    tasks_data = [{
+        'name': f'每日任务{i}', 'category': '语文', 'points': 1, 'repeat_setting': '每天',
+        'start_date': start.strftime('%Y-%m-%d'), 'end_date': end.strftime('%Y-%m-%d'), 'series_id': f'bench-{i}'
+    } for i in range(args.tasks)]
+    with app.app_context():
+        engine = db.engine
+
+    # 日期展开本身
+    loops = 200
+    started = time.perf_counter()
+    for _ in range(loops):
+        current, days = start, []
+        while current <= end:
+            days.append(current.strftime('%Y-%m-%d'))
+            current += timedelta(days=1)
+    loop_ms = (time.perf_counter() - started) * 1000 / loops
+    started = time.perf_counter()
+    for _ in range(loops):
+        days = [date.fromordinal(day).isoformat() for day in occurrence_days(start, end, EVERY_DAY_MASK)]
+    mask_ms = (time.perf_counter() - started) * 1000 / loops
+    started = time.perf_counter()
+    for _ in range(loops):
+        occurrence_days(start, end, weekday_mask('每个工作日,每周六'))
+    workday_ms = (time.perf_counter() - started) * 1000 / loops
+    print(f'展开{args.days}天：逐天循环 {loop_ms:.3f} ms，位掩码计算 {mask_ms:.3f} ms（工作日+周六 {workday_ms:.3f} ms）')
+
+    print(f'批量创建 {args.tasks} 个为期 {args.days} 天的每日任务：')
+    results = {'逐条创建': [], '逐日写入': [], '按需展开': []}
+    for _ in range(args.repeat):
+        def run_legacy():
+            with app.app_context():
+                legacy_create(user['id'], tasks_data)
+        results['逐条创建'].append(measure('逐条创建', engine, run_legacy))
+
+        for label, mode in (('逐日写入', 'materialize'), ('按需展开', 'lazy')):
+            os.environ[TASK_SERIES_MODE_ENV] = mode
+            response = {}
+
+            def run_batch():
+                response['data'] = client.post('/api/tasks/batch', json={'user_id': user['id'], 'tasks': tasks_data}).get_json()
+            results[label].append(measure(label, engine, run_batch))
+            if not response['data'].get('success'):
+                print(f'{label} 请求失败: {response["data"]}')
+                return 1
+        os.environ.pop(TASK_SERIES_MODE_ENV, None)
+
+    baseline = min(results['逐条创建'])
+    print('最好成绩：')
+    for label, timings in results.items():
+        best = min(timings)
+        print(f'  {label:<12} {best * 1000:9.1f} ms  （相对逐条创建 {baseline / best:6.1f}x）')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
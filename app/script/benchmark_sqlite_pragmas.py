@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+SQLite调优参数基准测试
+
+在临时数据库上分别以"默认参数"和"调优参数(sqlite_tuning)"运行相同的并发读写负载，
+模拟多个gunicorn worker同时访问：写线程插入任务并更新用户金币，读线程按日期查询任务。
+输出两种配置下的读/写吞吐量以及 "database is locked" 错误次数。
+
+用法：python script/benchmark_sqlite_pragmas.py [--seconds 5] [--readers 4] [--writers 2]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# 添加父目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from models import db
+from sqlite_tuning import load_sqlite_pragmas, register_sqlite_pragmas
+
+SEED_DAYS = 60
+SEED_TASKS_PER_DAY = 20
+
+
+def day_str(offset):
+    return (date.today() - timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+def prepare_database(path, pragmas):
+    engine = create_engine(f'sqlite:///{path}')
+    register_sqlite_pragmas(engine, pragmas)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO user (id, username, password, total_gold, total_tomato) VALUES (1, 'bench', 'x', 0, 0)"))
+        rows = [
+            {'user_id': 1, 'name': f'任务{i}', 'category': '语文', 'start_date': day_str(d), 'status': '未完成'}
+            for d in range(SEED_DAYS) for i in range(SEED_TASKS_PER_DAY)
+        ]
+        conn.execute(text(
+            "INSERT INTO task (user_id, name, category, start_date, status, points, planned_time, actual_time) "
+            "VALUES (:user_id, :name, :category, :start_date, :status, 1, 10, 0)"
+        ), rows)
+    return engine
+
+
+def run_workload(engine, seconds, readers, writers):
+    stop_at = time.perf_counter() + seconds
+    counters = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+
+    def reader():
+        local_reads = local_locked = 0
+        while time.perf_counter() < stop_at:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(
+                        text("SELECT * FROM task WHERE user_id = 1 AND start_date = :d"),
+                        {'d': day_str(random.randrange(SEED_DAYS))}
+                    ).fetchall()
+                local_reads += 1
+            except OperationalError:
+                local_locked += 1
+        with lock:
+            counters['reads'] += local_reads
+            counters['locked'] += local_locked
+
+    def writer():
+        local_writes = local_locked = 0
+        while time.perf_counter() < stop_at:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        "INSERT INTO task (user_id, name, category, start_date, status, points, planned_time, actual_time) "
+                        "VALUES (1, '基准任务', '数学', :d, '已完成', 1, 10, 5)"
+                    ), {'d': day_str(0)})
+                    conn.execute(text("UPDATE user SET total_gold = total_gold + 1 WHERE id = 1"))
+                local_writes += 1
+            except OperationalError:
+                local_locked += 1
+        with lock:
+            counters['writes'] += local_writes
+            counters['locked'] += local_locked
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'reads_per_sec': counters['reads'] / elapsed,
+        'writes_per_sec': counters['writes'] / elapsed,
+        'locked_errors': counters['locked'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite调优参数基准测试')
+    parser.add_argument('--seconds', type=float, default=5.0, help='每种配置的运行时长（秒）')
+    parser.add_argument('--readers', type=int, default=4, help='读线程数')
+    parser.add_argument('--writers', type=int, default=2, help='写线程数')
+    args = parser.parse_args()
+
+    profiles = [
+        ('默认参数', {}),
+        ('调优参数', load_sqlite_pragmas({})),
+    ]
+    tmp_dir = tempfile.mkdtemp(prefix='homerecord_bench_')
+    print(f'负载: {args.readers} 个读线程, {args.writers} 个写线程, 每种配置 {args.seconds} 秒')
+    results = []
+    for label, pragmas in profiles:
+        path = os.path.join(tmp_dir, f'bench_{len(results)}.db')
+        engine = prepare_database(path, pragmas)
+        result = run_workload(engine, args.seconds, args.readers, args.writers)
+        engine.dispose()
+        results.append((label, result))
+        print(f"{label}: 读 {result['reads_per_sec']:.0f} 次/秒, 写 {result['writes_per_sec']:.0f} 次/秒, "
+              f"锁冲突错误 {result['locked_errors']} 次  {pragmas or ''}")
+
+    (_, base), (_, tuned) = results
+    if base['reads_per_sec'] and base['writes_per_sec']:
+        print(f"读吞吐提升 {tuned['reads_per_sec'] / base['reads_per_sec']:.2f}x, "
+              f"写吞吐提升 {tuned['writes_per_sec'] / base['writes_per_sec']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
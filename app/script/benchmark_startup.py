@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+应用启动时间基准测试
+
+按 gunicorn 的两种启动方式分别测量 1、2、8 个worker从启动到全部能处理请求的时间：
+- 独立启动（不使用 preload_app）：每个worker进程各自导入 app，各自执行 create_app；
+- 预加载（preload_app）：主进程执行一次 create_app，再 fork 出各worker。
+每个worker启动后处理一次查询数据库的请求，确认连接可用。使用临时数据库，先启动一次完成建表和内置数据，
+测量的是已有数据库的重启时间。每种情况重复多次取中位数。需要 os.fork，只能在 Linux/macOS 上运行。
+
+用法：python script/benchmark_startup.py [--workers 1,2,8] [--repeat 3]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_app():
+    sys.path.append(APP_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from wsgi import app
+    return app
+
+
+def first_request(app):
+    response = app.test_client().get('/api/categories?user_id=1')
+    if response.status_code != 200:
+        raise RuntimeError(f'请求失败: {response.status_code}')
+
+
+def run_worker():
+    """独立启动的worker：导入应用并处理第一个请求"""
+    first_request(import_app())
+
+
+def run_preload(workers):
+    """预加载：导入一次应用，fork 出的子进程各自处理第一个请求"""
+    app = import_app()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                first_request(app)
+            except Exception as e:
+                sys.stderr.write(f'worker 失败: {e}\n')
+                code = 1
+            os._exit(code)
+        pids.append(pid)
+    failed = sum(1 for pid in pids if os.waitpid(pid, 0)[1] != 0)
+    if failed:
+        raise RuntimeError(f'{failed} 个worker失败')
+
+
+def measure(mode, workers, env):
+    """在新进程中按 mode 启动 workers 个worker，返回全部就绪的用时（秒）"""
+    started = time.perf_counter()
+    if mode == 'preload':
+        commands = [[sys.executable, __file__, '--run-preload', str(workers)]]
+    else:
+        commands = [[sys.executable, __file__, '--run-worker']] * workers
+    processes = [subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL) for command in commands]
+    codes = [process.wait() for process in processes]
+    elapsed = time.perf_counter() - started
+    if any(codes):
+        raise RuntimeError(f'{mode} 模式启动失败')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='应用启动时间基准测试')
+    parser.add_argument('--workers', default='1,2,8', help='worker数量，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3, help='每种情况重复次数，取中位数')
+    parser.add_argument('--run-worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--run-preload', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_worker:
+        run_worker()
+        return 0
+    if args.run_preload is not None:
+        run_preload(args.run_preload)
+        return 0
+
+    worker_counts = [int(count) for count in args.workers.split(',') if count.strip()]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = dict(os.environ, SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+        # 先启动一次：建表、写入内置数据
+        measure('independent', 1, env)
+
+        print(f"{'worker数':>8} {'独立启动(秒)':>14} {'预加载(秒)':>12} {'加速比':>8}")
+        for workers in worker_counts:
+            independent = statistics.median(measure('independent', workers, env) for _ in range(args.repeat))
+            preload = statistics.median(measure('preload', workers, env) for _ in range(args.repeat))
+            print(f"{workers:>8} {independent:>14.3f} {preload:>12.3f} {independent / preload:>7.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+未完成任务迁移定时任务
+
+把开启了"自动迁移"设置的家庭（主账号）开始日期早于今天的未完成任务迁移到今天。
+每个家庭一个事务，同一天重复执行不会重复迁移，可以放心地在 cron 中多次调度，例如每天凌晨：
+    5 0 * * * cd /app/app && python script/carry_over_tasks.py
+也可以用 --every 常驻运行、每隔一段时间执行一次（docker-entrypoint.sh 在后台以这种方式启动，
+间隔由 CARRY_OVER_INTERVAL 环境变量设置，默认3600秒，设为0时不启动）。
+
+用法：python script/carry_over_tasks.py [--user-id 1] [--date 2024-01-01] [--every 3600]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+# 添加父目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wsgi import app
+from carry_over import carry_over_tasks, auto_carry_over_households
+from recurrence import parse_day
+
+
+def run_once(only_user_id, today):
+    """执行一轮迁移，返回失败的家庭数"""
+    failed = 0
+    with app.app_context():
+        user_ids = [only_user_id] if only_user_id else auto_carry_over_households()
+        print(f"[{datetime.now()}] 开始迁移未完成任务，共 {len(user_ids)} 个家庭")
+        for user_id in user_ids:
+            try:
+                result = carry_over_tasks(user_id, today)
+            except Exception as e:
+                failed += 1
+                print(f"[{datetime.now()}] 家庭 {user_id} 迁移失败: {e}")
+                continue
+            if result['already_done']:
+                print(f"[{datetime.now()}] 家庭 {result['user_id']} 今天（{result['date']}）已迁移过，跳过")
+            else:
+                print(f"[{datetime.now()}] 家庭 {result['user_id']} 迁移 {result['moved']} 个任务到 {result['date']}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把过期的未完成任务迁移到今天')
+    parser.add_argument('--user-id', type=int, default=None, help='只迁移指定用户所在家庭（忽略自动迁移设置）')
+    parser.add_argument('--date', default=None, help='迁移到的日期 YYYY-MM-DD，默认今天')
+    parser.add_argument('--every', type=int, default=0, help='常驻运行，每隔多少秒执行一次（迁移到执行当天），默认只执行一次')
+    args = parser.parse_args()
+
+    today = parse_day(args.date) if args.date else None
+    if args.date and today is None:
+        print(f"日期格式错误: {args.date}")
+        return 1
+    if args.every and args.date:
+        print("--every 总是迁移到执行当天，不能与 --date 同时使用")
+        return 1
+
+    if not args.every:
+        return 1 if run_once(args.user_id, today) else 0
+    while True:
+        try:
+            run_once(args.user_id, None)
+        except Exception as e:
+            # 数据库暂时不可用等错误不退出，下一轮重试
+            print(f"[{datetime.now()}] 迁移未完成任务失败: {e}")
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+查询计划回归检查脚本
+
+在临时数据库上调用热点接口，捕获每个接口执行的SQL语句，
+再用 EXPLAIN QUERY PLAN 检查它们是否都走索引，不允许对热点表做全表扫描（SCAN）。
+
+用法：python script/check_query_plans.py
+全部通过时退出码为0；任一接口请求失败或热点表出现 SCAN 时打印违规语句并以1退出，
+CI 在构建镜像前执行（.github/workflows/docker.yml）。
+"""
+
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# 使用临时数据库，避免影响 instance/homerecord.db
+tmp_dir = tempfile.mkdtemp(prefix='homerecord_plan_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp_dir, 'plan_check.db')}"
+
+# 添加父目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from wsgi import app
+    from models import db
+
+# 需要保证走索引的热点表；荣誉、心愿、分类等内置目录表数据量很小，不做要求
+HOT_TABLES = {'task', 'operation_log', 'task_remark', 'user', 'user_honor', 'daily_stats', 'gold_ledger', 'gold_snapshot', 'wish_exchange', 'task_series', 'task_series_exception', 'carry_over_run'}
+# SQLite 3.36 之前的格式为 "SCAN TABLE task"，之后为 "SCAN task"
+SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+captured = []
+
+
+def capture_statement(conn, cursor, statement, parameters, context, executemany):
+    if not executemany and not statement.lstrip().upper().startswith(('PRAGMA', 'EXPLAIN')):
+        captured.append((statement, parameters))
+
+
+def explain(engine, statement, parameters):
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        return [row[3] for row in cur.fetchall()]
+    finally:
+        raw.close()
+
+
+def seed(client):
+    """准备主账号、子账号、任务、备注、兑换记录等数据"""
+    today = datetime.now().date()
+    user = client.post('/api/register', json={'username': 'planuser', 'password': 'Planuser123'}).get_json()['user']
+    client.post(f"/api/users/{user['id']}/subaccounts", json={
+        'username': 'plansub01', 'password': 'Plansub123', 'password_confirm': 'Plansub123', 'nickname': '子账号'
+    })
+    end_date = (today + timedelta(days=14)).strftime('%Y-%m-%d')
+    for offset in range(-10, 1):
+        day = (today + timedelta(days=offset)).strftime('%Y-%m-%d')
+        client.post('/api/tasks', json={
+            'user_id': user['id'], 'name': f'任务{offset}', 'category': '语文', 'start_date': day, 'points': 2
+        })
+    client.post('/api/tasks', json={
+        'user_id': user['id'], 'name': '每日阅读', 'category': '英语', 'start_date': today.strftime('%Y-%m-%d'),
+        'end_date': end_date, 'repeat_setting': '每天', 'series_id': 'plan-series'
+    })
+    return user, today
+
+
+def main():
+    client = app.test_client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        user, today = seed(client)
+        task_id = client.get(f"/api/tasks?user_id={user['id']}").get_json()[0]['id']
+        client.post(f'/api/tasks/{task_id}/remarks', json={'user_id': user['id'], 'content_text': '备注'})
+        client.put(f'/api/tasks/{task_id}', json={'status': '已完成', 'actual_time': 20})
+        client.post('/api/wishes/exchange/1', json={'user_id': user['id'], 'quantity': 1})
+        category_ids = [
+            client.post('/api/categories', json={'user_id': user['id'], 'name': name}).get_json()['category']['id']
+            for name in ('书法', '围棋')
+        ]
+
+    day = today.strftime('%Y-%m-%d')
+    # 前端编辑任务时会把读取到的任务数据（含 category_color 等只读字段）原样回传
+    task_json = next(task for task in client.get(f"/api/tasks?user_id={user['id']}").get_json() if task['id'] == task_id)
+    endpoints = [
+        ('GET', f"/api/tasks?user_id={user['id']}&date={day}", None),
+        ('GET', f"/api/tasks?user_id={user['id']}&date={day}&category=语文", None),
+        ('GET', f"/api/tasks/unfinished?user_id={user['id']}", None),
+        ('GET', f"/api/tasks/{task_id}/remarks", None),
+        ('PUT', f"/api/tasks/{task_id}", task_json),
+        ('GET', f"/api/statistics?user_id={user['id']}&date={day}", None),
+        ('GET', f"/api/statistics?user_id={user['id']}&date={day}&period=month", None),
+        ('POST', '/api/honors/check', {'user_id': user['id']}),
+        ('GET', f"/api/users/{user['id']}/streaks", None),
+        ('GET', f"/api/logs?user_id={user['id']}", None),
+        ('GET', f"/api/exchange-history?user_id={user['id']}", None),
+        ('GET', f"/api/logs?user_id={user['id']}&cursor={today.isoformat()}T23:59:59,100000&limit=5", None),
+        ('GET', f"/api/exchange-history?user_id={user['id']}&cursor={today.isoformat()}T23:59:59,100000&with_total=1", None),
+        ('GET', f"/api/gold/history?user_id={user['id']}&cursor=1000", None),
+        ('GET', f"/api/gold/balance-at?user_id={user['id']}&time={day}", None),
+        ('POST', '/api/tasks/bulk', {'task_ids': [task_id], 'operation': 'uncomplete'}),
+        ('POST', '/api/tasks/bulk', {'task_ids': [task_id], 'operation': 'move', 'date': day}),
+        ('POST', '/api/tasks/clone-day', {'user_id': user['id'], 'source_date': day, 'target_dates': [(today + timedelta(days=7)).isoformat()]}),
+        ('PUT', '/api/categories/reorder', {'user_id': user['id'], 'orders': [
+            {'id': category_id, 'sort_order': order} for order, category_id in enumerate(category_ids, 1)
+        ]}),
+        ('POST', '/api/tasks/carry-over', {'user_id': user['id'], 'date': (today + timedelta(days=1)).isoformat()}),
+        ('PATCH', f"/api/tasks/series/plan-series?from_date={day}", {'points': 3, 'category': '语文'}),
+        ('DELETE', f"/api/tasks/series/plan-series?from_date={day}", None),
+    ]
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture_statement)
+    failures = []
+    checked = 0
+    try:
+        for method, url, body in endpoints:
+            captured.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = client.open(url, method=method, json=body)
+            result = response.get_json(silent=True)
+            if response.status_code >= 400 or (isinstance(result, dict) and result.get('success') is False):
+                failures.append((url, f'{method} 请求失败: HTTP {response.status_code} {result}', []))
+                continue
+            for statement, parameters in list(captured):
+                plan = explain(engine, statement, parameters)
+                checked += 1
+                scans = [line for line in plan if SCAN_PATTERN.match(line)
+                         and SCAN_PATTERN.match(line).group(1) in HOT_TABLES]
+                if scans:
+                    failures.append((url, ' '.join(statement.split()), scans))
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture_statement)
+
+    print(f'共检查 {len(endpoints)} 个接口、{checked} 条SQL语句')
+    if failures:
+        print('以下接口请求失败或语句存在全表扫描：')
+        for url, statement, scans in failures:
+            print(f'- [{url}] {statement}')
+            for line in scans:
+                print(f'    {line}')
+        return 1
+    print('✅ 所有热点查询均使用索引')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
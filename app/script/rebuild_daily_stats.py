@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+重建日统计脚本
+
+根据任务表重新生成 daily_stats（按 用户+日期+学科 汇总），并重建打卡位图。
+用于修复统计数据，或在直接修改过数据库后重新同步。
+
+用法：python script/rebuild_daily_stats.py [--user-id 1]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# 添加父目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wsgi import app
+from models import db, User
+from daily_stats import rebuild_daily_stats
+from activity_bitmap import rebuild_activity_bitmap
+
+
+def main():
+    parser = argparse.ArgumentParser(description='根据任务表重建日统计')
+    parser.add_argument('--user-id', type=int, default=None, help='只重建指定用户，默认全部用户')
+    args = parser.parse_args()
+
+    with app.app_context():
+        try:
+            print(f"[{datetime.now()}] 开始重建日统计...")
+            rows = rebuild_daily_stats(args.user_id)
+            user_ids = [args.user_id] if args.user_id else [user_id for (user_id,) in db.session.query(User.id).all()]
+            for user_id in user_ids:
+                rebuild_activity_bitmap(user_id)
+            db.session.commit()
+            print(f"[{datetime.now()}] 重建完成：写入 {rows} 行日统计，重建 {len(user_ids)} 个用户的打卡位图")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[{datetime.now()}] 重建日统计失败: {e}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
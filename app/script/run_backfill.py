@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据回填脚本
+
+按主键区间分批执行 backfill.BACKFILLS 中尚未完成的回填任务，每批提交一次并记录进度，
+中断后再次执行会从上次的位置继续；已完成的任务直接跳过。
+批之间会暂停一段时间，可以在服务运行时执行（docker-entrypoint.sh 在后台执行一次）。
+
+用法：python script/run_backfill.py [名称 ...] [--batch-size 500] [--pause 0.1] [--restart] [--status]
+"""
+
+import argparse
+import os
+import sys
+
+# 添加父目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from backfill import BACKFILLS, DEFAULT_BATCH_SIZE, DEFAULT_PAUSE, run_backfill, pending_backfills, load_checkpoints
+from run_migration import database_uri
+from sqlite_tuning import register_sqlite_pragmas
+
+
+def print_status(engine):
+    with engine.connect() as conn:
+        checkpoints = load_checkpoints(conn)
+    for name, description, table, _ in BACKFILLS:
+        checkpoint = checkpoints.get(name)
+        if checkpoint is None:
+            state = '未开始'
+        elif checkpoint.finished_at is not None:
+            state = f'已完成 {checkpoint.finished_at}，修改 {checkpoint.rows_changed} 行'
+        else:
+            state = f'进行中，已处理到 {table}.id {checkpoint.last_id}，修改 {checkpoint.rows_changed} 行'
+        print(f"  {name}（{description}）：{state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分批执行数据回填')
+    parser.add_argument('names', nargs='*', help='回填任务名称，默认执行全部未完成的任务')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批处理的行数')
+    parser.add_argument('--pause', type=float, default=DEFAULT_PAUSE, help='每批之间暂停的秒数')
+    parser.add_argument('--restart', action='store_true', help='忽略已记录的进度，从头执行指定的任务')
+    parser.add_argument('--status', action='store_true', help='只列出各回填任务的进度')
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error('--batch-size 必须大于0')
+    unknown = set(args.names) - {name for name, _, _, _ in BACKFILLS}
+    if unknown:
+        parser.error(f"未知的回填任务: {', '.join(sorted(unknown))}")
+
+    engine = create_engine(database_uri())
+    register_sqlite_pragmas(engine)
+    try:
+        if args.status:
+            print_status(engine)
+            return 0
+        names = args.names or pending_backfills(engine)
+        for name in names:
+            try:
+                run_backfill(engine, name, batch_size=args.batch_size, pause=args.pause, restart=args.restart)
+            except Exception as e:
+                print(f"[{name}] 回填失败，下次执行时从上一批继续: {e}")
+                return 1
+    finally:
+        engine.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
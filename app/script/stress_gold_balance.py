@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+金币余额并发压力测试
+
+在临时数据库上启动多个进程（模拟多个gunicorn worker，以及主账号和子账号两台设备），
+同时完成任务、兑换心愿、增减金币，结束后核对：
+  最终余额 == 初始余额 + 所有成功操作的金币变化之和，兑换次数与成功兑换一致；
+  从期初余额开始按顺序累加每条金币流水，每一步都等于该流水记录的变更后余额且不为负数（余额从未变为负数），
+  最后等于当前余额。
+
+用法：python script/stress_gold_balance.py [--workers 4] [--rounds 60]
+核对通过时退出码为0，否则打印不一致的项目并以1退出；CI 在构建镜像前执行（.github/workflows/docker.yml）。
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime
+
+# 使用临时数据库，避免影响 instance/homerecord.db
+tmp_dir = tempfile.mkdtemp(prefix='homerecord_gold_')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp_dir, 'gold_stress.db')}"
+
+# 添加父目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from wsgi import app
+    from models import db, User, Wish, GoldLedger, GoldSnapshot
+
+INITIAL_GOLD = 50
+TASK_POINTS = 3
+
+
+def setup(workers, rounds):
+    """创建主账号、子账号，以及每个worker各自要完成的任务"""
+    client = app.test_client()
+    today = datetime.now().strftime('%Y-%m-%d')
+    with contextlib.redirect_stdout(io.StringIO()):
+        user = client.post('/api/register', json={'username': 'golduser', 'password': 'Golduser123'}).get_json()['user']
+        client.post(f"/api/users/{user['id']}/subaccounts", json={
+            'username': 'goldsub01', 'password': 'Goldsub123', 'password_confirm': 'Goldsub123', 'nickname': '子账号'
+        })
+        client.put(f"/api/users/{user['id']}/gold", json={'gold': INITIAL_GOLD, 'reason': '初始金币'})
+        task_ids = []
+        for worker in range(workers):
+            ids = []
+            for i in range(rounds // 4 + 1):
+                result = client.post('/api/tasks', json={
+                    'user_id': user['id'], 'name': f'压测任务{worker}-{i}', 'category': '数学',
+                    'start_date': today, 'points': TASK_POINTS
+                }).get_json()
+                ids.append(result['task_id'])
+            task_ids.append(ids)
+    with app.app_context():
+        subaccount = User.query.filter_by(parent_id=user['id']).first()
+        wish = Wish.query.filter_by(is_builtin=True).order_by(Wish.id).first()
+        exchange_count = wish.exchange_count or 0
+        db.engine.dispose()
+    return user['id'], subaccount.id, wish.id, wish.cost, exchange_count, task_ids
+
+
+def worker_main(worker, rounds, user_id, subaccount_id, wish_id, task_ids, results):
+    random.seed(worker)
+    client = app.test_client()
+    # 偶数worker模拟主账号设备，奇数worker模拟子账号设备
+    operator_id = user_id if worker % 2 == 0 else subaccount_id
+    delta = 0
+    exchanged = 0
+    failed = 0
+    insufficient = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            action = random.choice(['complete', 'exchange', 'exchange', 'update'])
+            if action == 'complete' and task_ids:
+                task_id = task_ids.pop()
+                response = client.put(f'/api/tasks/{task_id}?current_user_id={operator_id}',
+                                      json={'status': '已完成', 'actual_time': 5})
+                if response.status_code == 200 and response.get_json().get('success'):
+                    delta += TASK_POINTS
+                else:
+                    failed += 1
+            elif action == 'exchange':
+                # 兑换数量较大，余额会频繁不足，用来检验并发兑换不会透支
+                response = client.post(f'/api/wishes/exchange/{wish_id}',
+                                       json={'user_id': user_id, 'quantity': random.randint(1, 8)})
+                body = response.get_json() or {}
+                if response.status_code == 200 and body.get('success'):
+                    delta -= body['total_cost']
+                    exchanged += body['quantity']
+                    if body['remaining_gold'] < 0:
+                        failed += 1
+                elif body.get('message') == '金币不足':
+                    insufficient += 1
+                else:
+                    failed += 1
+            elif action == 'update':
+                amount = random.choice([-4, -2, 2, 5])
+                response = client.post('/api/gold/update', json={'user_id': user_id, 'amount': amount, 'reason': '压测'})
+                body = response.get_json() or {}
+                if response.status_code == 200 and body.get('success'):
+                    delta += amount
+                elif body.get('message') == '金币不足':
+                    insufficient += 1
+                else:
+                    failed += 1
+    results.put((delta, exchanged, insufficient, failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='金币余额并发压力测试')
+    parser.add_argument('--workers', type=int, default=4, help='并发进程数')
+    parser.add_argument('--rounds', type=int, default=60, help='每个进程执行的操作次数')
+    args = parser.parse_args()
+
+    user_id, subaccount_id, wish_id, wish_cost, exchange_count, task_ids = setup(args.workers, args.rounds)
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker_main, args=(i, args.rounds, user_id, subaccount_id, wish_id, task_ids[i], results))
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    expected = INITIAL_GOLD + sum(outcome[0] for outcome in outcomes)
+    exchanged = sum(outcome[1] for outcome in outcomes)
+    insufficient = sum(outcome[2] for outcome in outcomes)
+    failed = sum(outcome[3] for outcome in outcomes)
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        wish = db.session.get(Wish, wish_id)
+        actual = user.total_gold
+        actual_exchanges = (wish.exchange_count or 0) - exchange_count
+        # 金币流水：SQLite 写入串行执行，流水ID顺序即变更顺序，从期初余额开始逐条累加核对
+        opening = GoldSnapshot.query.filter_by(user_id=user_id, ledger_id=0).first()
+        entries = GoldLedger.query.filter_by(user_id=user_id).order_by(GoldLedger.id).all()
+        ledger_errors = [] if opening is not None else ['没有期初余额快照']
+        balance = opening.balance if opening is not None else 0
+        for entry in entries:
+            balance += entry.delta
+            if entry.balance_after != balance:
+                ledger_errors.append(f'流水{entry.id}：累加余额 {balance}，记录的变更后余额 {entry.balance_after}')
+            if entry.balance_after < 0:
+                ledger_errors.append(f'流水{entry.id}：余额变为负数 {entry.balance_after}')
+        if balance != actual:
+            ledger_errors.append(f'流水累加余额 {balance}，当前余额 {actual}')
+
+    print(f'{args.workers} 个进程 x {args.rounds} 次操作，共兑换 {exchanged} 份（每份 {wish_cost} 金币），'
+          f'余额不足被拒绝 {insufficient} 次，异常 {failed} 次')
+    print(f'期望余额 {expected}，实际余额 {actual}，兑换次数增加 {actual_exchanges}')
+    print(f"金币流水 {len(entries)} 条，{'逐条与余额一致且从未为负数' if not ledger_errors else '与余额不一致'}")
+    for error in ledger_errors[:20]:
+        print(f'  {error}')
+    ok = failed == 0 and actual == expected and actual >= 0 and actual_exchanges == exchanged and not ledger_errors
+    print('✅ 金币余额准确' if ok else '❌ 金币余额不一致')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
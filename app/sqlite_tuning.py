@@ -0,0 +1,108 @@
+import logging
+import os
+from contextlib import contextmanager
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# SQLite生产环境调优参数
+# 多个gunicorn worker共用同一个数据库文件，WAL模式下读写互不阻塞，
+# busy_timeout让写入在锁冲突时等待而不是立即报 "database is locked"
+SQLITE_PRAGMA_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',      # WAL模式下NORMAL即可保证数据库一致性
+    'mmap_size': 268435456,       # 256MB内存映射读
+    'cache_size': -20000,         # 负数表示KB，约20MB页缓存
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,         # 毫秒
+}
+
+# PRAGMA 语句不能使用绑定参数，只能拼接到SQL中：参数名只允许上面列出的几个，
+# 取值为整数的参数转换为 int，其余参数只允许下面列出的关键字
+SQLITE_PRAGMA_KEYWORDS = {
+    'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+}
+
+# 每个参数都可以通过 SQLITE_<参数名大写> 环境变量覆盖，例如 SQLITE_SYNCHRONOUS=FULL
+# SQLITE_TUNING=0 时关闭整套调优，恢复SQLite默认行为
+SQLITE_TUNING_ENV = 'SQLITE_TUNING'
+
+
+def normalize_sqlite_pragma(name, value):
+    """校验并转换一个调优参数，返回可以直接拼接到 PRAGMA 语句中的值；参数名或取值不允许时抛出 ValueError"""
+    if name not in SQLITE_PRAGMA_DEFAULTS:
+        raise ValueError(f'不支持的SQLite参数: {name}')
+    if name in SQLITE_PRAGMA_KEYWORDS:
+        keyword = str(value).strip().upper()
+        if keyword not in SQLITE_PRAGMA_KEYWORDS[name]:
+            raise ValueError(f'SQLite参数 {name} 的取值不允许: {value}')
+        return keyword
+    try:
+        if isinstance(value, bool):
+            raise TypeError(value)
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'SQLite参数 {name} 的取值必须为整数: {value}') from None
+
+
+def load_sqlite_pragmas(environ=None):
+    """读取调优参数，返回 {pragma: value}；关闭调优时返回空字典"""
+    environ = os.environ if environ is None else environ
+    if str(environ.get(SQLITE_TUNING_ENV, '1')).strip().lower() in ('0', 'false', 'off', 'no'):
+        return {}
+
+    pragmas = {}
+    for name, default in SQLITE_PRAGMA_DEFAULTS.items():
+        value = environ.get(f'SQLITE_{name.upper()}')
+        if value is None or str(value).strip() == '':
+            pragmas[name] = default
+            continue
+        try:
+            pragmas[name] = normalize_sqlite_pragma(name, value)
+        except ValueError:
+            logger.warning('忽略无效的环境变量 SQLITE_%s=%r，使用默认值 %s', name.upper(), value, default)
+            pragmas[name] = default
+    return pragmas
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={normalize_sqlite_pragma(name, value)}')
+    finally:
+        cursor.close()
+
+
+def register_sqlite_pragmas(engine, pragmas=None):
+    """为engine注册connect事件，每个新建的SQLite连接都会应用调优参数"""
+    if engine.dialect.name != 'sqlite':
+        return {}
+    if pragmas is None:
+        pragmas = load_sqlite_pragmas()
+    else:
+        # 调用方传入的参数在注册时就校验，不等到建立连接时才报错
+        pragmas = {name: normalize_sqlite_pragma(name, value) for name, value in pragmas.items()}
+    if not pragmas:
+        return pragmas
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return pragmas
+
+
+@contextmanager
+def write_lock(engine):
+    """
+    取得数据库写锁的连接，退出时提交（出错时回滚）。SQLite 下执行 BEGIN IMMEDIATE，
+    多个进程（例如同时启动的gunicorn worker）依次执行，等待时间受 busy_timeout 限制。
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        yield conn
+        conn.commit()
@@ -285,6 +285,68 @@ const taskAPI = {
         return await response.json();
     },
 
+    // 批量编辑任务系列（可选从指定日期开始），changes 为要修改的字段
+    updateTaskSeries: async (seriesId, changes, fromDate = null, currentUserId = null) => {
+        const params = new URLSearchParams();
+        if (fromDate) params.append('from_date', fromDate);
+        if (currentUserId) params.append('current_user_id', currentUserId);
+        const query = params.toString();
+        const url = `${API_BASE_URL}/tasks/series/${seriesId}${query ? `?${query}` : ''}`;
+
+        const response = await fetch(url, {
+            method: 'PATCH',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(changes)
+        });
+        return await response.json();
+    },
+
+    // 批量修改任务：operation 为 complete / uncomplete / delete / move / recategorize，
+    // options 可包含 date（move）、category（recategorize）
+    bulkUpdateTasks: async (taskIds, operation, options = {}, currentUserId = null) => {
+        const response = await fetch(`${API_BASE_URL}/tasks/bulk`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ task_ids: taskIds, operation, ...options, current_user_id: currentUserId })
+        });
+        return await response.json();
+    },
+
+    // 复制某一天的任务计划：targets 为目标日期数组，或 { start, end } 日期范围
+    cloneDay: async (userId, sourceDate, targets, category = null) => {
+        const body = { user_id: userId, source_date: sourceDate, category };
+        if (Array.isArray(targets)) {
+            body.target_dates = targets;
+        } else {
+            body.target_start = targets.start;
+            body.target_end = targets.end;
+        }
+        const response = await fetch(`${API_BASE_URL}/tasks/clone-day`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(body)
+        });
+        return await response.json();
+    },
+
+    // 把过期的未完成任务迁移到今天（每个家庭每天执行一次，force 为 true 时强制再执行）
+    carryOver: async (userId, date = null, force = false) => {
+        const response = await fetch(`${API_BASE_URL}/tasks/carry-over`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ user_id: userId, date, force })
+        });
+        return await response.json();
+    },
+
     // 删除任务系列（可选从指定日期开始）
     deleteTaskSeries: async (seriesId, fromDate = null) => {
         let url = `${API_BASE_URL}/tasks/series/${seriesId}`;
@@ -450,46 +512,16 @@ const categoryAPI = {
         return await response.json();
     },
 
-    // 批量更新分类排序
-    reorderCategories: async (orders) => {
-        // 优先尝试批量更新端点
-        try {
-            const response = await fetch(`${API_BASE_URL}/categories/reorder`, {
-                method: 'PUT',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ orders })
-            });
-
-            // 如果服务端返回有效JSON则直接使用
-            const contentType = response.headers.get('content-type') || '';
-            if (response.ok && contentType.includes('application/json')) {
-                return await response.json();
-            }
-        } catch (e) {
-            // 忽略批量端点错误，走降级路径
-        }
-
-        // 降级：逐个调用更新分类接口，确保在旧版本后端也能保存排序
-        let updated = 0;
-        for (const item of orders) {
-            try {
-                const resp = await fetch(`${API_BASE_URL}/categories/${item.id}`, {
-                    method: 'PUT',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({ sort_order: item.sort_order })
-                });
-                if (resp.ok) {
-                    updated += 1;
-                }
-            } catch (err) {
-                // 单项失败不影响其他项
-            }
-        }
-        return { success: true, updated };
+    // 批量更新分类排序（一次请求完成，返回调整后的分类顺序）
+    reorderCategories: async (orders, userId) => {
+        const response = await fetch(`${API_BASE_URL}/categories/reorder`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ user_id: userId, orders })
+        });
+        return await response.json();
     }
 };
 
@@ -435,14 +435,17 @@ async function loadUserSettingsFromBackend() {
         const tomatoCheckbox = document.getElementById('fixed-tomato-page');
         if (tomatoCheckbox) tomatoCheckbox.checked = appState.fixedTomatoPage;
 
-        // 同步任务自动排序（保留本地 autoMigrate）
+        // 同步任务自动排序和自动迁移
         appState.taskSettings = {
             ...appState.taskSettings,
-            autoSort: !!s.task_auto_sort
+            autoSort: !!s.task_auto_sort,
+            autoMigrate: !!s.task_auto_migrate
         };
         try { localStorage.setItem('taskSettings', JSON.stringify(appState.taskSettings)); } catch (_) {}
         const sortCheckbox = document.getElementById('auto-sort-tasks');
         if (sortCheckbox) sortCheckbox.checked = appState.taskSettings.autoSort;
+        const migrateCheckbox = document.getElementById('auto-migrate-tasks');
+        if (migrateCheckbox) migrateCheckbox.checked = appState.taskSettings.autoMigrate;
 
         // 同步朗读开关
         appState.ttsEnabled = s.tts_enabled !== false;
@@ -544,13 +547,16 @@ async function saveTaskSettings() {
         try {
             localStorage.setItem('taskSettings', JSON.stringify(appState.taskSettings));
             domUtils.showToast('设置已保存');
-            // 同步自动排序设置到后端
+            // 同步自动排序、自动迁移设置到后端（定时迁移任务按后端设置执行）
             try {
                 if (appState.currentUser && appState.currentUser.id) {
-                    await api.userSettingsAPI.update(appState.currentUser.id, { task_auto_sort: appState.taskSettings.autoSort });
+                    await api.userSettingsAPI.update(appState.currentUser.id, {
+                        task_auto_sort: appState.taskSettings.autoSort,
+                        task_auto_migrate: appState.taskSettings.autoMigrate
+                    });
                 }
             } catch (e) {
-                console.warn('后端更新任务排序设置失败:', e);
+                console.warn('后端更新任务设置失败:', e);
             }
             
             // 如果启用了自动迁移，立即执行一次迁移
@@ -570,113 +576,28 @@ async function saveTaskSettings() {
     }
 }
 
-// 迁移未完成任务
-async function migrateUnfinishedTasks() {
+// 迁移未完成任务：由后端在一个事务中把过期的未完成任务迁移到今天，
+// 每个家庭每天只执行一次（多设备、定时任务重复调用直接返回），force 为 true 时当天再执行一次
+async function migrateUnfinishedTasks(force = false) {
     if (!appState.currentUser) {
         console.log('用户未登录，跳过任务迁移');
         return;
     }
     
     try {
-        console.log('开始迁移未完成任务...');
-        
-        // 获取今天的日期字符串
-        const today = new Date();
-        const todayStr = today.toISOString().split('T')[0];
-        
-        // 记录上一次迁移的日期，避免重复迁移
-        const lastMigrationDate = localStorage.getItem('lastMigrationDate');
-        if (lastMigrationDate === todayStr) {
-            console.log('今天已经执行过迁移，跳过');
-            return;
-        }
-        
-        // 获取用户所有未完成的任务
-        const response = await fetch(`${API_BASE_URL}/tasks/unfinished?user_id=${appState.currentUser.id}`, {
-            method: 'GET',
-            headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Bearer ${appState.token}`
-            }
-        });
-        
-        if (!response.ok) {
-            throw new Error('获取未完成任务失败');
-        }
-        
-        const unfinishedTasks = await response.json();
-        console.log(`找到 ${unfinishedTasks.length} 个未完成任务`);
-        
-        // 筛选出日期在今天之前的任务
-        const tasksToMigrate = unfinishedTasks.filter(task => {
-            return task.start_date < todayStr && task.status === '未完成';
-        });
-        
-        console.log(`需要迁移 ${tasksToMigrate.length} 个任务`);
-        
-        // 迁移任务
-        for (const task of tasksToMigrate) {
-            // 创建新任务（迁移到今天）
-            // 在描述中添加迁移信息，不修改任务名称
-            const migrationInfo = `\n\n【迁移信息】原任务日期：${task.start_date}，迁移时间：${new Date().toLocaleString('zh-CN')}`;
-            const newTaskData = {
-                user_id: task.user_id,
-                name: task.name, // 保留原任务名称
-                description: (task.description || '') + migrationInfo,
-                icon: task.icon || 'default.png',
-                category: task.category,
-                planned_time: task.planned_time,
-                actual_time: 0,
-                points: task.points,
-                repeat_setting: '无',
-                start_date: todayStr,
-                end_date: todayStr,
-                status: '未完成',
-                series_id: task.series_id || String(Math.random().toFixed(6)).substring(2),
-                migrated_from: task.start_date, // 记录迁移来源日期
-                images: task.images || []
-            };
-            
-            // 添加新任务
-            const addResponse = await fetch(`${API_BASE_URL}/tasks`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Bearer ${appState.token}`
-                },
-                body: JSON.stringify(newTaskData)
-            });
-            
-            if (!addResponse.ok) {
-                console.error(`添加迁移任务失败: ${task.name}`);
-                continue;
-            }
-            
-            // 删除原任务
-            const deleteResponse = await fetch(`${API_BASE_URL}/tasks/${task.id}`, {
-                method: 'DELETE',
-                headers: {
-                    'Authorization': `Bearer ${appState.token}`
-                }
-            });
-            
-            if (!deleteResponse.ok) {
-                console.error(`删除原任务失败: ${task.name}`);
-            }
-            
-            console.log(`任务迁移成功: ${task.name}`);
+        const todayStr = new Date().toISOString().split('T')[0];
+        const result = await api.taskAPI.carryOver(appState.currentUser.id, todayStr, force);
+        if (!result.success) {
+            throw new Error(result.message || '迁移未完成任务失败');
         }
         
-        // 记录本次迁移日期
-        localStorage.setItem('lastMigrationDate', todayStr);
-        
-        if (tasksToMigrate.length > 0) {
-            domUtils.showToast(`成功迁移 ${tasksToMigrate.length} 个未完成任务到今天`);
+        if (result.already_done) {
+            console.log('今天已经执行过迁移，跳过');
+        } else if (result.moved > 0) {
+            domUtils.showToast(`成功迁移 ${result.moved} 个未完成任务到今天`);
             // 重新加载今天的任务
             loadTasks(todayStr);
         }
-        
-        console.log('任务迁移完成');
     } catch (error) {
         console.error('任务迁移失败:', error);
         // 不显示错误提示，避免影响用户体验
@@ -2398,16 +2319,8 @@ async function handleAddTask(e) {
             if (taskData.start_date < todayStr && taskData.status === '未完成' && appState.taskSettings?.autoMigrate) {
                 console.log('检测到编辑了历史任务，立即执行迁移检查');
                 
-                // 临时保存当前的最后迁移日期
-                const tempLastMigration = localStorage.getItem('lastMigrationDate');
-                // 移除日期限制，强制执行迁移
-                localStorage.removeItem('lastMigrationDate');
-                // 执行迁移
-                await migrateUnfinishedTasks();
-                // 恢复原始的最后迁移日期
-                if (tempLastMigration) {
-                    localStorage.setItem('lastMigrationDate', tempLastMigration);
-                }
+                // 忽略当天已迁移的记录，强制执行迁移
+                await migrateUnfinishedTasks(true);
             }
             
             domUtils.showToast('任务已更新');
@@ -2435,16 +2348,8 @@ async function handleAddTask(e) {
                 if (taskData.start_date < currentDateStr && taskData.status === '未完成' && appState.taskSettings?.autoMigrate) {
                     console.log('检测到创建了历史任务，立即执行迁移检查');
                     
-                    // 临时保存当前的最后迁移日期
-                    const tempLastMigration = localStorage.getItem('lastMigrationDate');
-                    // 移除日期限制，强制执行迁移
-                    localStorage.removeItem('lastMigrationDate');
-                    // 执行迁移
-                    await migrateUnfinishedTasks();
-                    // 恢复原始的最后迁移日期
-                    if (tempLastMigration) {
-                        localStorage.setItem('lastMigrationDate', tempLastMigration);
-                    }
+                    // 忽略当天已迁移的记录，强制执行迁移
+                    await migrateUnfinishedTasks(true);
                 }
                 
                 domUtils.showToast('任务添加成功');
@@ -87,6 +87,7 @@ class SubjectSettingsManager {
             subjectItem.className = 'bg-gray-50 rounded-lg p-3 flex flex-col';
             subjectItem.setAttribute('draggable', 'true');
             subjectItem.dataset.categoryId = subject.id;
+            subjectItem.dataset.builtin = subject.is_builtin ? '1' : '';
             subjectItem.style.cursor = 'move';
             
             // 学科头部
@@ -352,12 +353,15 @@ class SubjectSettingsManager {
     // 保存排序到后端
     async saveOrder() {
         try {
+            // 内置学科的排序所有用户共用，只提交自己添加的学科（按在列表中的位置）
             const items = Array.from(this.subjectsList.children);
             const orders = items.map((el, idx) => ({
                 id: parseInt(el.dataset.categoryId, 10),
+                builtin: el.dataset.builtin === '1',
                 sort_order: idx + 1
-            }));
-            const result = await api.categoryAPI.reorderCategories(orders);
+            })).filter(item => !item.builtin).map(({ id, sort_order }) => ({ id, sort_order }));
+            if (orders.length === 0) return;
+            const result = await api.categoryAPI.reorderCategories(orders, this.userId);
             if (result && result.success) {
                 // 通知全局更新
                 if (window.taskTabsManager) {
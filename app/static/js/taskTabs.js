@@ -464,17 +464,9 @@ class TaskTabsManager {
             if (formattedDate < currentBatchDateStr && appState.taskSettings?.autoMigrate) {
                 console.log('检测到批量添加了历史任务，立即执行迁移检查');
                 
-                // 临时保存当前的最后迁移日期
-                const tempLastMigration = localStorage.getItem('lastMigrationDate');
-                // 移除日期限制，强制执行迁移
-                localStorage.removeItem('lastMigrationDate');
-                // 执行迁移
+                // 忽略当天已迁移的记录，强制执行迁移
                 if (typeof migrateUnfinishedTasks === 'function') {
-                    await migrateUnfinishedTasks();
-                }
-                // 恢复原始的最后迁移日期
-                if (tempLastMigration) {
-                    localStorage.setItem('lastMigrationDate', tempLastMigration);
+                    await migrateUnfinishedTasks(true);
                 }
             }
             
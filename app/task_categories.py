@@ -0,0 +1,32 @@
+from sqlalchemy import func, select
+from models import db, TaskCategory
+
+# 任务分类
+# Task.category_id、TaskSeries.category_id 引用 task_category.id，分类名称和颜色在读取时关联分类表取得，
+# 修改分类名称只需要更新分类表的一行。category 列保留写入时的名称：
+# 找不到同名分类（例如"其他"以外的历史名称）时 category_id 为空，读取时使用该名称。
+# 通过ORM写入时由 models 中的监听器填写 category_id，批量 INSERT/UPDATE 需要调用方用 category_id_for 填写。
+
+
+def category_id_for(name):
+    """分类名称对应的分类ID，不存在时返回 None"""
+    if not name:
+        return None
+    return db.session.execute(select(TaskCategory.id).where(TaskCategory.name == name)).scalar()
+
+
+def category_filter(model, name):
+    """按分类名称筛选任务或重复规则的条件：分类存在时按 category_id，否则按未关联分类的名称"""
+    category_id = category_id_for(name)
+    if category_id is not None:
+        return model.category_id == category_id
+    return (model.category == name) & model.category_id.is_(None)
+
+
+def category_name_column(model):
+    """分组统计使用的分类名称表达式，需要配合 join_category 使用"""
+    return func.coalesce(TaskCategory.name, model.category)
+
+
+def join_category(query, model):
+    return query.outerjoin(TaskCategory, TaskCategory.id == model.category_id)
@@ -0,0 +1,64 @@
+from datetime import date, datetime
+from sqlalchemy import insert, literal, select, union_all
+from models import db, Task, TaskSeries
+from task_series import lazy_series_enabled, virtual_occurrences
+from task_categories import category_filter
+
+# 复制某一天的任务计划到其他日期
+# 每个目标日期执行一条 INSERT INTO task SELECT ...，直接从源日期的任务（以及按需展开模式下当天的虚拟任务对应的规则）
+# 生成新任务，任务数据不经过客户端，也不构造ORM对象。
+# 复制出的任务是当天的普通任务：状态重置为未完成、实际用时为0，不属于任何循环系列，不复制图片和备注。
+
+# 一次最多复制到多少个日期
+CLONE_MAX_TARGETS = 366
+
+# 新任务的列，顺序与 _source_select 中的取值一一对应
+CLONE_COLUMNS = (
+    'user_id', 'name', 'description', 'icon', 'category', 'category_id', 'planned_time', 'points',
+    'actual_time', 'repeat_setting', 'start_date', 'end_date', 'status', 'remark_count', 'created_at', 'updated_at'
+)
+
+
+def _source_select(model, target, now, *conditions, kind):
+    """源任务（Task 或 TaskSeries 模板）转换为目标日期新任务的 SELECT，附带排序用的 kind、source_id 两列"""
+    text = target.isoformat()
+    return select(
+        model.user_id, model.name, model.description, model.icon, model.category, model.category_id,
+        model.planned_time, model.points,
+        literal(0), literal('无'), literal(text), literal(text), literal('未完成'), literal(0), literal(now), literal(now),
+        literal(kind).label('kind'), model.id.label('source_id')
+    ).where(*conditions)
+
+
+def clone_day_tasks(user_id, source_day, target_days, category=None):
+    """
+    把 user_id 在 source_day（date）的任务复制到 target_days 中的每一天，可按分类筛选。
+    返回 {'YYYY-MM-DD': 复制的任务数}。由调用方刷新日统计并提交。
+    """
+    source_text = source_day.isoformat()
+    task_conditions = [Task.user_id == user_id, Task.start_date == source_text]
+    if category:
+        task_conditions.append(category_filter(Task, category))
+
+    # 源日期尚未写入的虚拟任务按规则模板复制
+    series_ids = []
+    if lazy_series_enabled():
+        series_ids = [series.id for series, _ in virtual_occurrences(user_id, source_day, source_day, category)]
+
+    now = datetime.now()
+    created = {}
+    for target in target_days:
+        selects = [_source_select(Task, target, now, *task_conditions, kind=0)]
+        if series_ids:
+            selects.append(_source_select(TaskSeries, target, now, TaskSeries.id.in_(series_ids), kind=1))
+        source = union_all(*selects).subquery()
+        # 按源任务的顺序写入，新任务ID的先后与源日期一致
+        rows = select(*list(source.c)[:len(CLONE_COLUMNS)]).order_by(source.c.kind, source.c.source_id)
+        result = db.session.execute(insert(Task).from_select(CLONE_COLUMNS, rows))
+        created[target.isoformat()] = result.rowcount
+    return created
+
+
+def expand_target_days(start, end):
+    """[start, end] 内的所有日期"""
+    return [date.fromordinal(day) for day in range(start.toordinal(), end.toordinal() + 1)]
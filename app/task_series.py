@@ -0,0 +1,329 @@
+import json
+import os
+import random
+from datetime import date, datetime
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Task, TaskSeries, TaskSeriesException
+from recurrence import weekday_mask, parse_day, is_occurrence, occurrence_days, occurrence_dates
+from task_categories import category_filter
+
+# 重复任务按需展开
+# 创建重复任务时只写入一条 task_series 规则，列表、统计等读取时按规则展开当天的"虚拟任务"，
+# 虚拟任务在完成、编辑、添加备注时才写入一条 Task 记录，删除时写入一条例外记录。
+# 虚拟任务ID为负数：-(规则ID * VIRTUAL_ID_SPAN + 距开始日期的天数)，前端可以像普通任务一样使用。
+# 设置环境变量 TASK_SERIES_MODE=materialize 可恢复为创建时逐日写入 Task 记录。
+
+TASK_SERIES_MODE_ENV = 'TASK_SERIES_MODE'
+VIRTUAL_ID_SPAN = 100000
+
+
+def lazy_series_enabled():
+    return os.environ.get(TASK_SERIES_MODE_ENV, 'lazy').strip().lower() != 'materialize'
+
+
+def is_virtual_task_id(task_id):
+    return task_id is not None and task_id < 0
+
+
+def virtual_task_id(series, day):
+    return -(series.id * VIRTUAL_ID_SPAN + (day.toordinal() - parse_day(series.start_date).toordinal()))
+
+
+def _unique_series_id(series_id):
+    """新系列的 series_id 不能与已有系列重复，重复时重新生成"""
+    while not series_id or TaskSeries.query.filter_by(series_id=series_id).first() is not None \
+            or Task.query.filter_by(series_id=series_id).first() is not None:
+        series_id = str(random.randint(100000, 999999))
+    return series_id
+
+
+def create_series(task):
+    """
+    用尚未加入会话的 Task 对象作为模板创建重复规则，返回 TaskSeries；
+    不是有效的重复任务（无结束日期、日期格式错误、结束早于开始、没有可识别的重复设置、
+    创建时已不是未完成状态、跨度超出虚拟ID范围）时返回 None，由调用方按普通任务处理。由调用方提交。
+    """
+    start = parse_day(task.start_date)
+    end = parse_day(task.end_date)
+    mask = weekday_mask(task.repeat_setting)
+    if not start or not end or end < start or not mask or (task.status or '未完成') != '未完成':
+        return None
+    if (end - start).days >= VIRTUAL_ID_SPAN:
+        return None
+    series = TaskSeries(
+        series_id=_unique_series_id(task.series_id),
+        user_id=task.user_id,
+        repeat_setting=task.repeat_setting,
+        weekday_mask=mask,
+        start_date=task.start_date,
+        end_date=task.end_date,
+        name=task.name,
+        description=task.description,
+        icon=task.icon,
+        category=task.category,
+        category_id=task.category_id,
+        planned_time=task.planned_time,
+        points=task.points,
+        images=task.images
+    )
+    db.session.add(series)
+    db.session.flush()
+    return series
+
+
+def _day_text(day):
+    return day.strftime('%Y-%m-%d')
+
+
+def virtual_occurrences(user_id, start=None, end=None, category=None):
+    """
+    展开 [start, end]（date，None 表示不限）内尚未写入或删除的虚拟任务，
+    返回按日期排序的 [(规则, 日期)]。
+    """
+    query = TaskSeries.query.filter(TaskSeries.user_id == user_id)
+    if start:
+        query = query.filter(TaskSeries.end_date >= _day_text(start))
+    if end:
+        query = query.filter(TaskSeries.start_date <= _day_text(end))
+    if category:
+        query = query.filter(category_filter(TaskSeries, category))
+    series_list = query.all()
+    if not series_list:
+        return []
+
+    exception_query = db.session.query(TaskSeriesException.series_pk, TaskSeriesException.date).filter(
+        TaskSeriesException.series_pk.in_([series.id for series in series_list])
+    )
+    if start:
+        exception_query = exception_query.filter(TaskSeriesException.date >= _day_text(start))
+    if end:
+        exception_query = exception_query.filter(TaskSeriesException.date <= _day_text(end))
+    exceptions = set(exception_query.all())
+
+    result = []
+    for series in series_list:
+        series_start, series_end = parse_day(series.start_date), parse_day(series.end_date)
+        if not series_start or not series_end:
+            continue
+        for day in occurrence_dates(series_start, series_end, series.weekday_mask, start, end):
+            if (series.id, _day_text(day)) not in exceptions:
+                result.append((series, day))
+    result.sort(key=lambda item: (item[1], item[0].id))
+    return result
+
+
+def virtual_day_counts(user_id, start=None, end=None):
+    """按日期和分类统计虚拟任务数：{'YYYY-MM-DD': {分类: 数量}}，虚拟任务都是未完成状态"""
+    counts = {}
+    for series, day in virtual_occurrences(user_id, start, end):
+        day_counts = counts.setdefault(_day_text(day), {})
+        day_counts[series.category_name] = day_counts.get(series.category_name, 0) + 1
+    return counts
+
+
+def virtual_task_dict(series, day, can_edit=True):
+    """虚拟任务的返回格式与普通任务一致，另加 virtual 标记"""
+    images = []
+    if series.images:
+        try:
+            images = json.loads(series.images)
+        except json.JSONDecodeError:
+            images = []
+    return {
+        'id': virtual_task_id(series, day),
+        'name': series.name,
+        'description': series.description,
+        'icon': series.icon,
+        'category': series.category_name,
+        'category_color': series.category_color,
+        'planned_time': series.planned_time,
+        'actual_time': 0,
+        'points': series.points,
+        'repeat_setting': series.repeat_setting,
+        'start_date': _day_text(day),
+        'end_date': series.end_date,
+        'status': '未完成',
+        'series_id': series.series_id,
+        'images': images,
+        'user_id': series.user_id,
+        'can_edit': can_edit,
+        'remark_count': 0,
+        'created_at': series.created_at.isoformat() if series.created_at else None,
+        'virtual': True
+    }
+
+
+def find_occurrence(task_id):
+    """解析虚拟任务ID，返回 (规则, 日期)；规则不存在或该日期不是执行日期时返回 (None, None)"""
+    series_pk, offset = divmod(-task_id, VIRTUAL_ID_SPAN)
+    series = db.session.get(TaskSeries, series_pk)
+    if series is None:
+        return None, None
+    start, end = parse_day(series.start_date), parse_day(series.end_date)
+    if not start or not end:
+        return None, None
+    day = date.fromordinal(start.toordinal() + offset)
+    if not is_occurrence(day, start, end, series.weekday_mask):
+        return None, None
+    return series, day
+
+
+def _claim_occurrence(series, day):
+    """
+    为某一天写入例外记录（task_id 为空），返回是否由本次写入。
+    使用 INSERT ... ON CONFLICT DO NOTHING，并发请求同时写入同一天时只有一个成功。
+    """
+    result = db.session.execute(
+        sqlite_insert(TaskSeriesException).values(
+            series_pk=series.id, date=_day_text(day), task_id=None, created_at=datetime.now()
+        ).on_conflict_do_nothing()
+    )
+    return result.rowcount == 1
+
+
+def _existing_task(series, day):
+    exception = db.session.get(TaskSeriesException, (series.id, _day_text(day)), populate_existing=True)
+    if exception is None or exception.task_id is None:
+        return None
+    return db.session.get(Task, exception.task_id)
+
+
+def materialized_task(task_id):
+    """返回虚拟任务已写入的 Task，尚未写入或已删除时返回 None"""
+    series, day = find_occurrence(task_id)
+    if series is None:
+        return None
+    return _existing_task(series, day)
+
+
+def materialize_occurrence(task_id):
+    """
+    把虚拟任务写入 Task 表并返回该 Task；已经写入过时返回已有的 Task，
+    无效ID或该天已被删除时返回 None。由调用方刷新日统计并提交。
+    """
+    series, day = find_occurrence(task_id)
+    if series is None:
+        return None
+    if not _claim_occurrence(series, day):
+        return _existing_task(series, day)
+
+    task = Task(
+        user_id=series.user_id,
+        series_id=series.series_id,
+        name=series.name,
+        description=series.description,
+        icon=series.icon,
+        category=series.category_name,
+        category_id=series.category_id,
+        planned_time=series.planned_time,
+        actual_time=0,
+        points=series.points,
+        repeat_setting=series.repeat_setting,
+        start_date=_day_text(day),
+        end_date=series.end_date,
+        status='未完成',
+        images=series.images
+    )
+    db.session.add(task)
+    db.session.flush()
+    db.session.execute(
+        update(TaskSeriesException)
+        .where(TaskSeriesException.series_pk == series.id, TaskSeriesException.date == _day_text(day))
+        .values(task_id=task.id)
+    )
+    return task
+
+
+def skip_occurrence(task_id):
+    """
+    删除虚拟任务：写入 task_id 为空的例外记录，该天不再展开。
+    返回 (规则, 日期)，无效ID时返回 (None, None)。由调用方提交。
+    """
+    series, day = find_occurrence(task_id)
+    if series is not None:
+        _claim_occurrence(series, day)
+    return series, day
+
+
+# 系列编辑时可修改的模板字段
+SERIES_EDITABLE_FIELDS = ('name', 'description', 'icon', 'category', 'planned_time', 'points')
+
+
+def _series_segments(series_id, from_day=None):
+    """系列的各段规则，提供 from_day 时只返回结束日期不早于该日的段"""
+    query = TaskSeries.query.filter(TaskSeries.series_id == series_id)
+    if from_day:
+        query = query.filter(TaskSeries.end_date >= _day_text(from_day))
+    return query.order_by(TaskSeries.start_date).all()
+
+
+def _split_series(series, day):
+    """
+    把规则从 day 起拆出新的一段并返回；新段从 day 之后（含）的第一个执行日期开始，
+    原规则截止到其前一天，该日期之后的例外记录一并转到新段。day 之后没有执行日期时返回 None。
+    """
+    start, end = parse_day(series.start_date), parse_day(series.end_date)
+    days = occurrence_days(start, end, series.weekday_mask, range_start=day)
+    if not days:
+        return None
+    first = date.fromordinal(days[0])
+    segment = TaskSeries(
+        series_id=series.series_id,
+        user_id=series.user_id,
+        repeat_setting=series.repeat_setting,
+        weekday_mask=series.weekday_mask,
+        start_date=_day_text(first),
+        end_date=series.end_date,
+        name=series.name,
+        description=series.description,
+        icon=series.icon,
+        category=series.category,
+        category_id=series.category_id,
+        planned_time=series.planned_time,
+        points=series.points,
+        images=series.images
+    )
+    series.end_date = _day_text(date.fromordinal(days[0] - 1))
+    db.session.add(segment)
+    db.session.flush()
+    db.session.execute(
+        update(TaskSeriesException)
+        .where(TaskSeriesException.series_pk == series.id, TaskSeriesException.date >= segment.start_date)
+        .values(series_pk=segment.id)
+    )
+    return segment
+
+
+def update_series_rules(series_id, changes, from_date=None):
+    """
+    把字段修改应用到系列规则上（尚未写入的虚拟任务随之改变），返回修改的规则列表。
+    提供 from_date 时只影响该日期及之后的执行日期，跨越该日期的规则会被拆成两段。由调用方提交。
+    """
+    from_day = parse_day(from_date) if from_date else None
+    updated = []
+    for series in _series_segments(series_id, from_day):
+        if from_day and parse_day(series.start_date) < from_day:
+            series = _split_series(series, from_day)
+            if series is None:
+                continue
+        for field, value in changes.items():
+            setattr(series, field, value)
+        updated.append(series)
+    return updated
+
+
+def delete_series_rules(series_id, from_date=None):
+    """
+    删除系列规则：提供 from_date 时把跨越该日期的规则截止到前一天、删除之后开始的规则，
+    否则删除全部规则；被删除规则的例外记录一并删除。返回受影响的规则列表。由调用方提交。
+    """
+    from_day = parse_day(from_date) if from_date else None
+    affected = _series_segments(series_id, from_day)
+    for series in affected:
+        if from_day and parse_day(series.start_date) < from_day:
+            series.end_date = _day_text(date.fromordinal(from_day.toordinal() - 1))
+            continue
+        TaskSeriesException.query.filter_by(series_pk=series.id).delete(synchronize_session=False)
+        db.session.delete(series)
+    return affected
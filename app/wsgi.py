@@ -0,0 +1,5 @@
+# WSGI 入口：gunicorn -c gunicorn.conf.py wsgi:app
+# app.py 只定义应用工厂，导入时不创建应用；需要按默认配置（环境变量）创建的应用时从这里导入。
+from app import create_app
+
+app = create_app()